@@ -0,0 +1,222 @@
+'''
+    Shortest paths between every pair of tiles, worked out ahead of time.
+    On a small or medium map (up to a few thousand open tiles) every path
+    can be a table lookup instead of a search. For each goal tile the table
+    keeps the distance from every tile and the next tile to step to, so a
+    path is read off one step at a time, in O(path length), with no search.
+
+    Tiles are numbered 0 .. N-1 in the tables (only tiles with an edge are
+    counted, walls are left out) and the entries are 16 bit, so two N x N
+    tables of 4096 tiles are 64 MB. The tables are found with a BFS from
+    every goal tile, many goals at once as numpy arrays.
+
+    A table is tied to the version of the graph it was built from. Once an
+    edge is added or removed it is stale, and get_shortest_path goes back to
+    searching until update() builds it again. Tables can be saved next to
+    the cached maps in data/.cache, named by a hash of the graph's edges.
+'''
+import hashlib
+import os
+import numpy as np
+from graph_tools import UP, DOWN, LEFT, RIGHT
+
+# the distance and next tile of tiles that can't reach the goal
+UNREACHABLE = 65535
+# the most tiles a table is built for, two tables of this many squared uint16 entries
+MAX_VERTICES = 4096
+# goals searched at the same time, more is faster but uses more memory
+BATCH = 128
+# the same folder as asset_cache.py
+CACHE_DIR = '../data/.cache'
+# change this when the saved format changes, old files are then ignored
+TABLE_VERSION = 1
+
+
+def neighbor_table(graph):
+    '''
+        The neighbors of every vertex as a (V, 4) array, -1 where there is none.
+        A GridGraph is read from its neighbor bits, other graphs with get_adjacent.
+    '''
+    if hasattr(graph, 'masks'):
+        masks = np.frombuffer(bytes(graph.masks), dtype=np.uint8)
+        vertices = np.arange(graph.V)
+        neighbors = np.full((graph.V, 4), -1, dtype=np.int64)
+        for k, (bit, offset) in enumerate(((UP, -graph.cols), (DOWN, graph.cols), (LEFT, -1), (RIGHT, 1))):
+            neighbors[:, k] = np.where(masks & bit, vertices + offset, -1)
+        return neighbors
+    adjacent = [graph.get_adjacent(v) for v in range(graph.V)]
+    neighbors = np.full((graph.V, max([len(a) for a in adjacent] + [1])), -1, dtype=np.int64)
+    for v, vertices in enumerate(adjacent):
+        neighbors[v, :len(vertices)] = vertices
+    return neighbors
+
+
+# a hash of the edges, the name of a saved table
+def edges_key(neighbors):
+    return hashlib.sha1(b'%d-' % TABLE_VERSION + neighbors.astype('<i8').tobytes()).hexdigest()
+
+
+def batched_bfs(neighbors, goals):
+    '''
+        A BFS from each goal at once. neighbors is the (N, k) table of
+        numbered tiles. Returns (distance, next_hop), two (len(goals), N)
+        uint16 arrays: row i has the steps from every tile to goals[i] and
+        the next tile on the way there, UNREACHABLE if there is no way.
+        Each level moves the whole frontier, every (goal, tile) pair, together.
+    '''
+    n, width = neighbors.shape
+    count = len(goals)
+    # keys fit in 32 bits (a batch of goals * 65535 tiles), which halves the memory touched
+    neighbors = neighbors.astype(np.int32)
+    goals = np.asarray(goals, dtype=np.int32)
+    distance = np.full(count * n, UNREACHABLE, dtype=np.uint16)
+    next_hop = np.full(count * n, UNREACHABLE, dtype=np.uint16)
+    # the frontier as flat keys, goal row * n + tile
+    frontier = np.arange(count, dtype=np.int32) * n + goals
+    distance[frontier] = 0
+    next_hop[frontier] = goals
+    # marks one of the ways each tile is reached in a level
+    stamp = np.zeros(count * n, dtype=np.int32)
+    level = 0
+    while len(frontier):
+        level += 1
+        parents = frontier % n
+        tiles = neighbors[parents]
+        found = tiles >= 0
+        keys = ((frontier - parents)[:, None] + tiles)[found]
+        parents = np.broadcast_to(parents[:, None], tiles.shape)[found]
+        keep = distance[keys] == UNREACHABLE
+        keys, parents = keys[keep], parents[keep]
+        # a tile next to more than one frontier tile is reached once
+        order = np.arange(len(keys), dtype=np.int32)
+        stamp[keys] = order
+        first = stamp[keys] == order
+        keys, parents = keys[first], parents[first]
+        distance[keys] = level
+        next_hop[keys] = parents
+        frontier = keys
+    return distance.reshape(count, n), next_hop.reshape(count, n)
+
+
+class AllPairsTable(object):
+    def __init__(self, graph, max_vertices=MAX_VERTICES, neighbors=None):
+        self.graph = graph
+        self.max_vertices = min(max_vertices, UNREACHABLE)
+        self.version = -1
+        self.vertices = None    # table number -> vertex
+        self.index = None       # vertex -> table number, -1 for a vertex with no edges
+        self.distance = None    # distance[goal, tile], steps from tile to goal
+        self.next_hop = None    # next_hop[goal, tile], the next tile from tile towards goal
+        self.build(neighbors)
+
+    def build(self, neighbors=None):
+        if neighbors is None:
+            neighbors = neighbor_table(self.graph)
+        self.vertices = np.flatnonzero((neighbors >= 0).any(axis=1))
+        n = len(self.vertices)
+        if n > self.max_vertices:
+            raise ValueError("the graph has %d open tiles, an AllPairsTable can have at most %d"
+                             % (n, self.max_vertices))
+        self.index = np.full(self.graph.V, -1, dtype=np.int64)
+        self.index[self.vertices] = np.arange(n)
+        # the neighbor table in table numbers
+        numbered = neighbors[self.vertices]
+        numbered = np.where(numbered >= 0, self.index[np.maximum(numbered, 0)], -1)
+
+        self.distance = np.full((n, n), UNREACHABLE, dtype=np.uint16)
+        self.next_hop = np.full((n, n), UNREACHABLE, dtype=np.uint16)
+        for start in range(0, n, BATCH):
+            goals = np.arange(start, min(start + BATCH, n))
+            self.distance[start:start + BATCH], self.next_hop[start:start + BATCH] = batched_bfs(numbered, goals)
+        self.version = self.graph.version
+
+    # True if a table can be built for the graph
+    @staticmethod
+    def fits(graph, max_vertices=MAX_VERTICES):
+        return int((neighbor_table(graph) >= 0).any(axis=1).sum()) <= min(max_vertices, UNREACHABLE)
+
+    def is_stale(self):
+        return self.graph.version != self.version
+
+    # returns True if the table had to be built again
+    def update(self):
+        if not self.is_stale():
+            return False
+        self.build()
+        return True
+
+    # the number of steps from vertex start to vertex goal, -1 if it can't be reached
+    def distance_between(self, start, goal):
+        if start == goal:
+            return 0
+        s = self.index[start]
+        g = self.index[goal]
+        if s < 0 or g < 0 or self.distance[g, s] == UNREACHABLE:
+            return -1
+        return int(self.distance[g, s])
+
+    # the vertex to step to from start towards goal, -1 if goal can't be reached
+    def next_step(self, start, goal):
+        if start == goal:
+            return goal
+        s = self.index[start]
+        g = self.index[goal]
+        if s < 0 or g < 0 or self.next_hop[g, s] == UNREACHABLE:
+            return -1
+        return int(self.vertices[self.next_hop[g, s]])
+
+    def path(self, start, goal):
+        '''
+            The vertices of a shortest path from start to goal, [] if there is none.
+        '''
+        if start == goal:
+            return [start]
+        s = self.index[start]
+        g = self.index[goal]
+        if s < 0 or g < 0 or self.distance[g, s] == UNREACHABLE:
+            return []
+        hops = self.next_hop[g]
+        path = [start]
+        tile = s
+        while tile != g:
+            tile = hops[tile]
+            path.append(int(self.vertices[tile]))
+        return path
+
+    def save(self, filename):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        temporary = "%s.%d.tmp.npz" % (filename, os.getpid())
+        np.savez(temporary, vertices=self.vertices, distance=self.distance, next_hop=self.next_hop)
+        os.replace(temporary, filename)
+
+    @classmethod
+    def load_or_build(cls, graph, name, cache_dir=CACHE_DIR, max_vertices=MAX_VERTICES):
+        '''
+            The table for graph, loaded from cache_dir if it was saved before,
+            otherwise built and saved. name is the start of the file name,
+            the rest is a hash of the edges, so a changed map gets a new file.
+        '''
+        neighbors = neighbor_table(graph)
+        filename = os.path.join(cache_dir, "%s-%s.npz" % (name, edges_key(neighbors)[:16]))
+        if os.path.exists(filename):
+            try:
+                with np.load(filename) as data:
+                    table = cls.__new__(cls)
+                    table.graph = graph
+                    table.max_vertices = min(max_vertices, UNREACHABLE)
+                    table.vertices = data['vertices']
+                    table.distance = data['distance']
+                    table.next_hop = data['next_hop']
+                table.index = np.full(graph.V, -1, dtype=np.int64)
+                table.index[table.vertices] = np.arange(len(table.vertices))
+                table.version = graph.version
+                return table
+            except (OSError, ValueError, KeyError):
+                pass  # a broken file, build the table again
+        table = cls(graph, max_vertices, neighbors)
+        table.save(filename)
+        return table
+
+    def __str__(self):
+        return "AllPairsTable: %d tiles, %.1f MB" % (
+            len(self.vertices), (self.distance.nbytes + self.next_hop.nbytes) / 1e6)
@@ -0,0 +1,143 @@
+'''
+    A cache on disk for the slow parts of starting the game.
+    Decoding a PNG and scaling it to the window takes much longer than
+    reading the finished pixels back, so images are saved already scaled,
+    as raw pixels. Compiled maps (tiles, walls and graph) are saved with
+    pickle. Each cache file is named by a hash of the source file and the
+    size it was scaled to, so editing an asset or changing the window size
+    simply makes a new entry.
+
+    Sounds are loaded on a background thread while the game starts, and
+    are only played once they are ready.
+
+    The cache is in data/.cache, deleting it is always safe.
+'''
+import hashlib
+import os
+import pickle
+import struct
+import threading
+import pygame
+import graph_tools
+import map_compiler
+from map_compiler import compile_map
+
+CACHE_DIR = '../data/.cache'
+# change this when the format of the cached files changes, old files are then ignored
+CACHE_VERSION = 1
+
+MAGIC = b'MCSI'
+# magic, width, height, 1 if the pixels have an alpha channel
+IMAGE_HEADER = struct.Struct('<4sHHB')
+
+
+def file_hash(filename):
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# the cache file name for a source file, with anything else that changes the result
+def cache_path(filename, *details, cache_dir=CACHE_DIR):
+    key = "-".join([file_hash(filename), 'v%d' % CACHE_VERSION] + [str(d) for d in details])
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(cache_dir, "%s-%s" % (name, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]))
+
+
+# write to a temporary file first, so a half written file is never read
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def load_image(filename, size=None, alpha=True, cache_dir=CACHE_DIR):
+    '''
+        Load an image, scaled to size (width, height) if it is given, and
+        converted for the window. The scaled pixels are cached, so only the
+        first run decodes and scales the file. Call after the window is created.
+    '''
+    mode = 'RGBA' if alpha else 'RGB'
+    path = cache_path(filename, size, mode, cache_dir=cache_dir) + '.pix'
+    image = None
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, width, height, has_alpha = IMAGE_HEADER.unpack_from(data)
+        pixels = data[IMAGE_HEADER.size:]
+        if magic == MAGIC and bool(has_alpha) == alpha and len(pixels) == width * height * len(mode):
+            image = pygame.image.frombuffer(pixels, (width, height), mode)
+
+    if image is None:
+        image = pygame.image.load(filename)
+        if size is not None:
+            image = pygame.transform.scale(image, size)
+        width, height = image.get_size()
+        pixels = pygame.image.tobytes(image, mode)
+        _write_file(path, IMAGE_HEADER.pack(MAGIC, width, height, 1 if alpha else 0) + pixels)
+
+    if pygame.display.get_surface() is None:
+        return image.copy()
+    return image.convert_alpha() if alpha else image.convert()
+
+
+def load_map(filename, backend='grid', cache_dir=CACHE_DIR):
+    '''
+        compile_map with the compiled map (tiles, walls and graph) cached.
+        The code that builds the map is part of the key, so changing it
+        never loads an old pickled map.
+    '''
+    code = [file_hash(module.__file__) for module in (map_compiler, graph_tools)]
+    path = cache_path(filename, backend, *code, cache_dir=cache_dir) + '.map'
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass  # an old or broken file, compile the map again
+    level = compile_map(filename, backend)
+    _write_file(path, pickle.dumps(level, pickle.HIGHEST_PROTOCOL))
+    return level
+
+
+class LazySound(object):
+    '''
+        A sound that loads on a background thread.
+        play() does nothing until the sound is ready, so the game never
+        waits for it. set_volume can be called at any time.
+    '''
+    def __init__(self, filename, volume=None, background=True):
+        self.filename = filename
+        self.volume = volume
+        self.sound = None
+        self.ready = threading.Event()
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self._load, daemon=True)
+            self.thread.start()
+
+    def _load(self):
+        try:
+            self.sound = pygame.mixer.Sound(self.filename)
+            if self.volume is not None:
+                self.sound.set_volume(self.volume)
+        except pygame.error as e:
+            print("could not load sound %s: %s" % (self.filename, e))
+        self.ready.set()
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.sound is not None:
+            self.sound.set_volume(volume)
+
+    def play(self):
+        if self.thread is None and not self.ready.is_set():
+            self._load()  # loaded the first time it is played
+        if self.sound is not None:
+            self.sound.play()
+
+    # block until the sound is loaded, returns False if it could not be loaded
+    def wait(self, timeout=None):
+        self.ready.wait(timeout)
+        return self.sound is not None
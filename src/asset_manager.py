@@ -0,0 +1,136 @@
+'''
+    Sprite sheets packed into one texture atlas, and a batch to draw them.
+    Every animation frame from every sheet is copied into one big surface
+    (the atlas), converted once for fast drawing, and given a name. A frame
+    is then just the Rect of its region in the atlas.
+
+    The SpriteBatch works like a Surface that waits: blit and blits only
+    collect what to draw, then flush() draws all of it with one
+    Surface.blits call. Code that draws onto a surface (Animation,
+    ProjectilePool, EnemyManager) can draw into a batch instead, as long as
+    the frames it is given come from the atlas.
+
+        atlas = TextureAtlas()
+        atlas.add_sheet('explosion', pygame.image.load('explosion.png'), 16, 16)
+        atlas.build()
+        batch = SpriteBatch(window_surface, atlas)
+        batch.blit(atlas.frames('explosion')[0], (10, 10))
+        rects = batch.flush()
+'''
+import pygame
+
+ATLAS_MAX_WIDTH = 1024
+# empty pixels between regions, so nothing next to a frame is ever drawn with it
+ATLAS_PADDING = 1
+
+
+class TextureAtlas(object):
+    def __init__(self, max_width=ATLAS_MAX_WIDTH, padding=ATLAS_PADDING):
+        self.max_width = max_width
+        self.padding = padding
+        self.images = []       # (name, surface) waiting for build()
+        self.animations = {}   # animation name -> list of region names
+        self.regions = {}      # region name -> Rect in the atlas
+        self.surface = None
+
+    def add(self, name, image):
+        '''
+            Add one image as a region.
+        '''
+        if self.surface is not None:
+            raise ValueError("the atlas is already built, add images before build()")
+        self.images.append((name, image))
+
+    def add_sheet(self, name, sheet, frame_width, frame_height, row=0, count=None):
+        '''
+            Add the frames of one row of a sprite sheet as an animation.
+            The frames are named name/0, name/1 ..., frames(name) gives them in order.
+            count is the number of frames, all of the frames in the row if it is None.
+        '''
+        if count is None:
+            count = sheet.get_width() // frame_width
+        names = []
+        for i in range(count):
+            frame_name = "%s/%d" % (name, i)
+            self.add(frame_name, sheet.subsurface(pygame.Rect(i * frame_width, row * frame_height,
+                                                              frame_width, frame_height)))
+            names.append(frame_name)
+        self.animations[name] = names
+
+    def build(self):
+        '''
+            Pack every image into the atlas surface with shelf packing: the
+            images, tallest first, are placed left to right in rows (shelves)
+            that are as tall as their first image.
+        '''
+        pad = self.padding
+        order = sorted(self.images, key=lambda item: item[1].get_height(), reverse=True)
+        widest = max([image.get_width() for name, image in order] + [1])
+        max_width = max(self.max_width, widest + pad)
+
+        x = y = shelf_height = width = 0
+        for name, image in order:
+            w, h = image.get_size()
+            if x + w + pad > max_width:
+                # start the next shelf
+                y += shelf_height
+                x = shelf_height = 0
+            self.regions[name] = pygame.Rect(x, y, w, h)
+            x += w + pad
+            shelf_height = max(shelf_height, h + pad)
+            width = max(width, x)
+
+        surface = pygame.Surface((max(width, 1), max(y + shelf_height, 1)), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        surface.blits([(image, self.regions[name]) for name, image in order], doreturn=False)
+        # convert once the window exists, so drawing from the atlas needs no pixel format changes
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        # run length encoded: the clear pixels around each sprite are skipped
+        # instead of blended, blits from the atlas are about twice as fast
+        surface.set_alpha(255, pygame.RLEACCEL)
+        self.surface = surface
+        self.images = []
+        return surface
+
+    def region(self, name):
+        return self.regions[name]
+
+    # the regions of an animation, in order
+    def frames(self, name):
+        return [self.regions[frame_name] for frame_name in self.animations[name]]
+
+    def __str__(self):
+        size = self.surface.get_size() if self.surface is not None else None
+        return "TextureAtlas: %d regions, size %s" % (len(self.regions), size)
+
+
+class SpriteBatch(object):
+    def __init__(self, surface, atlas):
+        self.surface = surface
+        self.atlas = atlas
+        self.queue = []   # (atlas surface, position, region) for each sprite to draw
+
+    def __len__(self):
+        return len(self.queue)
+
+    # draw the region of the atlas at position when the batch is flushed
+    def blit(self, region, position):
+        self.queue.append((self.atlas.surface, position, region))
+
+    # a sequence of (region, position) pairs
+    def blits(self, sequence):
+        atlas_surface = self.atlas.surface
+        self.queue.extend([(atlas_surface, position, region) for region, position in sequence])
+
+    def flush(self, doreturn=True):
+        '''
+            Draw everything that was collected with one Surface.blits call.
+            Returns the rectangles drawn, or None with doreturn=False
+            (making a Rect for each of thousands of sprites takes time).
+        '''
+        if not self.queue:
+            return [] if doreturn else None
+        rects = self.surface.blits(self.queue, doreturn=doreturn)
+        self.queue = []
+        return rects
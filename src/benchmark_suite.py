@@ -0,0 +1,407 @@
+'''
+    Benchmarks for the slow parts of the game: building the tile graph,
+    finding paths, wall collisions, drawing and lots of projectiles.
+    Maps are made up at random, from 10 x 10 up to 1000 x 1000 tiles, with
+    a few amounts of walls. Each benchmark records its wall time (the best
+    of a few runs) and its peak memory from tracemalloc (python and numpy
+    memory, SDL surfaces are not counted). Drawing uses SDL's dummy video
+    driver and an offscreen surface, so no window is opened.
+
+    Results can be saved as a baseline and later runs compared against it,
+    so a slowdown shows up as a regression.
+
+    Usage (from the src folder):
+        python benchmark_suite.py --save-baseline        # measure and save
+        python benchmark_suite.py                        # compare with the baseline
+        python benchmark_suite.py --sizes 10 100 --only path
+        python benchmark_suite.py --sizes 30 --densities 0.2 --only projectiles
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import gc
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pygame
+from graph_tools import create_tile_graph, get_shortest_path, PATH_METHODS
+from all_pairs import AllPairsTable
+from map_compiler import compile_tiles, WALL, PLAYER, ENEMY
+from collision_tools import WallIndex, collide_circle_rect
+from renderer import Renderer
+from projectile_pool import ProjectilePool
+from spatial_hash import SpatialHash
+from enemy_manager import MIN_HASH_CELL
+from asset_manager import TextureAtlas, SpriteBatch
+from simulation import FIXED_DELTA_T, PROJECTILE_SPEED, ENEMY_HIT_RADIUS
+
+SIZES = (10, 50, 100, 250, 500, 1000)
+DENSITIES = (0.0, 0.2, 0.4)
+# the matrix graph needs V x V memory, bigger maps only use the grid backend
+MATRIX_MAX_TILES = 2500
+# checking every wall with collide_circle_rect is only done on small maps
+BRUTE_FORCE_MAX_TILES = 10000
+COLLISION_QUERIES = 1000
+# paths between random open tiles, long on big maps. On open maps these
+# keep jump point search honest against A* (it used to be 30x slower there)
+PATH_QUERIES = 10
+RENDER_SIZE = 900      # the offscreen surface is about this many pixels wide
+RENDER_FRAMES = 60
+RENDER_SPRITES = 50
+# live projectiles for the projectile benchmarks, each result is one frame (16.7 ms at 60 FPS)
+PROJECTILES = 10000
+PROJECTILE_TARGETS = 100
+# run each benchmark up to this many times, but stop once this many seconds were spent
+REPEAT = 3
+REPEAT_SECONDS = 1.0
+# a result slower than the baseline by this fraction (and by at least MIN_SLOWDOWN seconds) is a regression
+TOLERANCE = 0.25
+MIN_SLOWDOWN = 0.001
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+
+def make_tiles(rows, cols, density, seed=0):
+    '''
+        A random map with about density of the tiles being walls.
+        The bottom row and the right column are kept open, so the player in
+        the bottom left corner can always reach the enemy in the top right.
+    '''
+    rng = random.Random(seed)
+    tiles = []
+    for r in range(rows):
+        row = []
+        for c in range(cols):
+            if r == rows - 1 or c == cols - 1 or rng.random() >= density:
+                row.append(' ')
+            else:
+                row.append(WALL)
+        tiles.append(row)
+    tiles[rows - 1][0] = PLAYER
+    tiles[0][cols - 1] = ENEMY
+    return [''.join(row) for row in tiles]
+
+
+def write_tiles(tiles, filename):
+    with open(filename, 'w') as f:
+        for row in tiles:
+            f.write(row + '\n')
+
+
+def measure(function, memory=True):
+    '''
+        Time function() and find its peak memory.
+        The time is the best of up to REPEAT runs. The memory is measured in a
+        separate run because tracemalloc slows everything down.
+    '''
+    best = None
+    spent = 0.0
+    for i in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        spent += seconds
+        if best is None or seconds < best:
+            best = seconds
+        if spent >= REPEAT_SECONDS:
+            break
+
+    result = {'seconds': best}
+    if memory:
+        tracemalloc.start()
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_kb'] = peak / 1024.0
+    return result
+
+
+def bench_graph_build(map_file, rows, cols, memory):
+    results = {}
+    for backend in ('matrix', 'grid'):
+        if backend == 'matrix' and rows * cols > MATRIX_MAX_TILES:
+            continue
+        results['graph_build/' + backend] = measure(lambda: create_tile_graph(map_file, backend), memory)
+    return results
+
+
+def bench_paths(level, memory):
+    results = {}
+    start_r, start_c = level.player_spawn
+    goal_r, goal_c = level.enemy_spawns[0]
+    for method in PATH_METHODS:
+        results['path/' + method] = measure(
+            lambda: get_shortest_path(start_r, start_c, goal_r, goal_c, level.graph, method), memory)
+
+    rng = random.Random(0)
+    open_tiles = [(r, c) for r in range(level.rows) for c in range(level.cols) if not level.walls[r * level.cols + c]]
+    queries = [rng.choice(open_tiles) + rng.choice(open_tiles) for i in range(PATH_QUERIES)]
+
+    def random_paths(method):
+        for start_r, start_c, goal_r, goal_c in queries:
+            get_shortest_path(start_r, start_c, goal_r, goal_c, level.graph, method)
+
+    for method in PATH_METHODS:
+        results['path_random/' + method] = measure(lambda: random_paths(method), memory)
+
+    # small maps can look every path up in an all pairs table instead
+    if AllPairsTable.fits(level.graph):
+        results['path_table/build'] = measure(lambda: AllPairsTable(level.graph), memory)
+        level.graph.all_pairs = AllPairsTable(level.graph)
+        results['path/table'] = measure(
+            lambda: get_shortest_path(start_r, start_c, goal_r, goal_c, level.graph), memory)
+        level.graph.all_pairs = None
+    return results
+
+
+def bench_collision(level, grid_w, grid_h, memory):
+    results = {}
+    wall_index = WallIndex.from_map(level, grid_w, grid_h)
+    rng = np.random.RandomState(0)
+    positions = rng.uniform(0, 1, (COLLISION_QUERIES, 2)) * (level.cols * grid_w, level.rows * grid_h)
+    radius = max(grid_w, grid_h) * 0.75
+
+    def one_at_a_time():
+        for x, y in positions.tolist():
+            wall_index.collide_wall((x, y), radius)
+
+    results['collision/collide_wall'] = measure(one_at_a_time, memory)
+    results['collision/collide_wall_many'] = measure(lambda: wall_index.collide_wall_many(positions, radius), memory)
+
+    if level.rows * level.cols <= BRUTE_FORCE_MAX_TILES:
+        # the original test: every wall rectangle against every position
+        wall_rects = [(c * grid_w, r * grid_h, grid_w, grid_h) for r, c in level.wall_tiles()]
+        points = [pygame.math.Vector2(x, y) for x, y in positions[:100].tolist()]
+
+        def brute_force():
+            for point in points:
+                for rect in wall_rects:
+                    if collide_circle_rect(point, radius, rect):
+                        break
+
+        results['collision/collide_circle_rect'] = measure(brute_force, memory)
+    return results
+
+
+def bench_render(level, grid_w, grid_h, memory):
+    results = {}
+    width = level.cols * grid_w
+    height = level.rows * grid_h
+    surface = pygame.Surface((width, height))
+    background = pygame.Surface((width, height))
+    background.fill((20, 40, 120))
+    wall_image = pygame.Surface((grid_w, grid_h))
+    wall_image.fill((200, 200, 200))
+    sprite = pygame.Surface((16, 16), pygame.SRCALPHA)
+    sprite.fill((255, 0, 0, 255))
+    renderer = Renderer(surface, background, wall_image, grid_w, grid_h)
+    renderer.set_map(level)
+
+    def static_layer():
+        renderer.mark_map_changed()
+        renderer.begin_frame()
+        renderer.end_frame()
+
+    results['render/static_layer'] = measure(static_layer, memory)
+
+    rng = np.random.RandomState(0)
+    starts = rng.uniform(0, 1, (RENDER_SPRITES, 2)) * (width, height)
+    steps = rng.uniform(-2, 2, (RENDER_SPRITES, 2))
+
+    def frames():
+        for i in range(RENDER_FRAMES):
+            renderer.begin_frame()
+            positions = starts + steps * i
+            renderer.blits([(sprite, (x, y)) for x, y in positions.tolist()])
+            renderer.end_frame()
+
+    results['render/dirty_frames'] = measure(frames, memory)
+    return results
+
+
+def bench_projectiles(level, grid_w, grid_h, memory):
+    '''
+        PROJECTILES projectiles flying from random open tiles, against
+        PROJECTILE_TARGETS enemies: one simulation step, one frame of
+        drawing them through a SpriteBatch and the Renderer, and both.
+        The projectiles are put back where they started before every run.
+    '''
+    results = {}
+    width = level.cols * grid_w
+    height = level.rows * grid_h
+    surface = pygame.Surface((width, height))
+    background = pygame.Surface((width, height))
+    background.fill((20, 40, 120))
+    wall_image = pygame.Surface((grid_w, grid_h))
+    wall_image.fill((200, 200, 200))
+    renderer = Renderer(surface, background, wall_image, grid_w, grid_h)
+    renderer.set_map(level)
+    wall_index = WallIndex.from_map(level, grid_w, grid_h)
+
+    # a 4 frame animation of small dots, like the laser bolts
+    sheet = pygame.Surface((64, 16), pygame.SRCALPHA)
+    for i in range(4):
+        pygame.draw.circle(sheet, (255, 200, 50 * i, 255), (16 * i + 8, 8), 3 + i)
+    atlas = TextureAtlas()
+    atlas.add_sheet('shot', sheet, 16, 16)
+    atlas.build()
+    frames = atlas.frames('shot')
+    batch = SpriteBatch(surface, atlas)
+
+    rng = np.random.RandomState(0)
+    open_tiles = np.flatnonzero(np.frombuffer(bytes(level.walls), dtype=np.uint8) == 0)
+    tiles = rng.choice(open_tiles, PROJECTILES)
+    angles = rng.uniform(0, 2 * np.pi, PROJECTILES)
+    pool = ProjectilePool(PROJECTILES)
+    for tile, angle in zip(tiles.tolist(), angles.tolist()):
+        r, c = divmod(tile, level.cols)
+        pool.spawn(((c + 0.5) * grid_w, (r + 0.5) * grid_h), (math.cos(angle), math.sin(angle)),
+                   PROJECTILE_SPEED, rng.uniform(0, 500))
+    start = [(array, array.copy()) for array in (pool.positions, pool.directions, pool.speeds,
+                                                 pool.spawn_times, pool.alive)]
+    targets = SpatialHash(max(grid_w, MIN_HASH_CELL), max(grid_h, MIN_HASH_CELL))
+    targets.build(rng.uniform(0, 1, (PROJECTILE_TARGETS, 2)) * (width, height))
+
+    def restart():
+        pool.count = PROJECTILES
+        for array, copy in start:
+            array[:] = copy
+
+    def step():
+        restart()
+        pool.step(FIXED_DELTA_T, width, height, wall_index, targets, ENEMY_HIT_RADIUS)
+
+    def draw():
+        renderer.begin_frame()
+        pool.draw(batch, 1000.0, frames, 500)
+        renderer.draw_batch(batch)
+        renderer.end_frame()
+
+    def frame():
+        step()
+        draw()
+
+    # the game freezes what it loaded before its main loop (see marian_cs_main.py), so does this
+    gc.freeze()
+    results['projectiles/step'] = measure(step, memory)
+    restart()
+    results['projectiles/draw'] = measure(draw, memory)
+    results['projectiles/frame'] = measure(frame, memory)
+    gc.unfreeze()
+    return results
+
+
+def run_suite(sizes=SIZES, densities=DENSITIES, only=None, memory=True, log=None):
+    '''
+        Run every benchmark on every map size and wall density.
+        only keeps the benchmarks whose name contains it, like 'path'.
+        Returns a dictionary from 'name/backend@size/density' to the results.
+    '''
+    pygame.init()
+    # Renderer.end_frame updates the display, so there has to be one
+    pygame.display.set_mode((1, 1))
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            for density in densities:
+                tiles = make_tiles(size, size, density)
+                map_file = os.path.join(folder, 'map_%d_%d.txt' % (size, int(density * 100)))
+                write_tiles(tiles, map_file)
+                level = compile_tiles(tiles, backend='grid')
+                grid_w = grid_h = max(1, RENDER_SIZE // size)
+
+                groups = [
+                    ('graph_build', lambda: bench_graph_build(map_file, size, size, memory)),
+                    ('path', lambda: bench_paths(level, memory)),
+                    ('collision', lambda: bench_collision(level, grid_w, grid_h, memory)),
+                    ('render', lambda: bench_render(level, grid_w, grid_h, memory)),
+                    ('projectiles', lambda: bench_projectiles(level, grid_w, grid_h, memory)),
+                ]
+                for group, run in groups:
+                    if only is not None and only not in group:
+                        continue
+                    for name, result in run().items():
+                        key = '%s@%dx%d/%.2f' % (name, size, size, density)
+                        results[key] = result
+                        if log is not None:
+                            log(key, result)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+        Compare results with a baseline.
+        Returns a list of (key, baseline seconds, seconds, ratio) for every
+        benchmark that got slower than the tolerance allows.
+    '''
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+        old = baseline[key]['seconds']
+        new = result['seconds']
+        if new > old * (1 + tolerance) and new - old > MIN_SLOWDOWN:
+            regressions.append((key, old, new, new / old if old > 0 else float('inf')))
+    return regressions
+
+
+def print_result(key, result):
+    line = "%-50s %10.3f ms" % (key, 1000 * result['seconds'])
+    if 'peak_kb' in result:
+        line += " %12.1f KB" % result['peak_kb']
+    print(line)
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark graph building, pathfinding, collisions and drawing.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='map widths (the maps are square)')
+    parser.add_argument('--densities', type=float, nargs='+', default=list(DENSITIES), help='fractions of wall tiles')
+    parser.add_argument('--only', help='only run benchmarks with this in their name: graph_build, path, collision, '
+                                       'render, projectiles')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='the baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='save these results as the new baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown, 0.25 is 25%%')
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.densities, args.only, not args.no_memory, log=print_result)
+    pygame.quit()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.save_baseline:
+        # keep the entries of benchmarks that were not run this time
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print("saved %d results to %s" % (len(results), args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at %s, run with --save-baseline to make one" % args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for key, old, new, ratio in regressions:
+        print("REGRESSION %-50s %10.3f ms -> %10.3f ms (x%.2f)" % (key, 1000 * old, 1000 * new, ratio))
+    print("%d benchmarks compared, %d regressions" % (len([k for k in results if k in baseline]), len(regressions)))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
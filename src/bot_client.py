@@ -0,0 +1,118 @@
+'''
+    Scripted players for load testing the game server.
+    Each bot connects over TCP, sends an input every tick (aim at the
+    closest enemy, fire now and then, walk in a random direction) and
+    decodes every snapshot it receives, checking that the deltas line up.
+
+    Usage (from the src folder, with game_server.py running):
+        python bot_client.py --bots 32 --seconds 10
+'''
+import argparse
+import asyncio
+import random
+import time
+from simulation import FrameInput
+from net_protocol import (WELCOME, frame, read_message, encode_input, decode_snapshot,
+                          decode_players, decode_positions)
+from game_server import DEFAULT_HOST, DEFAULT_PORT
+
+
+class BotClient(object):
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, seed=0, fire_every=30, move_every=60):
+        self.host = host
+        self.port = port
+        self.random = random.Random(seed)
+        self.fire_every = fire_every
+        self.move_every = move_every
+        self.move = (False, False, False, False)
+        self.player_id = None
+        self.tick_rate = None
+        self.tick = 0
+        self.arrays = None          # the last snapshot, the baseline of the next one
+        self.stats = {'snapshots': 0, 'bytes': 0, 'full_snapshots': 0, 'errors': 0, 'inputs': 0}
+
+    def next_input(self):
+        '''
+            Aim at the closest enemy, from the last snapshot.
+        '''
+        if self.stats['inputs'] % self.move_every == 0:
+            self.move = tuple(self.random.random() < 0.3 for i in range(4))
+        up, down, left, right = self.move
+        fire = self.stats['inputs'] % self.fire_every == 0
+        self.stats['inputs'] += 1
+
+        target = (0, 0)
+        if self.arrays is not None:
+            me = [p for p in decode_players(self.arrays[0]) if p[0] == self.player_id]
+            enemies = decode_positions(self.arrays[1])
+            if me and len(enemies):
+                x, y = me[0][1], me[0][2]
+                closest = ((enemies[:, 0] - x) ** 2 + (enemies[:, 1] - y) ** 2).argmin()
+                target = tuple(enemies[closest])
+        return FrameInput(target[0], target[1], up, down, left, right, fire)
+
+    def receive(self, message):
+        tick, baseline_tick, arrays = decode_snapshot(message, self.arrays)
+        if baseline_tick != 0 and baseline_tick != self.tick:
+            # the server made the delta from a snapshot this bot doesn't have
+            self.stats['errors'] += 1
+        if baseline_tick == 0:
+            self.stats['full_snapshots'] += 1
+        self.tick = tick
+        self.arrays = arrays
+        self.stats['snapshots'] += 1
+        self.stats['bytes'] += len(message)
+
+    async def run(self, seconds):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        welcome = await read_message(reader)
+        kind, self.player_id, win_width, win_height, self.tick_rate = WELCOME.unpack(welcome)
+
+        async def read_snapshots():
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    return
+                if message[:1] == b'S':
+                    self.receive(message)
+
+        reading = asyncio.ensure_future(read_snapshots())
+        interval = 1.0 / self.tick_rate
+        end = time.perf_counter() + seconds
+        try:
+            while time.perf_counter() < end and not reading.done():
+                writer.write(frame(encode_input(self.next_input())))
+                await writer.drain()
+                await asyncio.sleep(interval)
+        finally:
+            reading.cancel()
+            writer.close()
+        return self.stats
+
+
+async def run_bots(count, host=DEFAULT_HOST, port=DEFAULT_PORT, seconds=10.0):
+    '''
+        Run count bots at the same time, returns the stats of each one.
+    '''
+    bots = [BotClient(host, port, seed=i) for i in range(count)]
+    return await asyncio.gather(*[bot.run(seconds) for bot in bots])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the game server with scripted players.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='the server address')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='the server port')
+    parser.add_argument('--bots', type=int, default=16, help='the number of players to connect')
+    parser.add_argument('--seconds', type=float, default=10.0, help='how long to play')
+    args = parser.parse_args()
+
+    all_stats = asyncio.run(run_bots(args.bots, args.host, args.port, args.seconds))
+    snapshots = sum(s['snapshots'] for s in all_stats)
+    data = sum(s['bytes'] for s in all_stats)
+    print("%d bots, %d snapshots, %.1f snapshots/s per bot, %.0f bytes/snapshot, %d full, %d errors" % (
+        args.bots, snapshots, snapshots / args.bots / args.seconds, data / max(snapshots, 1),
+        sum(s['full_snapshots'] for s in all_stats), sum(s['errors'] for s in all_stats)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+'''
+    Collision tests against the walls of a tile map.
+    The WallIndex is built once from the map's wall mask. A circle can only
+    touch the few tiles under it, so only those tiles are tested, instead of
+    every wall in the map.
+'''
+import math
+import numpy as np
+
+# batches this small are faster one at a time than with numpy
+SMALL_BATCH = 16
+
+
+# detect if a circle and rectangle collide / intersect
+# http://www.jeffreythompson.org/collision-detection/circle-rect.php
+def collide_circle_rect(point, radius, rect):
+    #  assume point is a pygame.math.Vector2
+    rect_x, rect_y, width, height = rect
+
+    test_x = point.x
+    test_y = point.y
+
+    if point.x < rect_x:
+        test_x = rect_x
+    elif point.x > rect_x + width:
+        test_x = rect_x + width
+
+    if point.y < rect_y:
+        test_y = rect_y
+    elif point.y > rect_y + height:
+        test_y = rect_y + height
+
+    dist_x = point.x - test_x
+    dist_y = point.y - test_y
+    distance = math.sqrt(dist_x**2 + dist_y**2)
+    if distance <= radius:
+        return True
+    else:
+        return False
+
+
+# the candidates whose circle reaches their row (or column) lines, which is offset rows away
+# from their own. The gap is worked out the same way as in collide_wall_many's distance
+def _reaching(centers, lines, size, offset, radii_squared, candidates):
+    start = lines[candidates] * size
+    if offset < 0:
+        gap = centers[candidates] - (start + size)
+    else:
+        gap = start - centers[candidates]
+    gap = np.maximum(gap, 0)
+    return candidates[gap * gap <= radii_squared[candidates]]
+
+
+class WallIndex(object):
+    def __init__(self, walls, grid_rows, grid_cols, grid_width, grid_height):
+        self.walls = walls  # 1 for a wall tile, indexed by vertex (r * cols + c)
+        self.rows = grid_rows
+        self.cols = grid_cols
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        # the same mask as a 2D numpy array for the batch test
+        self.wall_grid = np.frombuffer(bytes(walls), dtype=np.uint8).reshape(grid_rows, grid_cols).astype(bool)
+
+    @classmethod
+    def from_map(cls, level, grid_width, grid_height):
+        index = cls(level.walls, level.rows, level.cols, grid_width, grid_height)
+        level.add_listener(index.wall_changed)
+        return index
+
+    # keep the numpy mask the same as the walls when a wall is added or removed
+    def wall_changed(self, r, c, is_wall):
+        self.wall_grid[r, c] = is_wall
+
+    # the range of tiles that a circle could touch. A circle whose edge is exactly
+    # on a tile's right or lower side touches that tile too, hence ceil - 1 at the low end
+    def _tile_range(self, x, y, radius):
+        c0 = max(int(math.ceil((x - radius) / self.grid_width)) - 1, 0)
+        c1 = min(int(math.floor((x + radius) / self.grid_width)), self.cols - 1)
+        r0 = max(int(math.ceil((y - radius) / self.grid_height)) - 1, 0)
+        r1 = min(int(math.floor((y + radius) / self.grid_height)), self.rows - 1)
+        return r0, r1, c0, c1
+
+    def collide_wall(self, position, radius):
+        '''
+            True if a circle at position touches any wall tile.
+            Gives the same answer as collide_circle_rect against every wall.
+        '''
+        x, y = position[0], position[1]
+        w = self.grid_width
+        h = self.grid_height
+        r0, r1, c0, c1 = self._tile_range(x, y, radius)
+        for r in range(r0, r1 + 1):
+            row_start = r * self.cols
+            rect_y = r * h
+            for c in range(c0, c1 + 1):
+                if not self.walls[row_start + c]:
+                    continue
+                rect_x = c * w
+                test_x = min(max(x, rect_x), rect_x + w)
+                test_y = min(max(y, rect_y), rect_y + h)
+                if math.sqrt((x - test_x)**2 + (y - test_y)**2) <= radius:
+                    return True
+        return False
+
+    def collide_wall_many(self, positions, radii):
+        '''
+            Test many circles at once.
+            positions is an (n, 2) array of x, y and radii is one radius or n of them.
+            Returns a boolean array, True where the circle touches a wall.
+        '''
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        n = len(positions)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (n,))
+        hits = np.zeros(n, dtype=bool)
+        if n == 0 or self.rows == 0 or self.cols == 0:
+            return hits
+        if n <= SMALL_BATCH:
+            for i, (x, y) in enumerate(positions.tolist()):
+                hits[i] = self.collide_wall((x, y), radii[i])
+            return hits
+
+        x = positions[:, 0]
+        y = positions[:, 1]
+        w = self.grid_width
+        h = self.grid_height
+        base_c = np.floor(x / w).astype(np.int64)
+        base_r = np.floor(y / h).astype(np.int64)
+
+        # check every tile offset that the largest circle could reach. A circle
+        # only needs the tiles of another row or column if it reaches its edge
+        max_radius = float(radii.max())
+        span_c = int(max_radius // w) + 1
+        span_r = int(max_radius // h) + 1
+        radii_squared = radii * radii
+        everyone = np.arange(n)
+        for dr in range(-span_r, span_r + 1):
+            rows_near = everyone if dr == 0 else _reaching(y, base_r + dr, h, dr, radii_squared, everyone)
+            for dc in range(-span_c, span_c + 1):
+                near = rows_near if dc == 0 else _reaching(x, base_c + dc, w, dc, radii_squared, rows_near)
+                r = base_r[near] + dr
+                c = base_c[near] + dc
+                inside = (r >= 0) & (r < self.rows) & (c >= 0) & (c < self.cols)
+                near, r, c = near[inside], r[inside], c[inside]
+                # only the circles next to a wall tile at this offset need the distance
+                on_wall = self.wall_grid[r, c]
+                near, r, c = near[on_wall], r[on_wall], c[on_wall]
+                if len(near) == 0:
+                    continue
+                rect_x = c * w
+                rect_y = r * h
+                test_x = np.minimum(np.maximum(x[near], rect_x), rect_x + w)
+                test_y = np.minimum(np.maximum(y[near], rect_y), rect_y + h)
+                distance = np.sqrt((x[near] - test_x)**2 + (y[near] - test_y)**2)
+                hits[near] |= distance <= radii[near]
+        return hits
+
@@ -0,0 +1,161 @@
+'''
+    All of the enemies in the game, stored as NumPy arrays.
+    Like the ProjectilePool, each property is one array with a row per
+    enemy, so there is no Python object per enemy. One update moves every
+    enemy at once: each one looks up its next tile in the distance field
+    towards the player, steers to it (or straight at the player when it is
+    close and in sight), and the moves that would hit a wall or leave the window are
+    thrown out with one batched wall test.
+
+    Enemies start on the 'e' tiles of the map. A tile can start more than
+    one enemy, the extra ones are spread around inside the tile.
+'''
+import numpy as np
+from spatial_hash import SpatialHash
+
+# the smallest hash cell, in pixels. With tiny map tiles a hit radius would
+# cover many cells and every lookup would look through all of them
+MIN_HASH_CELL = 16
+
+
+class EnemyManager(object):
+    def __init__(self, grid_width, grid_height, grid_rows, grid_cols, capacity=64):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.rows = grid_rows
+        self.cols = grid_cols
+        self.count = 0                       # the enemies are rows 0 .. count-1
+        self.positions = np.zeros((capacity, 2))
+        self.starts = np.zeros((capacity, 2))  # where each enemy goes back to when it is hit
+        # the enemies sorted into map tiles, for projectile hits and touching the player
+        self.hash = SpatialHash(max(grid_width, MIN_HASH_CELL), max(grid_height, MIN_HASH_CELL))
+        # the distance field's next vertices as an array, made again when the field changes
+        self.next_vertex = np.zeros(0, dtype=np.int64)
+        self.field_key = None
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = max(2 * len(self.positions), 16)
+        for name in ('positions', 'starts'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, x, y):
+        if self.count == len(self.positions):
+            self._grow()
+        i = self.count
+        self.positions[i] = (x, y)
+        self.starts[i] = (x, y)
+        self.count += 1
+        return i
+
+    def spawn_tiles(self, tiles, per_tile=1, seed=0):
+        '''
+            Start per_tile enemies on each (row, col) tile.
+            The first one is in the center of the tile, the others are at
+            random places in the middle half of it (the same places for the same seed).
+        '''
+        rng = np.random.RandomState(seed)
+        w = self.grid_width
+        h = self.grid_height
+        for r, c in tiles:
+            center_x = c * w + w / 2
+            center_y = r * h + h / 2
+            self.spawn(center_x, center_y)
+            for i in range(per_tile - 1):
+                dx, dy = rng.uniform(-0.25, 0.25, 2)
+                self.spawn(center_x + dx * w, center_y + dy * h)
+
+    def reset(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        self.positions[indices] = self.starts[indices]
+
+    def clear(self):
+        self.count = 0
+
+    def _next_vertices(self, field):
+        key = (field.goal, field.version)
+        if key != self.field_key:
+            self.next_vertex = np.asarray(field.next_vertex, dtype=np.int64)
+            self.field_key = key
+        return self.next_vertex
+
+    def update(self, delta_t, player_locations, field, wall_index, window_width, window_height,
+               speed, chase_distance, margin, visibility=None):
+        '''
+            Move every enemy towards the closest player.
+            player_locations is one (x, y) or a list of them, field is a
+            DistanceField already updated for the players' tiles.
+            Enemies within chase_distance that can see the player's tile (with
+            a VisibilityIndex) head straight for the player, the others
+            follow the field one tile at a time. A move is skipped if it
+            touches a wall or comes within margin of the window edge.
+        '''
+        n = self.count
+        if n == 0:
+            return
+        positions = self.positions[:n]
+        x = positions[:, 0]
+        y = positions[:, 1]
+        w = self.grid_width
+        h = self.grid_height
+        players = np.asarray(player_locations, dtype=float).reshape(-1, 2)
+        if len(players) == 1:
+            player_x, player_y = players[0]
+        else:
+            # each enemy chases the player closest to it
+            closest = np.argmin((x[:, None] - players[:, 0]) ** 2 + (y[:, None] - players[:, 1]) ** 2, axis=1)
+            player_x = players[closest, 0]
+            player_y = players[closest, 1]
+
+        # the next tile towards the player, from the tile each enemy is on
+        c = np.clip((x // w).astype(np.int64), 0, self.cols - 1)
+        r = np.clip((y // h).astype(np.int64), 0, self.rows - 1)
+        vertex = r * self.cols + c
+        next_vertex = self._next_vertices(field)[vertex]
+        next_x = (next_vertex % self.cols) * w + w / 2
+        next_y = (next_vertex // self.cols) * h + h / 2
+
+        chase = np.hypot(player_x - x, player_y - y) <= chase_distance
+        if visibility is not None and chase.any():
+            player_vertex = (np.minimum(np.floor_divide(player_y, h).astype(np.int64), self.rows - 1) * self.cols +
+                             np.minimum(np.floor_divide(player_x, w).astype(np.int64), self.cols - 1))
+            chase[chase] = visibility.can_see_many(vertex[chase], np.broadcast_to(player_vertex, (n,))[chase])
+        follow_path = (next_vertex != -1) & (next_vertex != vertex) & ~chase
+        direction_x = np.where(follow_path, next_x, player_x) - x
+        direction_y = np.where(follow_path, next_y, player_y) - y
+        length = np.hypot(direction_x, direction_y)
+        moving = length > 0
+        length[~moving] = 1
+
+        new_x = x + direction_x / length * delta_t * speed
+        new_y = y + direction_y / length * delta_t * speed
+        new_positions = np.column_stack((new_x, new_y))
+        inside = ((new_x >= margin) & (new_x <= window_width - margin) &
+                  (new_y >= margin) & (new_y <= window_height - margin))
+        moving &= inside
+        if moving.any():
+            moving[moving] = ~wall_index.collide_wall_many(new_positions[moving], 1)
+        positions[moving] = new_positions[moving]
+
+    # sort the enemies into the spatial hash, call after they move
+    def build_hash(self):
+        self.hash.build(self.positions[:self.count])
+
+    # the index of the enemy closest to point within radius, or -1
+    def touching(self, point, radius):
+        return int(self.hash.closest([(point[0], point[1])], radius)[0])
+
+    # draw every enemy with the same image, offset from its position.
+    # returns the rectangles drawn (None for a SpriteBatch, its flush() returns them)
+    def draw(self, surface, image, offset_x, offset_y):
+        return draw_enemies(surface, self.positions[:self.count], image, offset_x, offset_y)
+
+
+# draw enemies from an (n, 2) array of positions, see EnemyManager.draw
+def draw_enemies(surface, positions, image, offset_x, offset_y):
+    return surface.blits([(image, (x - offset_x, y - offset_y)) for x, y in positions.tolist()])
@@ -0,0 +1,205 @@
+'''
+    A game server that runs one simulation for many players.
+    The server owns the game (it is authoritative): clients connect over
+    TCP, send their input, and every tick receive a snapshot of the
+    players, enemies and projectiles (see net_protocol.py). Each client
+    controls one player, enemies chase the closest player.
+
+    A snapshot is encoded once per baseline, not once per client: clients
+    that are up to date all need the same delta, so the cost of a tick
+    barely grows with the number of clients. A client that can't keep up
+    (its send buffer is full) skips snapshots and gets a bigger delta when
+    it catches up, so it never slows the others down.
+
+    Usage (from the src folder):
+        python game_server.py [--port 8765] [--tick-rate 60]
+        python bot_client.py --bots 32          # load test with scripted players
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import asyncio
+import time
+import pygame
+from map_compiler import compile_map
+from simulation import Simulation, FrameInput
+from net_protocol import (WELCOME, frame, read_message, decode_input, snapshot_arrays, encode_snapshot)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+TICK_RATE = 60
+# snapshots kept to be used as baselines, a client further behind gets a full snapshot
+HISTORY_TICKS = 64
+# a client with more than this many bytes waiting to be sent skips snapshots
+MAX_SEND_BUFFER = 256 * 1024
+
+
+class ClientSession(object):
+    def __init__(self, player_id, writer):
+        self.player_id = player_id
+        self.writer = writer
+        self.input = FrameInput()     # the last input received
+        self.fire_pending = False     # a click since the last tick
+        self.last_tick = 0            # the last snapshot sent, the baseline of the next one
+        self.skipped = 0              # snapshots not sent because the client was behind
+
+
+class GameServer(object):
+    def __init__(self, map_file='../data/map.txt', host=DEFAULT_HOST, port=DEFAULT_PORT, tick_rate=TICK_RATE,
+                 win_width=900, win_height=900, enemies_per_spawn=1):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.delta_t = 1000.0 / tick_rate
+        self.win_width = win_width
+        self.win_height = win_height
+        level = compile_map(map_file, backend='grid')
+        self.sim = Simulation(level, win_width, win_height, enemies_per_spawn=enemies_per_spawn, players=0)
+        self.clients = {}     # player id -> ClientSession
+        self.history = {}     # tick -> snapshot arrays
+        self.server = None
+        self.running = False
+        self.stats = {'ticks': 0, 'snapshots': 0, 'encodes': 0, 'bytes': 0, 'step_seconds': 0.0,
+                      'send_seconds': 0.0, 'late_ticks': 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        # the port the server really got, when port 0 asked for any free one
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def handle_client(self, reader, writer):
+        player_id = self.sim.add_player()
+        session = ClientSession(player_id, writer)
+        self.clients[player_id] = session
+        writer.write(frame(WELCOME.pack(b'W', player_id, self.win_width, self.win_height, self.tick_rate)))
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                if message[:1] == b'I':
+                    frame_input = decode_input(message)
+                    session.fire_pending = session.fire_pending or frame_input.fire
+                    session.input = frame_input
+        finally:
+            del self.clients[player_id]
+            self.sim.remove_player(player_id)
+            writer.close()
+
+    def step(self):
+        start = time.perf_counter()
+        inputs = {}
+        for session in self.clients.values():
+            frame_input = session.input
+            inputs[session.player_id] = FrameInput(frame_input.mouse_x, frame_input.mouse_y, frame_input.up,
+                                                   frame_input.down, frame_input.left, frame_input.right,
+                                                   fire=session.fire_pending)
+            session.fire_pending = False
+        self.sim.step_players(inputs, self.delta_t)
+        middle = time.perf_counter()
+        self.broadcast()
+        self.stats['ticks'] += 1
+        self.stats['step_seconds'] += middle - start
+        self.stats['send_seconds'] += time.perf_counter() - middle
+
+    def broadcast(self):
+        tick = self.sim.tick
+        arrays = snapshot_arrays(self.sim)
+        self.history[tick] = arrays
+        self.history.pop(tick - HISTORY_TICKS, None)
+
+        encoded = {}   # baseline tick -> message, shared by every client with that baseline
+        for session in self.clients.values():
+            transport = session.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > MAX_SEND_BUFFER:
+                session.skipped += 1
+                continue
+            baseline_tick = session.last_tick if session.last_tick in self.history else 0
+            message = encoded.get(baseline_tick)
+            if message is None:
+                message = frame(encode_snapshot(tick, arrays, baseline_tick, self.history.get(baseline_tick)))
+                encoded[baseline_tick] = message
+                self.stats['encodes'] += 1
+            session.writer.write(message)
+            session.last_tick = tick
+            self.stats['snapshots'] += 1
+            self.stats['bytes'] += len(message)
+
+    async def run(self, seconds=None, report_every=None):
+        '''
+            Step the game at the tick rate, for seconds or until stop() is called.
+            A tick that starts late runs right away. If the server falls more than a
+            few ticks behind, the missed ticks are dropped instead of run in a burst.
+        '''
+        loop = asyncio.get_running_loop()
+        self.running = True
+        interval = 1.0 / self.tick_rate
+        started = loop.time()
+        next_tick = started
+        next_report = started + report_every if report_every else None
+        while self.running and (seconds is None or loop.time() - started < seconds):
+            self.step()
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < -5 * interval:
+                self.stats['late_ticks'] += 1
+                next_tick = loop.time()
+                delay = 0
+            if next_report is not None and loop.time() >= next_report:
+                print(self.report())
+                next_report += report_every
+            await asyncio.sleep(max(delay, 0))
+
+    def stop(self):
+        self.running = False
+
+    async def close(self):
+        self.running = False
+        for session in list(self.clients.values()):
+            session.writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def report(self):
+        ticks = max(self.stats['ticks'], 1)
+        return "tick %d, %d clients, %.2f ms step, %.2f ms send, %.0f bytes/snapshot, %.2f encodes/tick" % (
+            self.sim.tick, len(self.clients), 1000 * self.stats['step_seconds'] / ticks,
+            1000 * self.stats['send_seconds'] / ticks, self.stats['bytes'] / max(self.stats['snapshots'], 1),
+            self.stats['encodes'] / ticks)
+
+
+async def serve(args):
+    server = GameServer(args.map, args.host, args.port, args.tick_rate, enemies_per_spawn=args.enemies)
+    await server.start()
+    print("serving on %s:%d at %d ticks per second" % (server.host, server.port, server.tick_rate))
+    try:
+        await server.run(args.seconds, report_every=5.0)
+    finally:
+        await server.close()
+    print(server.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the game as a server for many players.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='the address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='the TCP port to listen on')
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help='simulation steps per second')
+    parser.add_argument('--map', default='../data/map.txt', help='the map file to load')
+    parser.add_argument('--enemies', type=int, default=1, help='enemies to start on each enemy tile')
+    parser.add_argument('--seconds', type=float, help='stop after this many seconds')
+    args = parser.parse_args()
+    pygame.init()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,27 @@
 '''
     A class to represent a grid graph
 '''
+import heapq
+import math
+import os
 from collections import deque
+import numpy as np
 
 
 class Graph(object):
-    def __init__(self, n):
+    def __init__(self, n, grid_rows=None, grid_cols=None):
         self.V = n
+        # the tile grid shape, a square grid is assumed if it is not given
+        if grid_cols is None:
+            grid_cols = int(math.sqrt(n))
+        if grid_rows is None:
+            grid_rows = n // grid_cols if grid_cols else 0
+        self.rows = grid_rows
+        self.cols = grid_cols
+        self.version = 0  # changes every time an edge is added or removed
+        self.listeners = []  # called with (s, t) after an edge changes
+        self.all_pairs = None  # an AllPairsTable of every shortest path, see create_tile_graph
+        self.jump_table = None  # (version, tables) of horizontal_jump_table
         self.matrix = []
         for i in range(n):
             self.matrix.append([0 for i in range(n)])
@@ -14,10 +29,14 @@ class Graph(object):
     def add_edge(self, s, t):
         self.matrix[s][t] = 1
         self.matrix[t][s] = 1
+        self.version += 1
+        self.notify(s, t)
 
     def remove_edge(self, s, t):
         self.matrix[s][t] = 0
         self.matrix[t][s] = 0
+        self.version += 1
+        self.notify(s, t)
 
     def is_adjacent(self, s, t):
         return bool(self.matrix[s][t])
@@ -29,8 +48,27 @@ class Graph(object):
                 adjacent_vertices.append(i)
         return adjacent_vertices
 
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, s, t):
+        for callback in self.listeners:
+            callback(s, t)
+
+    # a copy of the edges with the same version, the listeners are not copied
+    def copy(self):
+        graph = Graph(0, self.rows, self.cols)
+        graph.V = self.V
+        graph.matrix = [row[:] for row in self.matrix]
+        graph.version = self.version
+        return graph
+
     def get_vertex_xy(self, vertex, grid_width, grid_height):
-        r, c = vertex_to_rc(vertex, 10, 10)
+        r, c = vertex_to_rc(vertex, self.rows, self.cols)
         x = (c * grid_width) + grid_width/2
         y = (r * grid_height) + grid_height/2
         # print(r, c, x, y)
@@ -40,57 +78,243 @@ class Graph(object):
         return "Graph: vertices = %s" % str(self.V)
 
 
+'''
+    A compact grid graph for large tile maps.
+    Each tile can only connect to its 4 neighbors (up, down, left, right), so
+    the edges of a tile fit in 4 bits. Memory is O(V) and get_adjacent only
+    looks at the 4 possible neighbors, instead of scanning all V columns.
+'''
+# bit flags for the 4 neighbor directions
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+
+
+class GridGraph(object):
+    def __init__(self, grid_rows, grid_cols):
+        self.V = grid_rows * grid_cols
+        self.rows = grid_rows
+        self.cols = grid_cols
+        self.version = 0  # changes every time an edge is added or removed
+        self.listeners = []  # called with (s, t) after an edge changes
+        self.all_pairs = None  # an AllPairsTable of every shortest path, see create_tile_graph
+        self.jump_table = None  # (version, tables) of horizontal_jump_table
+        self.masks = bytearray(self.V)
+
+    # find the direction bit from s to t and the reverse bit from t to s
+    def _direction(self, s, t):
+        diff = t - s
+        if diff == -self.cols:
+            return UP, DOWN
+        if diff == self.cols:
+            return DOWN, UP
+        if diff == -1 and s % self.cols != 0:
+            return LEFT, RIGHT
+        if diff == 1 and t % self.cols != 0:
+            return RIGHT, LEFT
+        return 0, 0
+
+    def add_edge(self, s, t):
+        bit, reverse_bit = self._direction(s, t)
+        if bit == 0:
+            raise ValueError("GridGraph can only connect neighboring tiles: %s, %s" % (s, t))
+        self.masks[s] |= bit
+        self.masks[t] |= reverse_bit
+        self.version += 1
+        self.notify(s, t)
+
+    def remove_edge(self, s, t):
+        bit, reverse_bit = self._direction(s, t)
+        if bit == 0:
+            return
+        self.masks[s] &= ~bit
+        self.masks[t] &= ~reverse_bit
+        self.version += 1
+        self.notify(s, t)
+
+    def is_adjacent(self, s, t):
+        bit, reverse_bit = self._direction(s, t)
+        return bool(self.masks[s] & bit)
+
+    def get_adjacent(self, s):
+        mask = self.masks[s]
+        adjacent_vertices = []
+        if mask & UP:
+            adjacent_vertices.append(s - self.cols)
+        if mask & DOWN:
+            adjacent_vertices.append(s + self.cols)
+        if mask & LEFT:
+            adjacent_vertices.append(s - 1)
+        if mask & RIGHT:
+            adjacent_vertices.append(s + 1)
+        return adjacent_vertices
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, s, t):
+        for callback in self.listeners:
+            callback(s, t)
+
+    # a copy of the edges with the same version, the listeners are not copied
+    def copy(self):
+        graph = GridGraph(self.rows, self.cols)
+        graph.masks = bytearray(self.masks)
+        graph.version = self.version
+        return graph
+
+    def get_vertex_xy(self, vertex, grid_width, grid_height):
+        r, c = vertex_to_rc(vertex, self.rows, self.cols)
+        x = (c * grid_width) + grid_width/2
+        y = (r * grid_height) + grid_height/2
+        return x, y
+
+    def __str__(self):
+        return "GridGraph: vertices = %s (%s x %s)" % (str(self.V), self.rows, self.cols)
+
+
 def vertex_to_rc(vertex_id, grid_rows, grid_cols):
-    r = int(vertex_id / grid_rows)
+    r = vertex_id // grid_cols
     c = vertex_id % grid_cols
     return r, c
 
 
-def rc_to_vertex(r, c, grid_rows):
-    return r*grid_rows + c
+def rc_to_vertex(r, c, grid_cols):
+    return r*grid_cols + c
 
 
-def create_tile_graph(filename):
-    tile_map = []
-    with open(filename, 'r') as f:
-        for i in range(10):
-            line = f.readline()
-            if line:
-                tile_map.append(line[:10])
-    grid_rows = len(tile_map)
-    grid_cols = len(tile_map[0])
-    n_tiles = grid_rows * grid_cols
-    graph = Graph(n_tiles)
+# backends that create_tile_graph can build, see 'backend' below
+GRAPH_BACKENDS = ('matrix', 'grid')
+
+
+def new_graph(grid_rows, grid_cols, backend='matrix'):
+    '''
+        Create an empty graph for a grid_rows x grid_cols tile map.
+        'matrix' is the original V x V adjacency matrix, 'grid' is the
+        compact GridGraph with 4 neighbor bits per tile.
+    '''
+    if backend == 'matrix':
+        return Graph(grid_rows * grid_cols, grid_rows, grid_cols)
+    elif backend == 'grid':
+        return GridGraph(grid_rows, grid_cols)
+    raise ValueError("unknown graph backend '%s', use one of %s" % (backend, GRAPH_BACKENDS))
 
-    # build a square grid
-    for i in range(n_tiles):
-        if int(i / grid_rows) != 0:
-            graph.add_edge(i, i - grid_cols)  # upper neighbor
 
-        if int(i / grid_rows) != (grid_rows - 1):
-            graph.add_edge(i, i + grid_cols)  # lower neighbor
+def read_tile_rows(filename):
+    '''
+        Read a text tile map of any size in one pass.
+        Line endings are dropped and short lines are padded with spaces, so
+        every row has the same number of columns.
+    '''
+    with open(filename, 'r') as f:
+        rows = [line.rstrip('\r\n') for line in f]
+    # ignore blank lines at the end of the file
+    while rows and not rows[-1].strip():
+        rows.pop()
+    grid_cols = max(len(row) for row in rows) if rows else 0
+    return [row.ljust(grid_cols) for row in rows]
+
 
-        if i % grid_cols != 0:
-            graph.add_edge(i, i - 1)  # left neighbor
+def build_tile_graph(walls, grid_rows, grid_cols, backend='matrix'):
+    '''
+        Build the walkable graph from a wall mask in linear time.
+        walls[v] is true for wall tiles. Every open tile is connected to its
+        open right and lower neighbors, which covers each edge exactly once.
+    '''
+    graph = new_graph(grid_rows, grid_cols, backend)
+    for r in range(grid_rows):
+        row_start = r * grid_cols
+        for c in range(grid_cols):
+            vertex = row_start + c
+            if walls[vertex]:
+                continue
+            if c + 1 < grid_cols and not walls[vertex + 1]:
+                graph.add_edge(vertex, vertex + 1)  # right neighbor
+            if r + 1 < grid_rows and not walls[vertex + grid_cols]:
+                graph.add_edge(vertex, vertex + grid_cols)  # lower neighbor
+    return graph
 
-        if i % grid_cols != (grid_cols - 1):
-            graph.add_edge(i, i + 1)  # right neighbor
 
-    # remove the wall tiles
+def create_tile_graph(filename, backend='matrix', all_pairs=False, cache_dir=None):
+    '''
+        Build the graph of a text map file.
+        With all_pairs the shortest path between every two tiles is worked
+        out now (see all_pairs.py), so get_shortest_path only looks them up.
+        The table is saved in cache_dir (data/.cache by default) and loaded
+        from there the next time.
+    '''
+    tile_map = read_tile_rows(filename)
+    grid_rows = len(tile_map)
+    grid_cols = len(tile_map[0]) if tile_map else 0
+    walls = bytearray(grid_rows * grid_cols)
     for r in range(grid_rows):
         for c in range(grid_cols):
             if tile_map[r][c] == '#':
-                vertex = rc_to_vertex(r, c, grid_rows)
-                adjacent_vertices = graph.get_adjacent(vertex)
-                for i in adjacent_vertices:
-                    graph.remove_edge(vertex, i)
+                walls[rc_to_vertex(r, c, grid_cols)] = 1
+    graph = build_tile_graph(walls, grid_rows, grid_cols, backend)
+    if all_pairs:
+        from all_pairs import AllPairsTable, CACHE_DIR
+        name = os.path.splitext(os.path.basename(filename))[0]
+        graph.all_pairs = AllPairsTable.load_or_build(graph, name, cache_dir or CACHE_DIR)
     return graph
 
 
-def get_shortest_path(start_r, start_c, goal_r, goal_c, graph):
-    start_vertex = rc_to_vertex(start_r, start_c, 10)
-    goal_vertex = rc_to_vertex(goal_r, goal_c, 10)
+# search methods that get_shortest_path can use
+PATH_METHODS = ('bfs', 'astar', 'jps')
+
+
+def get_shortest_path(start_r, start_c, goal_r, goal_c, graph, method='bfs'):
+    '''
+        Find a shortest path of vertices from the start tile to the goal tile.
+        method='bfs'    breadth first search, works on any graph
+        method='astar'  A* with a Manhattan distance heuristic
+        method='jps'    jump point search, for grids where a blocked tile has no edges
+        All methods give paths of the same length, [] if there is no path.
+        If the graph has an all pairs table that is up to date, the path is
+        read from it instead, whatever the method.
+    '''
+    start_vertex = rc_to_vertex(start_r, start_c, graph.cols)
+    goal_vertex = rc_to_vertex(goal_r, goal_c, graph.cols)
+
+    table = getattr(graph, 'all_pairs', None)
+    if table is not None and not table.is_stale():
+        return table.path(start_vertex, goal_vertex)
+
+    if method == 'bfs':
+        predecessors = bfs_search(start_vertex, goal_vertex, graph)
+    elif method == 'astar':
+        predecessors = astar_search(start_vertex, goal_vertex, graph)
+    elif method == 'jps':
+        predecessors = jps_search(start_vertex, goal_vertex, graph)
+    else:
+        raise ValueError("unknown path method '%s', use one of %s" % (method, PATH_METHODS))
+
+    path = build_path(predecessors, goal_vertex)
+    if method == 'jps':
+        path = fill_jump_path(path, graph.cols)
+    return path
 
+
+def build_path(predecessors, goal_vertex):
+    if goal_vertex not in predecessors:
+        return []
+
+    # walk back from the goal, then flip the list once (linear time)
+    path = [goal_vertex]
+    pred = predecessors[goal_vertex]
+    while pred != -1:
+        path.append(pred)
+        pred = predecessors[pred]
+    path.reverse()
+    return path
+
+
+def bfs_search(start_vertex, goal_vertex, graph):
     queue = deque()
     queue.append(start_vertex)
     seen = set()
@@ -109,15 +333,396 @@ def get_shortest_path(start_r, start_c, goal_r, goal_c, graph):
                 predecessors[adj_v] = v
                 queue.append(adj_v)
 
-    if goal_vertex not in predecessors:
-        return []
+    return predecessors
+
+
+def manhattan_distance(s, t, grid_cols):
+    return abs(s // grid_cols - t // grid_cols) + abs(s % grid_cols - t % grid_cols)
+
+
+def astar_search(start_vertex, goal_vertex, graph):
+    cols = graph.cols
+    predecessors = {start_vertex: -1}
+    cost = {start_vertex: 0}
+    closed = set()
+    # (estimated total, estimate to goal, vertex), ties go to the vertex closest to the goal
+    h = manhattan_distance(start_vertex, goal_vertex, cols)
+    open_heap = [(h, h, start_vertex)]
+
+    while open_heap:
+        f, h, v = heapq.heappop(open_heap)
+        if v in closed:
+            continue
+        if v == goal_vertex:
+            break
+        closed.add(v)
+
+        new_cost = cost[v] + 1
+        for adj_v in graph.get_adjacent(v):
+            if adj_v in closed:
+                continue
+            if new_cost < cost.get(adj_v, new_cost + 1):
+                cost[adj_v] = new_cost
+                predecessors[adj_v] = v
+                h = manhattan_distance(adj_v, goal_vertex, cols)
+                heapq.heappush(open_heap, (new_cost + h, h, adj_v))
+
+    return predecessors
+
+
+def jps_search(start_vertex, goal_vertex, graph):
+    '''
+        Jump point search on a 4-connected grid with unit costs.
+        Instead of adding every neighbor to the open list, the search jumps
+        in straight lines and only stops at the goal or at tiles where a
+        new direction opens up (jump points). The predecessors link jump
+        points, use fill_jump_path to get every tile on the path.
+        This assumes edges follow the tiles: an open tile is connected to
+        all of its open neighbors (the graphs made by build_tile_graph).
+    '''
+    rows = graph.rows
+    cols = graph.cols
+
+    # the open directions (UP, DOWN, LEFT, RIGHT bits) out of vertex v
+    masks = getattr(graph, 'masks', None)
+    if masks is not None:
+        open_directions = masks.__getitem__
+    else:
+        def open_directions(v):
+            r, c = v // cols, v % cols
+            mask = 0
+            if r > 0 and graph.is_adjacent(v, v - cols):
+                mask |= UP
+            if r < rows - 1 and graph.is_adjacent(v, v + cols):
+                mask |= DOWN
+            if c > 0 and graph.is_adjacent(v, v - 1):
+                mask |= LEFT
+            if c < cols - 1 and graph.is_adjacent(v, v + 1):
+                mask |= RIGHT
+            return mask
+
+    # horizontal jumps are looked up, one scan of the whole map for every version of the graph
+    right_jumps, right_ends, left_jumps, left_starts = horizontal_jump_table(graph)
+
+    def jump_horizontal(v, bit, offset):
+        # the goal comes first if it is in the same open stretch of the row, before the jump point
+        if bit == RIGHT:
+            jump_point = right_jumps[v]
+            if v < goal_vertex <= right_ends[v] and (jump_point == -1 or goal_vertex < jump_point):
+                return goal_vertex
+            return jump_point
+        jump_point = left_jumps[v]
+        if left_starts[v] <= goal_vertex < v and goal_vertex > jump_point:
+            return goal_vertex
+        return jump_point
+
+    def jump_vertical(v, bit, offset):
+        mask = open_directions(v)
+        while mask & bit:
+            v += offset
+            if v == goal_vertex:
+                return v
+            prev_mask = mask
+            mask = open_directions(v)
+            if mask & ~prev_mask & (LEFT | RIGHT):
+                return v
+            # moving vertically, stop if a horizontal jump finds something
+            if mask & RIGHT and jump_horizontal(v, RIGHT, 1) != -1:
+                return v
+            if mask & LEFT and jump_horizontal(v, LEFT, -1) != -1:
+                return v
+        return -1
+
+    # (direction bit, vertex offset, is the move horizontal)
+    move_up = (UP, -cols, False)
+    move_down = (DOWN, cols, False)
+    move_left = (LEFT, -1, True)
+    move_right = (RIGHT, 1, True)
+    all_moves = (move_up, move_down, move_left, move_right)
+
+    predecessors = {start_vertex: -1}
+    cost = {start_vertex: 0}
+    closed = set()
+    h = manhattan_distance(start_vertex, goal_vertex, cols)
+    open_heap = [(h, h, start_vertex)]
+
+    while open_heap:
+        f, h, v = heapq.heappop(open_heap)
+        if v in closed:
+            continue
+        if v == goal_vertex:
+            break
+        closed.add(v)
+
+        # prune the directions using the direction we arrived from
+        parent = predecessors[v]
+        if parent == -1:
+            moves = all_moves
+        elif parent // cols == v // cols:
+            moves = (move_up, move_down, move_right if v > parent else move_left)
+        else:
+            moves = (move_left, move_right, move_down if v > parent else move_up)
+
+        for bit, offset, horizontal in moves:
+            if horizontal:
+                jump_point = jump_horizontal(v, bit, offset)
+            else:
+                jump_point = jump_vertical(v, bit, offset)
+            if jump_point == -1 or jump_point in closed:
+                continue
+            new_cost = cost[v] + manhattan_distance(v, jump_point, cols)
+            if new_cost < cost.get(jump_point, new_cost + 1):
+                cost[jump_point] = new_cost
+                predecessors[jump_point] = v
+                h = manhattan_distance(jump_point, goal_vertex, cols)
+                heapq.heappush(open_heap, (new_cost + h, h, jump_point))
+
+    return predecessors
+
+
+def horizontal_jump_table(graph):
+    '''
+        Where a horizontal jump of jps_search stops, for every tile at once.
+        Moving right from v the jump stops at the first tile where up or down
+        opens up (a forced neighbor), or gives up at the end of the open
+        stretch of the row. Returns four lists indexed by vertex:
+        right_jumps and left_jumps, the jump point or -1, and right_ends and
+        left_starts, the last tile a jump can reach each way (to check
+        for the goal, which depends on the search).
+        The lists are kept on the graph until its edges change.
+    '''
+    saved = getattr(graph, 'jump_table', None)
+    if saved is not None and saved[0] == graph.version:
+        return saved[1]
+    V = graph.V
+    cols = graph.cols
+    if hasattr(graph, 'masks'):
+        masks = np.frombuffer(bytes(graph.masks), dtype=np.uint8).astype(np.int64)
+    else:
+        masks = np.zeros(V, dtype=np.int64)
+        for v in range(V):
+            for bit, t in ((UP, v - cols), (DOWN, v + cols), (LEFT, v - 1), (RIGHT, v + 1)):
+                if 0 <= t < V and (t // cols == v // cols or bit in (UP, DOWN)) and graph.is_adjacent(v, t):
+                    masks[v] |= bit
+    vertices = np.arange(V)
+    vertical = masks & (UP | DOWN)
+
+    # moving right: forced where up or down is open but wasn't on the tile before.
+    # The last tile of a row has no RIGHT, so a stretch never runs into the next row
+    forced = np.zeros(V, dtype=bool)
+    forced[1:] = (vertical[1:] & ~masks[:-1]) != 0
+    next_forced = np.minimum.accumulate(np.where(forced, vertices, V)[::-1])[::-1]
+    right_ends = np.minimum.accumulate(np.where(masks & RIGHT, V, vertices)[::-1])[::-1]
+    found = next_forced[np.minimum(vertices + 1, V - 1)]
+    right_jumps = np.where((masks & RIGHT != 0) & (found <= right_ends), found, -1)
+
+    # moving left, the same the other way
+    forced = np.zeros(V, dtype=bool)
+    forced[:-1] = (vertical[:-1] & ~masks[1:]) != 0
+    last_forced = np.maximum.accumulate(np.where(forced, vertices, -1))
+    left_starts = np.maximum.accumulate(np.where(masks & LEFT, -1, vertices))
+    found = last_forced[np.maximum(vertices - 1, 0)]
+    left_jumps = np.where((masks & LEFT != 0) & (found >= left_starts), found, -1)
+
+    tables = (right_jumps.tolist(), right_ends.tolist(), left_jumps.tolist(), left_starts.tolist())
+    graph.jump_table = (graph.version, tables)
+    return tables
 
-    path = [goal_vertex]
-    pred = predecessors[goal_vertex]
-    while pred != -1:
-        path.insert(0, pred)  # insert the vertex at the beginning
-        pred = predecessors[pred]
 
+# add the tiles between the jump points of a jps path, they are on straight lines
+def fill_jump_path(jump_points, grid_cols):
+    if not jump_points:
+        return []
+    path = [jump_points[0]]
+    for t in jump_points[1:]:
+        s = path[-1]
+        if s // grid_cols == t // grid_cols:
+            stride = 1 if t > s else -1
+        else:
+            stride = grid_cols if t > s else -grid_cols
+        path.extend(range(s + stride, t + stride, stride))
     return path
 
 
+'''
+    A distance field (flow field) towards one goal tile.
+    One BFS from the goal gives every tile its distance to the goal and the
+    next tile to step to. Any number of enemies can then look up their next
+    step in O(1). The BFS only runs again when the goal changes or the graph
+    is changed (see Graph.version). The goal can also be a tuple of vertices,
+    then every tile leads to the closest of them (one goal for each player).
+'''
+class DistanceField(object):
+    def __init__(self, graph):
+        self.graph = graph
+        self.goal = -1
+        self.version = -1
+        self.distance = []      # steps to the goal, -1 if unreachable
+        self.next_vertex = []   # the next vertex towards the goal, -1 if unreachable
+
+    def is_stale(self, goal_vertex):
+        return goal_vertex != self.goal or self.graph.version != self.version
+
+    # returns True if the field had to be computed again
+    def update(self, goal_vertex):
+        if not self.is_stale(goal_vertex):
+            return False
+
+        n = self.graph.V
+        distance = [-1] * n
+        next_vertex = [-1] * n
+        queue = deque()
+        for goal in (goal_vertex if isinstance(goal_vertex, tuple) else (goal_vertex,)):
+            distance[goal] = 0
+            next_vertex[goal] = goal
+            queue.append(goal)
+
+        while queue:
+            v = queue.popleft()
+            for adj_v in self.graph.get_adjacent(v):
+                if distance[adj_v] == -1:
+                    distance[adj_v] = distance[v] + 1
+                    next_vertex[adj_v] = v
+                    queue.append(adj_v)
+
+        self.distance = distance
+        self.next_vertex = next_vertex
+        self.goal = goal_vertex
+        self.version = self.graph.version
+        return True
+
+    def next_step(self, vertex):
+        return self.next_vertex[vertex]
+
+    def distance_to_goal(self, vertex):
+        return self.distance[vertex]
+
+    # the full path from vertex to the goal, [] if the goal can't be reached
+    def path_from(self, vertex):
+        if self.next_vertex[vertex] == -1:
+            return []
+        path = [vertex]
+        while self.next_vertex[vertex] != vertex:
+            vertex = self.next_vertex[vertex]
+            path.append(vertex)
+        return path
+
+
+'''
+    Incremental path planning with D* Lite (Koenig and Likhachev, 2002).
+    The planner searches backwards from the goal and remembers its work. It
+    listens to the graph, so when walls or doors add or remove edges only
+    the vertices whose distances change are processed again, instead of
+    searching the whole map from scratch. The start can move (an enemy
+    walking along its path) without starting over.
+'''
+class IncrementalPlanner(object):
+    def __init__(self, graph, start_vertex, goal_vertex):
+        self.graph = graph
+        self.changed_vertices = set()
+        self.reset(start_vertex, goal_vertex)
+        graph.add_listener(self.edge_changed)
+
+    # forget everything and plan from start to goal from scratch
+    def reset(self, start_vertex, goal_vertex):
+        self.start = start_vertex
+        self.goal = goal_vertex
+        self.last_start = start_vertex
+        self.key_modifier = 0
+        self.g = {}
+        self.rhs = {goal_vertex: 0}
+        self.open_heap = []
+        self.open_keys = {}
+        self.changed_vertices.clear()
+        self._push(goal_vertex, (self._heuristic(start_vertex, goal_vertex), 0))
+
+    # stop listening to the graph
+    def close(self):
+        self.graph.remove_listener(self.edge_changed)
+
+    def edge_changed(self, s, t):
+        self.changed_vertices.add(s)
+        self.changed_vertices.add(t)
+
+    def move_start(self, vertex):
+        self.start = vertex
+
+    def set_goal(self, vertex):
+        if vertex != self.goal:
+            self.reset(self.start, vertex)
+
+    # the path from the current start to the goal, [] if there is none
+    def get_path(self):
+        if self.start != self.last_start:
+            self.key_modifier += self._heuristic(self.last_start, self.start)
+            self.last_start = self.start
+        if self.changed_vertices:
+            for v in self.changed_vertices:
+                self._update_vertex(v)
+            self.changed_vertices.clear()
+        self._compute_shortest_path()
+
+        if self._g(self.start) == math.inf:
+            return []
+        path = [self.start]
+        v = self.start
+        while v != self.goal and len(path) <= self.graph.V:
+            v = min(self.graph.get_adjacent(v), key=self._g)
+            path.append(v)
+        return path
+
+    def _heuristic(self, s, t):
+        return manhattan_distance(s, t, self.graph.cols)
+
+    def _g(self, v):
+        return self.g.get(v, math.inf)
+
+    def _rhs(self, v):
+        return self.rhs.get(v, math.inf)
+
+    def _key(self, v):
+        best = min(self._g(v), self._rhs(v))
+        return (best + self._heuristic(self.start, v) + self.key_modifier, best)
+
+    # the open list is a heap with lazy deletion, open_keys has the live keys
+    def _push(self, v, key):
+        self.open_keys[v] = key
+        heapq.heappush(self.open_heap, (key[0], key[1], v))
+
+    def _top(self):
+        while self.open_heap:
+            k1, k2, v = self.open_heap[0]
+            if self.open_keys.get(v) == (k1, k2):
+                return (k1, k2), v
+            heapq.heappop(self.open_heap)
+        return None, -1
+
+    def _update_vertex(self, v):
+        if v != self.goal:
+            self.rhs[v] = min([self._g(s) + 1 for s in self.graph.get_adjacent(v)], default=math.inf)
+        if self._g(v) != self._rhs(v):
+            self._push(v, self._key(v))
+        else:
+            self.open_keys.pop(v, None)
+
+    def _compute_shortest_path(self):
+        while True:
+            old_key, v = self._top()
+            if old_key is None:
+                break
+            if old_key >= self._key(self.start) and self._rhs(self.start) == self._g(self.start):
+                break
+
+            new_key = self._key(v)
+            if old_key < new_key:
+                self._push(v, new_key)
+            elif self._g(v) > self._rhs(v):
+                self.g[v] = self._rhs(v)
+                self.open_keys.pop(v)
+                for s in self.graph.get_adjacent(v):
+                    self._update_vertex(s)
+            else:
+                self.g[v] = math.inf
+                self._update_vertex(v)
+                for s in self.graph.get_adjacent(v):
+                    self._update_vertex(s)
@@ -0,0 +1,93 @@
+'''
+    Run the game simulation with no window and no sound.
+    SDL's dummy video and audio drivers are used, nothing is drawn, and the
+    simulation steps as fast as it can. This is for soak testing the enemy
+    AI and the collisions on servers without a screen.
+
+    Usage (from the src folder):
+        python headless.py [ticks] [--map ../data/map.txt] [--seed 0]
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import random
+import time
+import pygame
+from map_compiler import compile_map
+from simulation import Simulation, FrameInput, FIXED_DELTA_T
+
+
+class ScriptedInput(object):
+    '''
+        Plays the game without a person: aims at the first enemy, fires every
+        fire_every ticks and picks a new walking direction every move_every
+        ticks. A seed makes the same run every time.
+    '''
+    def __init__(self, seed=0, fire_every=30, move_every=60):
+        self.random = random.Random(seed)
+        self.fire_every = fire_every
+        self.move_every = move_every
+        self.move = (False, False, False, False)
+
+    def next_input(self, sim):
+        if sim.tick % self.move_every == 0:
+            self.move = tuple(self.random.random() < 0.3 for i in range(4))
+        up, down, left, right = self.move
+        if sim.enemies.count > 0:
+            target_x, target_y = sim.enemies.positions[0]
+        else:
+            target_x, target_y = sim.player_location
+        return FrameInput(target_x, target_y, up, down, left, right,
+                          fire=sim.tick % self.fire_every == 0)
+
+
+def run_headless(ticks, map_file='../data/map.txt', win_width=900, win_height=900, input_source=None, seed=0,
+                 enemies_per_spawn=1):
+    '''
+        Run the simulation for a number of ticks as fast as possible.
+        input_source has a next_input(sim) method, ScriptedInput by default.
+        enemies_per_spawn enemies start on every 'e' tile, for testing with many enemies.
+        Returns the simulation and a dictionary of statistics.
+    '''
+    pygame.init()
+    level = compile_map(map_file, backend='grid')
+    sim = Simulation(level, win_width, win_height, enemies_per_spawn=enemies_per_spawn)
+    if input_source is None:
+        input_source = ScriptedInput(seed)
+
+    event_counts = {}
+    start = time.perf_counter()
+    for i in range(ticks):
+        for name, x, y in sim.step(input_source.next_input(sim), FIXED_DELTA_T):
+            event_counts[name] = event_counts.get(name, 0) + 1
+    seconds = time.perf_counter() - start
+
+    stats = {
+        'ticks': ticks,
+        'enemies': sim.enemies.count,
+        'seconds': seconds,
+        'ticks_per_second': ticks / seconds if seconds > 0 else float('inf'),
+        'events': event_counts,
+    }
+    return sim, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the game simulation without a window.')
+    parser.add_argument('ticks', type=int, nargs='?', default=10000, help='number of simulation steps')
+    parser.add_argument('--map', default='../data/map.txt', help='the map file to load')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the scripted player')
+    parser.add_argument('--enemies', type=int, default=1, help='enemies to start on each enemy tile')
+    args = parser.parse_args()
+
+    sim, stats = run_headless(args.ticks, args.map, seed=args.seed, enemies_per_spawn=args.enemies)
+    print("%d ticks with %d enemies in %.3f seconds, %.0f ticks per second" % (
+        stats['ticks'], stats['enemies'], stats['seconds'], stats['ticks_per_second']))
+    print("events:", stats['events'])
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+'''
+    Hierarchical path finding (HPA*) for very large tile maps.
+    The tile graph is split into square clusters. Where two clusters touch,
+    each run of open tiles along the border gets one or two entrances. The
+    distances between the entrances of a cluster are found once with a BFS
+    inside the cluster. A long query then searches this small abstract graph
+    of entrances and only refines the answer inside the clusters it crosses.
+
+    When a wall changes, the graph tells us which edge changed, and only the
+    clusters touching that edge (and the borders around them) are rebuilt.
+    Paths are close to the shortest path, but are not always the shortest.
+'''
+import heapq
+import math
+from collections import deque
+from graph_tools import manhattan_distance
+
+# runs of open border tiles at least this long get an entrance at each end
+LONG_ENTRANCE = 6
+
+
+class ClusterGraph(object):
+    def __init__(self, graph, cluster_size=16):
+        self.graph = graph
+        self.size = cluster_size
+        self.cluster_rows = int(math.ceil(graph.rows / cluster_size))
+        self.cluster_cols = int(math.ceil(graph.cols / cluster_size))
+        self.borders = {}    # (cluster_a, cluster_b) -> list of (vertex_a, vertex_b) entrance pairs
+        self.links = {}      # entrance vertex -> set of entrance vertices across a border
+        self.entrances = {}  # cluster -> set of its entrance vertices
+        self.intra = {}      # cluster -> {entrance: {entrance: distance inside the cluster}}
+        self.dirty = set()   # clusters to rebuild before the next query
+
+        all_clusters = range(self.cluster_rows * self.cluster_cols)
+        for cluster in all_clusters:
+            for neighbor in self._right_and_lower(cluster):
+                self._build_border(cluster, neighbor)
+        for cluster in all_clusters:
+            self.entrances[cluster] = self._cluster_entrances(cluster)
+            self._build_intra(cluster)
+
+        graph.add_listener(self.edge_changed)
+
+    # stop listening to the graph
+    def close(self):
+        self.graph.remove_listener(self.edge_changed)
+
+    def cluster_of(self, vertex):
+        r = (vertex // self.graph.cols) // self.size
+        c = (vertex % self.graph.cols) // self.size
+        return r * self.cluster_cols + c
+
+    # the first row, last row + 1, first column, last column + 1 of a cluster
+    def cluster_bounds(self, cluster):
+        r, c = divmod(cluster, self.cluster_cols)
+        return (r * self.size, min((r + 1) * self.size, self.graph.rows),
+                c * self.size, min((c + 1) * self.size, self.graph.cols))
+
+    def edge_changed(self, s, t):
+        self.dirty.add(self.cluster_of(s))
+        self.dirty.add(self.cluster_of(t))
+
+    # rebuild the clusters touched by graph changes, returns how many were rebuilt
+    def rebuild(self):
+        if not self.dirty:
+            return 0
+
+        # the borders of a dirty cluster may have new or missing entrances
+        affected = set(self.dirty)
+        for cluster in self.dirty:
+            for neighbor in self._neighbors(cluster):
+                self._build_border(min(cluster, neighbor), max(cluster, neighbor))
+                affected.add(neighbor)
+
+        rebuilt = 0
+        for cluster in affected:
+            entrances = self._cluster_entrances(cluster)
+            if cluster in self.dirty or entrances != self.entrances[cluster]:
+                self.entrances[cluster] = entrances
+                self._build_intra(cluster)
+                rebuilt += 1
+        self.dirty.clear()
+        return rebuilt
+
+    def get_path(self, start_vertex, goal_vertex):
+        '''
+            Find a path of vertices from start to goal, [] if there is none.
+            The search runs on the entrances, then each step between two
+            entrances of the same cluster is filled in with a local BFS.
+        '''
+        self.rebuild()
+        if start_vertex == goal_vertex:
+            return [start_vertex]
+
+        start_cluster = self.cluster_of(start_vertex)
+        goal_cluster = self.cluster_of(goal_vertex)
+
+        # connect the start and the goal to the entrances of their clusters
+        start_targets = set(self.entrances[start_cluster])
+        if goal_cluster == start_cluster:
+            start_targets.add(goal_vertex)
+        start_edges = self._cluster_bfs(start_vertex, start_cluster, start_targets)[0]
+        goal_edges = self._cluster_bfs(goal_vertex, goal_cluster, self.entrances[goal_cluster])[0]
+
+        abstract_path = self._abstract_search(start_vertex, goal_vertex, start_edges, goal_edges)
+        if not abstract_path:
+            return []
+
+        # refine each abstract step into tiles
+        path = [start_vertex]
+        for u, w in zip(abstract_path, abstract_path[1:]):
+            if w in self.links.get(u, ()):
+                path.append(w)  # a single step across a border
+            else:
+                path.extend(self._local_path(u, w)[1:])
+        return path
+
+    def _abstract_search(self, start_vertex, goal_vertex, start_edges, goal_edges):
+        cols = self.graph.cols
+        predecessors = {start_vertex: -1}
+        cost = {start_vertex: 0}
+        closed = set()
+        open_heap = [(manhattan_distance(start_vertex, goal_vertex, cols), start_vertex)]
+
+        while open_heap:
+            f, v = heapq.heappop(open_heap)
+            if v in closed:
+                continue
+            if v == goal_vertex:
+                break
+            closed.add(v)
+
+            # the abstract edges out of v with their costs
+            if v == start_vertex:
+                edges = list(start_edges.items())
+            else:
+                edges = list(self.intra[self.cluster_of(v)].get(v, {}).items())
+            edges.extend((u, 1) for u in self.links.get(v, ()))
+            if v in goal_edges:
+                edges.append((goal_vertex, goal_edges[v]))
+
+            for u, d in edges:
+                if u in closed:
+                    continue
+                new_cost = cost[v] + d
+                if new_cost < cost.get(u, math.inf):
+                    cost[u] = new_cost
+                    predecessors[u] = v
+                    heapq.heappush(open_heap, (new_cost + manhattan_distance(u, goal_vertex, cols), u))
+
+        if goal_vertex not in predecessors:
+            return []
+        path = [goal_vertex]
+        while predecessors[path[-1]] != -1:
+            path.append(predecessors[path[-1]])
+        path.reverse()
+        return path
+
+    def _cluster_bfs(self, source, cluster, targets):
+        '''
+            BFS from source without leaving the cluster.
+            Returns the distances to the reachable targets, and the predecessors.
+        '''
+        r0, r1, c0, c1 = self.cluster_bounds(cluster)
+        cols = self.graph.cols
+        distance = {source: 0}
+        predecessors = {source: -1}
+        found = {}
+        queue = deque([source])
+        while queue:
+            v = queue.popleft()
+            if v in targets:
+                found[v] = distance[v]
+                if len(found) == len(targets):
+                    break  # every target has been reached
+            for adj_v in self.graph.get_adjacent(v):
+                if adj_v in distance:
+                    continue
+                r, c = adj_v // cols, adj_v % cols
+                if r0 <= r < r1 and c0 <= c < c1:
+                    distance[adj_v] = distance[v] + 1
+                    predecessors[adj_v] = v
+                    queue.append(adj_v)
+        return found, predecessors
+
+    def _local_path(self, s, t):
+        predecessors = self._cluster_bfs(s, self.cluster_of(s), {t})[1]
+        path = [t]
+        while predecessors[path[-1]] != -1:
+            path.append(predecessors[path[-1]])
+        path.reverse()
+        return path
+
+    def _build_intra(self, cluster):
+        entrances = self.entrances[cluster]
+        self.intra[cluster] = {}
+        for e in entrances:
+            found = self._cluster_bfs(e, cluster, entrances)[0]
+            del found[e]
+            self.intra[cluster][e] = found
+
+    def _cluster_entrances(self, cluster):
+        entrances = set()
+        for neighbor in self._neighbors(cluster):
+            key = (min(cluster, neighbor), max(cluster, neighbor))
+            side = 0 if cluster < neighbor else 1
+            for pair in self.borders.get(key, ()):
+                entrances.add(pair[side])
+        return entrances
+
+    def _build_border(self, a, b):
+        '''
+            Find the entrances between cluster a and cluster b (to its right or below).
+            Each run of edges crossing the border gets an entrance in the middle,
+            or one at each end if the run is long.
+        '''
+        graph = self.graph
+        cols = graph.cols
+        ar0, ar1, ac0, ac1 = self.cluster_bounds(a)
+        br0, br1, bc0, bc1 = self.cluster_bounds(b)
+        if b == a + 1 and b % self.cluster_cols != 0:
+            # b is to the right, walk down the shared column line
+            crossings = [(r * cols + ac1 - 1, r * cols + bc0) for r in range(ar0, ar1)]
+        else:
+            # b is below, walk along the shared row line
+            crossings = [((ar1 - 1) * cols + c, br0 * cols + c) for c in range(ac0, ac1)]
+
+        # remove the old entrances of this border
+        for va, vb in self.borders.get((a, b), ()):
+            self.links[va].discard(vb)
+            self.links[vb].discard(va)
+
+        pairs = []
+        run = []
+        for va, vb in crossings + [(-1, -1)]:
+            if va != -1 and graph.is_adjacent(va, vb):
+                run.append((va, vb))
+                continue
+            if len(run) >= LONG_ENTRANCE:
+                pairs.append(run[0])
+                pairs.append(run[-1])
+            elif run:
+                pairs.append(run[len(run) // 2])
+            run = []
+
+        self.borders[(a, b)] = pairs
+        for va, vb in pairs:
+            self.links.setdefault(va, set()).add(vb)
+            self.links.setdefault(vb, set()).add(va)
+
+    def _right_and_lower(self, cluster):
+        r, c = divmod(cluster, self.cluster_cols)
+        neighbors = []
+        if c + 1 < self.cluster_cols:
+            neighbors.append(cluster + 1)
+        if r + 1 < self.cluster_rows:
+            neighbors.append(cluster + self.cluster_cols)
+        return neighbors
+
+    def _neighbors(self, cluster):
+        r, c = divmod(cluster, self.cluster_cols)
+        neighbors = self._right_and_lower(cluster)
+        if c > 0:
+            neighbors.append(cluster - 1)
+        if r > 0:
+            neighbors.append(cluster - self.cluster_cols)
+        return neighbors
+
+    def __str__(self):
+        n_entrances = sum(len(e) for e in self.entrances.values())
+        return "ClusterGraph: %s x %s clusters, %s entrances" % (self.cluster_rows, self.cluster_cols, n_entrances)
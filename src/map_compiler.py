@@ -0,0 +1,103 @@
+'''
+    Compile a text tile map into everything the game needs.
+    The map file is read once, and one pass over the tiles finds the walls
+    and the spawn points. The walkable graph is then built from the wall
+    mask in linear time, so maps of any width and height load quickly.
+
+    Map symbols:
+        '#'  a wall
+        'p'  where the player starts
+        'e'  where an enemy starts (there can be more than one)
+'''
+from graph_tools import read_tile_rows, build_tile_graph, rc_to_vertex, vertex_to_rc
+
+WALL = '#'
+PLAYER = 'p'
+ENEMY = 'e'
+
+
+class CompiledMap(object):
+    def __init__(self, tiles, walls, player_spawn, enemy_spawns, graph):
+        self.tiles = tiles                  # list of strings, one per row
+        self.rows = len(tiles)
+        self.cols = len(tiles[0]) if tiles else 0
+        self.walls = walls                  # bytearray, 1 for a wall tile
+        self.player_spawn = player_spawn    # (row, col) or None
+        self.enemy_spawns = enemy_spawns    # list of (row, col)
+        self.graph = graph
+        self.listeners = []                 # called with (r, c, is_wall) after a wall changes
+
+    def is_wall(self, r, c):
+        return bool(self.walls[rc_to_vertex(r, c, self.cols)])
+
+    def vertex(self, r, c):
+        return rc_to_vertex(r, c, self.cols)
+
+    def vertex_rc(self, vertex):
+        return vertex_to_rc(vertex, self.rows, self.cols)
+
+    # list the (row, col) of every wall, useful for drawing
+    def wall_tiles(self):
+        return [self.vertex_rc(v) for v in range(len(self.walls)) if self.walls[v]]
+
+    def set_wall(self, r, c, is_wall=True):
+        '''
+            Add or remove the wall at tile (r, c).
+            The tiles, the wall mask and the graph's edges are changed, then
+            the listeners are told (for collisions, line of sight, drawing).
+        '''
+        vertex = self.vertex(r, c)
+        if bool(self.walls[vertex]) == is_wall:
+            return
+        self.walls[vertex] = 1 if is_wall else 0
+        row = self.tiles[r]
+        self.tiles[r] = row[:c] + (WALL if is_wall else ' ') + row[c + 1:]
+
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < self.rows and 0 <= nc < self.cols and not self.walls[self.vertex(nr, nc)]:
+                if is_wall:
+                    self.graph.remove_edge(vertex, self.vertex(nr, nc))
+                else:
+                    self.graph.add_edge(vertex, self.vertex(nr, nc))
+        for callback in self.listeners:
+            callback(r, c, is_wall)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def __str__(self):
+        return "CompiledMap: %s x %s, %s enemies" % (self.rows, self.cols, len(self.enemy_spawns))
+
+
+def compile_tiles(tiles, backend='grid'):
+    grid_rows = len(tiles)
+    grid_cols = len(tiles[0]) if tiles else 0
+    walls = bytearray(grid_rows * grid_cols)
+    player_spawn = None
+    enemy_spawns = []
+
+    # a single pass to find walls and spawn points
+    vertex = 0
+    for r in range(grid_rows):
+        row = tiles[r]
+        for c in range(grid_cols):
+            symbol = row[c]
+            if symbol == WALL:
+                walls[vertex] = 1
+            elif symbol == PLAYER:
+                if player_spawn is None:
+                    player_spawn = (r, c)
+            elif symbol == ENEMY:
+                enemy_spawns.append((r, c))
+            vertex += 1
+
+    graph = build_tile_graph(walls, grid_rows, grid_cols, backend)
+    return CompiledMap(tiles, walls, player_spawn, enemy_spawns, graph)
+
+
+def compile_map(filename, backend='grid'):
+    return compile_tiles(read_tile_rows(filename), backend)
@@ -4,11 +4,23 @@
 
     Access: https://github.com/paulbible/MarianCS-2024
 """
+import argparse
+import gc
 import pygame
 import sys
-import math
+import time
 from pygame.locals import *
-from graph_tools import create_tile_graph, get_shortest_path
+from graph_tools import read_tile_rows
+import asset_cache
+from asset_cache import load_image, LazySound
+from renderer import Renderer
+from sprite_cache import RotationCache
+from asset_manager import TextureAtlas, SpriteBatch
+from simulation import (Simulation, FixedStepRunner, FIXED_DELTA_T, EVENT_FIRE, EVENT_ENEMY_HIT,
+                        EVENT_WALL_HIT, EVENT_PLAYER_HIT, read_frame_input, tile_size)
+from sim_thread import SimulationThread
+from replay import InputRecorder, InputReplayer, check_tick
+from profiler import FrameProfiler
 
 
 class Animation(object):
@@ -23,41 +35,34 @@ class Animation(object):
         self.active = True
         self.start = pygame.time.get_ticks()
 
+    # surface can be a SpriteBatch, then the frames are regions of its atlas
     def draw(self, surface):
         time_since = pygame.time.get_ticks() - self.start
         if time_since >= self.duration:
             self.active = False
         else:
             frame = int(time_since/(self.duration/len(self.frames)))
-            surface.blit(self.frames[frame], self.location)
+            return surface.blit(self.frames[frame], self.location)
 
 
-class Projectile(object):
-    def __init__(self, location, direction, speed, frames, duration):
-        self.location = location
-        self.direction = direction
-        self.speed = speed
-        self.animation = Animation(frames, duration, location)
-
-    def next_location(self, delta):
-        return self.location + self.direction*delta* self.speed
-
-    def update(self, location):
-        self.location = location
-        self.animation.location = location
-
-    def draw(self, surface):
-        self.animation.draw(surface)
-        if not self.animation.active:
-            self.animation.reset()
-
-
-def main():
+def main(record_file=None, replay_file=None, profile_file=None, threaded=False, fps=60):
+    '''
+        Play the game. With record_file the input of every frame is saved,
+        with replay_file a recorded session is played back as fast as
+        possible and the time of each frame (seconds) is returned.
+        With profile_file the time spent in each part of the loop is saved
+        (CSV, or JSON if the name ends in .json). F3 shows the timings.
+        With threaded the simulation runs on its own thread (sim_thread.py)
+        and the window is drawn between the simulation's steps.
+        The window is drawn at most fps frames a second, 0 for no limit
+        (which keeps a whole core busy drawing).
+    '''
     # set up the mixer, pygame, and the game clock
     pygame.mixer.pre_init(44100, 16, 2, 4096)
     pygame.init()
 
     # Timing, these variables help keep up with times and timers
+    startup_time = time.perf_counter()
     clock = pygame.time.Clock()
     last_ticks = pygame.time.get_ticks()  # starter tick
     delta_t = 0
@@ -74,32 +79,58 @@ def main():
     # x,y  ... -> ... width height
     win_width = 900
     win_height = 900
-    grid_w = int(win_width/10)
-    grid_h = int(win_height/10)
+    map_file = '../data/map.txt'
+
+    # a replay brings back the window size and map it was recorded with
+    replayer = None
+    if replay_file is not None:
+        replayer = InputReplayer(replay_file)
+        win_width, win_height, map_file = replayer.win_width, replayer.win_height, replayer.map_file
+        replay_frames = iter(replayer)
+        replayed_frames = 0
+        # a replay gives the frame times itself, it can't run on its own clock
+        threaded = False
+
+    '''
+        The Game Map
+          To make creating maps easier, we use a simple text file to specify a tile map.
+          The map can be any width and height, the tiles are sized to fit the window
+          (a map can have at most one tile for each pixel of the window).
+          Every '#' creates a wall in the map and the player starts at the position marked
+          with a 'p'. Enemies start at the positions marked with an 'e'. This just makes
+          the map easy to create. You are not locked on only the grid locations.
+
+          Example: given in the 'map.txt' file
+    '''
+    # read the map once, this gives the tiles, walls, start points and the
+    # graph used by enemies to find the player (cached in data/.cache after the first run)
+    level = asset_cache.load_map(map_file, backend='grid')
+    tile_map = level.tiles
+    grid_w, grid_h = tile_size(level, win_width, win_height, map_file)
     windowSurface = pygame.display.set_mode((win_width, win_height), 0, 32)
     pygame.display.set_caption('Maraian CS Game Demo')
 
     # load some game assets, images and sounds
-    # sounds
-    lazer_sound = pygame.mixer.Sound("../data/sound/lazer1.wav")
-    explode_sound = pygame.mixer.Sound("../data/sound/explode1.wav")
-    explode_sound.set_volume(0.25)
-    bg_image = pygame.image.load('../data/BlueTexture.png').convert()
-    bg_image = pygame.transform.scale(bg_image, (win_width, win_height))
-    # images
-    wall_block = pygame.image.load('../data/mark_finish.png').convert_alpha()
-    wall_block = pygame.transform.scale(wall_block, (grid_w, grid_h))
-    robot_img = pygame.image.load('../data/robot/example.png').convert_alpha()
+    # sounds, loaded in the background while the game starts
+    lazer_sound = LazySound("../data/sound/lazer1.wav")
+    explode_sound = LazySound("../data/sound/explode1.wav", volume=0.25)
+    # images, scaled and cached in data/.cache after the first run
+    bg_image = load_image('../data/BlueTexture.png', (win_width, win_height), alpha=False)
+    wall_block = load_image('../data/mark_finish.png', (grid_w, grid_h))
+    robot_img = load_image('../data/robot/example.png')
     robot_rect = robot_img.get_rect()
     robot_offset_x = robot_rect[2] / 2
     robot_offset_y = robot_rect[3] / 2
+    # the robot rotated to every whole degree, so it is not rotated every frame
+    rotation_cache = RotationCache(angle_step=1.0)
+    rotation_cache.warm_up(robot_img, (robot_offset_x, robot_offset_y))
+
+    # the animation frames of every sprite sheet are packed into one atlas
+    atlas = TextureAtlas()
 
     # explosion animation
-    explosion_sheet = pygame.image.load('../data/explosion.png').convert_alpha()
-    explosion_frames = []
-    for i in range(5):
-        tile = explosion_sheet.subsurface(pygame.Rect(i*16, 0, 16, 16))
-        explosion_frames.append(tile)
+    explosion_sheet = pygame.image.load('../data/explosion.png')
+    atlas.add_sheet('explosion', explosion_sheet, 16, 16, count=5)
 
     explosions = []
 
@@ -112,67 +143,56 @@ def main():
     explode_location = (20, 20)
     '''
 
-    enemy_sheet = pygame.image.load('../data/power-up.png').convert_alpha()
+    enemy_sheet = pygame.image.load('../data/power-up.png')
     print(enemy_sheet.get_rect())
-    enemy1_frames = [enemy_sheet.subsurface(pygame.Rect(0, 0, 16, 16)),
-                     enemy_sheet.subsurface(pygame.Rect(16, 0, 16, 16))]
-    enemy2_frames = [enemy_sheet.subsurface(pygame.Rect(0, 16, 16, 16)),
-                     enemy_sheet.subsurface(pygame.Rect(16, 16, 16, 16))]
+    atlas.add_sheet('enemy1', enemy_sheet, 16, 16, row=0)
+    atlas.add_sheet('enemy2', enemy_sheet, 16, 16, row=1)
 
     laser_sheet = pygame.image.load('../data/laser-bolts.png')
-    laser1_frames = [laser_sheet.subsurface(pygame.Rect(0, 0, 16, 16)),
-                     laser_sheet.subsurface(pygame.Rect(16, 0, 16, 16))]
+    atlas.add_sheet('laser1', laser_sheet, 16, 16, row=0)
     laser_offset = 8
 
-    '''
-        The Game Map
-          To make creating maps easier, we use a simple text file to specify a tile map.
-          The tile map is 10-by-10. 
-          Every '#' creates a wall in the map and the player starts at the position marked
-          with a 'p'. This just makes the map easy to create. You are not locked on only
-          the grid locations.
-          
-          Example: given in the 'map.txt' file
-    '''
-    tile_map = load_map('../data/map.txt')
-    # print_text_map(tile_map)
-    start_row, start_col = player_start(tile_map)
-    # print("Player starts a row:", start_row, " and column:", start_col)
-
-    # a graph used by enemies to find the player
-    graph = create_tile_graph('../data/map.txt')
+    # one converted surface for all of the frames, each frame is a Rect in it
+    atlas.build()
+    explosion_frames = atlas.frames('explosion')
+    enemy1_frames = atlas.frames('enemy1')
+    enemy2_frames = atlas.frames('enemy2')
+    laser1_frames = atlas.frames('laser1')
+    # sprites from the atlas are collected each frame and drawn together
+    sprite_batch = SpriteBatch(windowSurface, atlas)
 
-    # convert the tile coordinates in row/column to game map x and y
-    # place in the center of the grid tile (default, upper left corner)
-    player_x = (start_col * grid_w) + grid_w / 2
-    player_y = (start_row * grid_h) + grid_h / 2
-    player_location = pygame.math.Vector2(player_x, player_y)
+    # print_text_map(tile_map)
 
-    player_speed = 0.25
-    player_size = 25
+    # times each part of the main loop, F3 shows the timings on screen
+    profiler = FrameProfiler(enabled=profile_file is not None)
 
-    enemy_row, enemy_col = enemy_start(tile_map)
-    enemy_x = (enemy_col * grid_w) + grid_w / 2
-    enemy_y = (enemy_row * grid_h) + grid_h / 2
-    enemy_location = pygame.math.Vector2(enemy_x, enemy_y)
+    # the game simulation: the player, the enemy, projectiles and collisions.
+    # on its own thread its timings would land in the wrong frames, so it isn't profiled
+    sim = Simulation(level, win_width, win_height, None if threaded else profiler)
 
-    path = get_shortest_path(enemy_row, enemy_col, start_row, start_col, graph)
-    print(path)
 
+    # runs the simulation in fixed steps, however long each frame takes
+    # a replay steps with the step it was recorded with
+    runner = FixedStepRunner(sim, replayer.fixed_delta_t if replayer is not None else FIXED_DELTA_T)
 
     # get a container for keys that are being pressed
     keys_pressed = []
 
+    recorder = None
+    if record_file is not None:
+        recorder = InputRecorder(record_file, map_file, win_width, win_height, FIXED_DELTA_T)
+    frame_times = []
 
-    # physics / movement
-    vector_up = pygame.math.Vector2(0, -1)
-    vector_down = pygame.math.Vector2(0, 1)
-    vector_left = pygame.math.Vector2(-1, 0)
-    vector_right = pygame.math.Vector2(1, 0)
-
+    # or steps the simulation on its own thread, recording the input of every step
+    sim_thread = None
+    if threaded:
+        sim_thread = SimulationThread(sim, recorder=recorder)
 
-    # get the list of projectiles
-    projectiles = []
+    # draws the background and walls once, then only what moves
+    renderer = Renderer(windowSurface, bg_image, wall_block, grid_w, grid_h, profiler=profiler)
+    renderer.set_map(level)
+    # walls added or removed while playing are drawn into the static layer again
+    level.add_listener(lambda r, c, is_wall: renderer.mark_map_changed())
 
     '''
         The Main Game Loop
@@ -183,202 +203,149 @@ def main():
         3) Draw everything onto the screen.
         4) post processing (calculate timings etc.)
     '''
+    # everything loaded so far lives until the game ends. Frozen, the garbage
+    # collector stops scanning it over and over while thousands of sprites
+    # are queued every frame
+    gc.freeze()
+    if sim_thread is not None:
+        sim_thread.start()
     keep_playing = True
     while keep_playing:
+        frame_start = time.perf_counter()
+        profiler.begin_frame()
         ##### 1) Handle events #####
-        # get the mouse position
-        mouse_x, mouse_y = pygame.mouse.get_pos()
-        player_direction = look_direction(player_location.x, player_location.y, mouse_x, mouse_y)
-        angle = look_angle(player_location.x, player_location.y, mouse_x, mouse_y)
-
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                keep_playing = False
-            elif event.type == MOUSEBUTTONDOWN:
-                # print('mouse clicked', mouse_x, mouse_y)
-                lazer_sound.play()
-                p = Projectile(player_location, player_direction, 0.4, laser1_frames, 500)
-                projectiles.append(p)
-
-                # lazer_sound.play() # turn on later
-            elif event.type == KEYDOWN:
-                # print("key pressed")
-                keys_pressed.append(event.key)
-            elif event.type == KEYUP:
-                # print("key released")
-                keys_pressed.remove(event.key)
-
+        with profiler.phase('events'):
+            # get the mouse position
+            mouse_x, mouse_y = pygame.mouse.get_pos()
+            clicked = False
+
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    keep_playing = False
+                elif event.type == MOUSEBUTTONDOWN:
+                    # print('mouse clicked', mouse_x, mouse_y)
+                    clicked = True
+                elif event.type == KEYDOWN and event.key == K_F3:
+                    profiler.toggle_overlay()
+                elif event.type == KEYDOWN:
+                    # print("key pressed")
+                    keys_pressed.append(event.key)
+                elif event.type == KEYUP:
+                    # print("key released")
+                    if event.key in keys_pressed:
+                        keys_pressed.remove(event.key)
+
+
+
+            frame_input = read_frame_input(keys_pressed, mouse_x, mouse_y, clicked)
+            if replayer is not None:
+                # use the recorded input and frame time instead
+                frame = next(replay_frames, None)
+                if frame is None:
+                    break
+                frame_input, delta_t, tick = frame
+                check_tick(sim, tick, replayed_frames)
+                replayed_frames += 1
+            elif sim_thread is not None:
+                sim_thread.set_input(frame_input)
+            elif recorder is not None:
+                recorder.record(frame_input, delta_t, sim.tick)
 
 
         ##### update game entities #####
-        # update player
-        player_velocity = pygame.math.Vector2(0, 0)
-        if K_RIGHT in keys_pressed or K_d in keys_pressed:
-            #player_x += speed
-            player_velocity += vector_right
-
-        if K_LEFT in keys_pressed or K_a in keys_pressed:
-            #player_x -= speed
-            player_velocity += vector_left
-
-        if K_UP in keys_pressed or K_w in keys_pressed:
-            #player_y -= speed
-            player_velocity += vector_up
-
-        if K_DOWN in keys_pressed or K_s in keys_pressed:
-            #player_y += speed
-            player_velocity += vector_down
-
-        if player_velocity.length() > 0:
-            player_velocity = player_velocity.normalize()
-            new_location = player_location + player_velocity * delta_t * player_speed
-        else:
-            new_location = player_location
-
-        if collide_wall(new_location, player_size, tile_map, grid_w, grid_h):
-            # print('hit wall!!')
-            pass
-        elif is_inside_window(new_location, player_size, win_width, win_height):
-            player_location = new_location
-
-
-        # Update projectiles
-        for projectile in projectiles:
-            new_projectile_location = projectile.next_location(delta_t)
-            distance = new_projectile_location.distance_to(enemy_location)
-            if distance < 15:
-                print('Enemy Hit!')
-                explode_sound.play()
-
-                # explode_location = (mouse_x, mouse_y)
-                explosions.append(Animation(explosion_frames, 500, new_projectile_location))
-                # reset the enemy location
-                enemy_location = pygame.math.Vector2(enemy_x, enemy_y)
-                projectiles.remove(projectile)
-
-            # delete projectiles that go off the screen
-            if not windowSurface.get_rect().collidepoint(new_projectile_location.x, new_projectile_location.y):
-                # print('removing projectile')
-                projectiles.remove(projectile)
+        with profiler.phase('update'):
+            # the simulation moves in fixed steps, run as many as the time since the last frame needs
+            if sim_thread is not None:
+                events = sim_thread.take_events()
             else:
-                projectile.update(new_projectile_location)
-
-            # delete projectiles that collide with a wall
-            if collide_wall(new_projectile_location, 1, tile_map, grid_w, grid_h):
-                projectiles.remove(projectile)
-                new_projectile_location.x -= 4
-                explosions.append(Animation(explosion_frames, 500, new_projectile_location))
-
-
-
-        # update enemy
-        enemy_row, enemy_col = vector_to_rc(enemy_location, grid_w, grid_h)
-        goal_row, goal_col = vector_to_rc(player_location, grid_w, grid_h)
-        # print(enemy_row, enemy_col)
-        path = get_shortest_path(enemy_row, enemy_col, goal_row, goal_col , graph)
-        # print(path)
-
-        if len(path) > 1 and enemy_location.distance_to(player_location) > 100:
-            target = pygame.math.Vector2(graph.get_vertex_xy(path[1], grid_w, grid_h))
-        else:
-            target = player_location
-
-        direction = (target - enemy_location)
-
-        if direction.length() > 0:
-            enemy_to_player = (target - enemy_location).normalize()
-            new_enemy_location = enemy_location + enemy_to_player * delta_t * (player_speed * 0.5)
-
-            if collide_wall(new_enemy_location, 1, tile_map, grid_w, grid_h):
-                # print('hit wall!!')
-                pass
-            elif is_inside_window(new_enemy_location, player_size/2, win_width, win_height):
-                enemy_location = new_enemy_location
-
-        if enemy_location.distance_to(player_location) < 25:
-            print("Player hit, take damage")
+                events = runner.run_frame(frame_input, delta_t)
+            for name, x, y in events:
+                if name == EVENT_FIRE:
+                    lazer_sound.play()
+                elif name == EVENT_ENEMY_HIT:
+                    print('Enemy Hit!')
+                    explode_sound.play()
+                    explosions.append(Animation(explosion_frames, 500, (x, y)))
+                elif name == EVENT_WALL_HIT:
+                    # projectiles that hit a wall explode
+                    explosions.append(Animation(explosion_frames, 500, (x - 4, y)))
+                elif name == EVENT_PLAYER_HIT:
+                    print("Player hit, take damage")
 
 
         ##### Draw #####
-        # draw background, do this first
-        windowSurface.blit(bg_image, (0, 0))
+        with profiler.phase('draw'):
+            # on a thread, draw between the last two steps of the simulation
+            view = sim_thread.interpolate() if sim_thread is not None else sim
+            player_location = view.player_location
 
-        # draw walls
-        for r in range(len(tile_map)):
-            for c in range(len(tile_map[0])):
-                # for each position in the grid, check it is a wall.
-                if tile_map[r][c] == '#':
-                    # draw the wall at that location
-                    windowSurface.blit(wall_block, (c*grid_w, r*grid_h))
+            # draw background and walls, do this first.
+            # they come from the static layer, only the areas sprites covered are redrawn
+            renderer.begin_frame()
 
-        # draw the player, but rotated to face the mouse
-        # blitRotate(windowSurface, robot_img, (player_x, player_y), (robot_offset_x, robot_offset_y), angle)
-        blitRotate(windowSurface, robot_img, player_location, (robot_offset_x, robot_offset_y), angle)
+            # draw the player, but rotated to face the mouse
+            renderer.mark_dirty(rotation_cache.blit(windowSurface, robot_img, player_location, (robot_offset_x, robot_offset_y), view.angle))
 
-        # draw projectiles
-        for projectile in projectiles:
-            projectile.draw(windowSurface)
+            # draw projectiles
+            view.projectiles.draw(sprite_batch, view.time, laser1_frames, 500)
 
 
-        # draw explosions
-        for exp in explosions:
-            exp.draw(windowSurface)
+            # draw explosions
+            for exp in explosions:
+                exp.draw(sprite_batch)
             # deactivate explosions after their animation is over
-            if not exp.active:
-                explosions.remove(exp)
+            explosions = [exp for exp in explosions if exp.active]
 
-        # draw / animate enemy
-        if int(pygame.time.get_ticks()/400) % 2 == 0:
-            windowSurface.blit(enemy2_frames[0], (enemy_location.x - laser_offset, enemy_location.y - laser_offset))
-        else:
-            windowSurface.blit(enemy2_frames[1], (enemy_location.x - laser_offset, enemy_location.y - laser_offset))
+            # draw / animate enemies
+            enemy_frame = enemy2_frames[int(pygame.time.get_ticks()/400) % 2]
+            view.enemies.draw(sprite_batch, enemy_frame, laser_offset, laser_offset)
+
+            # the projectiles, explosions and enemies are drawn here, all in one call
+            renderer.draw_batch(sprite_batch)
 
-        # Draw debug info
-        # pygame.draw.line(windowSurface, BLACK, target, enemy_location)
+            # Draw debug info
+            # pygame.draw.line(windowSurface, BLACK, target, enemy_location)
 
-        # draw the window onto the screen, the last drawing step.
-        pygame.display.update()
+            # draw the frame timings on top of everything
+            renderer.mark_dirty(profiler.draw_overlay(windowSurface))
+
+            # draw the changed parts of the window onto the screen, the last drawing step.
+            renderer.end_frame()
 
         ##### post loop processing #####
-        # delay to lock frame rate
-        clock.tick(60)
-        # calculate delta_t, important for physics / movement
-        delta_t = pygame.time.get_ticks() - last_ticks
-        # delta_t = delta_t/5
-        last_ticks = pygame.time.get_ticks()
+        with profiler.phase('post'):
+            if not frame_times:
+                print("first frame after %.0f ms" % (1000 * (time.perf_counter() - startup_time)))
+            frame_times.append(time.perf_counter() - frame_start)
+            # replays run as fast as they can
+            if replayer is None:
+                # delay to lock frame rate
+                clock.tick(fps)
+                # calculate delta_t, important for physics / movement
+                delta_t = pygame.time.get_ticks() - last_ticks
+                # delta_t = delta_t/5
+                last_ticks = pygame.time.get_ticks()
+        profiler.end_frame()
+
+    if sim_thread is not None:
+        sim_thread.stop()
+        print(sim_thread.report())
+    if recorder is not None:
+        recorder.close()
+    if profile_file is not None:
+        profiler.dump(profile_file)
+        print(profiler.summary())
 
     # shut down Pygame
     pygame.quit()
     # end of the program (main function)
     print("Goodbye!")
-
-
-def vector_to_rc(location, grid_width, grid_height):
-    r = int(location.y/grid_height)
-    c = int(location.x/grid_width)
-    return r, c
-
-
-# check if the location is inside the window
-def is_inside_window(location, size, window_width, window_height):
-    if location.x < size or location.x > window_width - size:
-        return False
-
-    if location.y < size or location.y > window_height - size:
-        return False
-
-    return True
+    return frame_times
 
 
 # load the map and return a table (matrix) of characters
 def load_map(filename):
-    tile_map = []
-    with open(filename, 'r') as f:
-        for i in range(10):
-            line = f.readline()
-            if line:
-                tile_map.append(line[:10])
-    return tile_map
+    return read_tile_rows(filename)
 
 
 # print out the characters in the map representation
@@ -407,95 +374,15 @@ def enemy_start(tile_map):
                 return i, j
 
 
-def look_direction(player_x, player_y, mouse_x, mouse_y):
-    mouse_vector = pygame.math.Vector2(mouse_x, mouse_y)
-    player_position_vector = pygame.math.Vector2(player_x, player_y)
-    player_to_mouse_vector = (mouse_vector - player_position_vector).normalize()
-    return player_to_mouse_vector
-
-
-def look_angle(player_x, player_y, mouse_x, mouse_y):
-    mouse_vector = pygame.math.Vector2(mouse_x, mouse_y)
-    player_position_vector = pygame.math.Vector2(player_x, player_y)
-    player_to_mouse_vector = (mouse_vector - player_position_vector).normalize()
-    down_vector = pygame.math.Vector2(0, 1)
-    angle = math.degrees(math.acos(player_to_mouse_vector.dot(down_vector)))
-
-    if player_x > mouse_x:
-        angle = -1.0 * angle
-
-    return angle
-
-
-def collide_wall(position, radius, tile_map, grid_width, grid_height):
-    map_rows = len(tile_map)
-    map_cols = len(tile_map[0])
-    for r in range(map_rows):
-        for c in range(map_cols):
-            if tile_map[r][c] == '#':
-                rect = pygame.Rect(c*grid_width, r*grid_height, grid_width, grid_height)
-                if collide_circle_rect(position, radius, rect):
-                    return True
-    return False
-
-
-
-
-# detect if a circle and rectangle collide / intersect
-# http://www.jeffreythompson.org/collision-detection/circle-rect.php
-def collide_circle_rect(point, radius, rect):
-    #  assume point is a pygame.math.Vector2
-    rect_x, rect_y, width, height = rect
-
-    test_x = point.x
-    test_y = point.y
-
-    if point.x < rect_x:
-        test_x = rect_x
-    elif point.x > rect_x + width:
-        test_x = rect_x + width
-
-    if point.y < rect_y:
-        test_y = rect_y
-    elif point.y > rect_y + height:
-        test_y = rect_y + height
-
-    dist_x = point.x - test_x
-    dist_y = point.y - test_y
-    distance = math.sqrt(dist_x**2 + dist_y**2)
-    if distance <= radius:
-        return True
-    else:
-        return False
-
-
-# Rotate an image around it's center. Lets the robot look at your mouse.
-# code from https://stackoverflow.com/a/54714144/2912901
-def blitRotate(surf, image, pos, originPos, angle):
-
-    # calcaulate the axis aligned bounding box of the rotated image
-    w, h       = image.get_size()
-    box        = [pygame.math.Vector2(p) for p in [(0, 0), (w, 0), (w, -h), (0, -h)]]
-    box_rotate = [p.rotate(angle) for p in box]
-    min_box    = (min(box_rotate, key=lambda p: p[0])[0], min(box_rotate, key=lambda p: p[1])[1])
-    max_box    = (max(box_rotate, key=lambda p: p[0])[0], max(box_rotate, key=lambda p: p[1])[1])
-
-    # calculate the translation of the pivot
-    pivot        = pygame.math.Vector2(originPos[0], -originPos[1])
-    pivot_rotate = pivot.rotate(angle)
-    pivot_move   = pivot_rotate - pivot
-
-    # calculate the upper left origin of the rotated image
-    origin = (pos[0] - originPos[0] + min_box[0] - pivot_move[0], pos[1] - originPos[1] - max_box[1] + pivot_move[1])
-
-    # get a rotated image
-    rotated_image = pygame.transform.rotate(image, angle)
-
-    # rotate and blit the image
-    surf.blit(rotated_image, origin)
-
-    # draw rectangle around the image
-    # pygame.draw.rect (surf, (255, 0, 0), (*origin, *rotated_image.get_size()),2)
-
 # call main to run the program
-main()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='A simple game to explore python programming.')
+    parser.add_argument('--record', help='save the input of this session to a file')
+    parser.add_argument('--replay', help='play back a recorded session')
+    parser.add_argument('--profile', help='save the time of each part of every frame to a CSV or JSON file')
+    parser.add_argument('--threaded', action='store_true', help='run the simulation on its own thread')
+    parser.add_argument('--fps', type=int, default=60,
+                        help='most frames drawn per second, 0 for no limit (default 60)')
+    args = parser.parse_args()
+    main(record_file=args.record, replay_file=args.replay, profile_file=args.profile, threaded=args.threaded,
+         fps=args.fps)
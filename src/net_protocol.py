@@ -0,0 +1,139 @@
+'''
+    The messages between the game server and its clients.
+    Every message is a 4 byte length and then the message, whose first byte
+    is its type:
+
+        W  welcome, server -> client: the client's player id, window size, tick rate
+        I  input, client -> server: mouse x, mouse y and the input flags of replay.py
+        S  snapshot, server -> client: the players, enemies and projectiles
+
+    Snapshots are delta compressed. Positions are rounded to a quarter pixel
+    and stored as 16 bit integers, and each list (players, enemies,
+    projectiles) only sends the rows that changed since the snapshot the
+    client already has (the baseline), with one bit per row saying which
+    rows those are. TCP never loses a message, so the baseline is always
+    the last snapshot sent to that client.
+'''
+import struct
+import numpy as np
+from replay import input_flags, input_from_flags
+
+LENGTH = struct.Struct('<I')
+WELCOME = struct.Struct('<cHHHH')     # b'W', player id, window width, window height, ticks per second
+INPUT = struct.Struct('<chhB')        # b'I', mouse x, mouse y, input flags
+SNAPSHOT = struct.Struct('<cII')      # b'S', tick, baseline tick (0 for a full snapshot)
+SECTION = struct.Struct('<HB')        # rows, columns
+
+# positions are sent in quarter pixels, angles in hundredths of a degree
+POSITION_SCALE = 4
+ANGLE_SCALE = 100
+# the columns of each list in a snapshot
+PLAYER_COLUMNS = 4       # id, x, y, angle
+ENEMY_COLUMNS = 2        # x, y
+PROJECTILE_COLUMNS = 2   # x, y
+
+
+def frame(message):
+    return LENGTH.pack(len(message)) + message
+
+
+async def read_message(reader):
+    '''
+        Read one message from an asyncio StreamReader, None when the connection closed.
+    '''
+    try:
+        header = await reader.readexactly(LENGTH.size)
+        return await reader.readexactly(LENGTH.unpack(header)[0])
+    except (EOFError, ConnectionError):
+        return None
+
+
+def encode_input(frame_input):
+    return INPUT.pack(b'I', int(frame_input.mouse_x), int(frame_input.mouse_y), input_flags(frame_input))
+
+
+def decode_input(message):
+    kind, mouse_x, mouse_y, flags = INPUT.unpack(message)
+    return input_from_flags(mouse_x, mouse_y, flags)
+
+
+def snapshot_arrays(sim):
+    '''
+        The players, enemies and projectiles of a simulation as int16 arrays.
+    '''
+    players = np.array([(p.id, p.location.x * POSITION_SCALE, p.location.y * POSITION_SCALE, p.angle * ANGLE_SCALE)
+                        for p in sim.players.values()], dtype=float).reshape(-1, PLAYER_COLUMNS)
+    enemies = sim.enemies.positions[:sim.enemies.count] * POSITION_SCALE
+    projectiles = sim.projectiles.positions[:sim.projectiles.count] * POSITION_SCALE
+    # projectiles can be a little outside the window before they are removed, keep them in range
+    return tuple(np.clip(np.round(array), -32768, 32767).astype(np.int16)
+                 for array in (players, enemies, projectiles))
+
+
+def encode_section(current, baseline):
+    rows, columns = current.shape
+    changed = np.ones(rows, dtype=bool)
+    if baseline is not None and baseline.shape[1] == columns:
+        common = min(rows, len(baseline))
+        changed[:common] = (current[:common] != baseline[:common]).any(axis=1)
+    return b''.join((SECTION.pack(rows, columns), np.packbits(changed).tobytes(),
+                     current[changed].astype('<i2').tobytes()))
+
+
+def decode_section(data, offset, baseline):
+    rows, columns = SECTION.unpack_from(data, offset)
+    offset += SECTION.size
+    mask_bytes = (rows + 7) // 8
+    changed = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=mask_bytes, offset=offset))[:rows].astype(bool)
+    offset += mask_bytes
+    count = int(changed.sum())
+    values = np.frombuffer(data, dtype='<i2', count=count * columns, offset=offset).reshape(count, columns)
+    offset += count * columns * 2
+
+    current = np.zeros((rows, columns), dtype=np.int16)
+    if baseline is not None and baseline.shape[1] == columns:
+        common = min(rows, len(baseline))
+        current[:common] = baseline[:common]
+    current[changed] = values
+    return current, offset
+
+
+def encode_snapshot(tick, arrays, baseline_tick=0, baseline=None):
+    '''
+        A snapshot message for tick. With a baseline (the arrays of
+        baseline_tick) only the rows that changed are sent.
+    '''
+    if baseline is None:
+        baseline_tick = 0
+        baseline = (None, None, None)
+    parts = [SNAPSHOT.pack(b'S', tick, baseline_tick)]
+    for current, old in zip(arrays, baseline):
+        parts.append(encode_section(current, old))
+    return b''.join(parts)
+
+
+def decode_snapshot(message, baseline=None):
+    '''
+        Returns (tick, baseline tick, (players, enemies, projectiles)).
+        baseline is the arrays of the snapshot the server used as the baseline.
+    '''
+    kind, tick, baseline_tick = SNAPSHOT.unpack_from(message)
+    if baseline_tick == 0 or baseline is None:
+        baseline = (None, None, None)
+    offset = SNAPSHOT.size
+    arrays = []
+    for old in baseline:
+        current, offset = decode_section(message, offset, old)
+        arrays.append(current)
+    return tick, baseline_tick, tuple(arrays)
+
+
+# the players of a decoded snapshot as a list of (id, x, y, angle)
+def decode_players(players):
+    return [(int(row[0]), row[1] / POSITION_SCALE, row[2] / POSITION_SCALE, row[3] / ANGLE_SCALE)
+            for row in players.tolist()]
+
+
+# the (n, 2) x, y pixel positions of decoded enemies or projectiles
+def decode_positions(array):
+    return array.astype(float) / POSITION_SCALE
@@ -0,0 +1,141 @@
+'''
+    Find paths in the background so a long search never stalls a frame.
+    Requests are (start, goal) tiles and are searched on a pool of worker
+    threads, against a read-only copy (snapshot) of the graph taken at the
+    graph's current version. A new snapshot is only made after the graph
+    changes, and all the requests for that version share it.
+
+    Each frame, poll() hands back the paths that are finished:
+
+        service = PathService(level.graph)
+        service.request('enemy1', enemy_tile, player_tile)
+        ...
+        for requester, request in service.poll().items():
+            path = request.path()
+
+    Two requesters asking for the same start and goal share one search.
+    Asking again with a new goal (the target moved) cancels the old request,
+    so workers don't waste time on paths nobody wants anymore.
+'''
+from concurrent.futures import ThreadPoolExecutor
+from graph_tools import get_shortest_path
+
+DEFAULT_WORKERS = 2
+
+
+class PathRequest(object):
+    def __init__(self, start, goal, version, method, future):
+        self.start = start        # (row, col)
+        self.goal = goal          # (row, col)
+        self.version = version    # the graph version the path was searched on
+        self.method = method
+        self.future = future
+        self.requesters = set()
+
+    def key(self):
+        return self.start, self.goal, self.version, self.method
+
+    def done(self):
+        return self.future.done()
+
+    def cancelled(self):
+        return self.future.cancelled()
+
+    # the list of vertices, [] if there is no path, waits if it is not finished
+    def path(self):
+        return self.future.result()
+
+    def __str__(self):
+        return "PathRequest: %s -> %s, version %s, %s" % (self.start, self.goal, self.version, self.method)
+
+
+def _search(start, goal, graph, method):
+    return get_shortest_path(start[0], start[1], goal[0], goal[1], graph, method)
+
+
+class PathService(object):
+    def __init__(self, graph, workers=DEFAULT_WORKERS, method='astar'):
+        self.graph = graph
+        self.method = method
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.snapshot = None
+        self.snapshot_version = None
+        self.pending = {}       # request key -> PathRequest, shared by its requesters
+        self.by_requester = {}  # requester -> the PathRequest it is waiting for
+        self.searches = 0       # searches started
+        self.coalesced = 0      # requests that joined a search already running
+
+    # a copy of the graph for the workers, copied again only when the graph changed
+    def _current_snapshot(self):
+        if self.snapshot is None or self.snapshot_version != self.graph.version:
+            self.snapshot = self.graph.copy()
+            self.snapshot_version = self.graph.version
+        return self.snapshot
+
+    def request(self, requester, start, goal, method=None):
+        '''
+            Ask for a path from start to goal, both (row, col) tiles.
+            requester is anything hashable that identifies who is asking, like
+            an enemy's index. It can only wait for one path, so a new request
+            replaces (and cancels) its old one. Returns the PathRequest.
+        '''
+        if method is None:
+            method = self.method
+        snapshot = self._current_snapshot()
+        key = (tuple(start), tuple(goal), snapshot.version, method)
+
+        old = self.by_requester.get(requester)
+        if old is not None:
+            if old.key() == key:
+                return old
+            self._drop(requester, old)
+
+        request = self.pending.get(key)
+        if request is None:
+            future = self.executor.submit(_search, key[0], key[1], snapshot, method)
+            request = PathRequest(key[0], key[1], key[2], method, future)
+            self.pending[key] = request
+            self.searches += 1
+        else:
+            self.coalesced += 1
+        request.requesters.add(requester)
+        self.by_requester[requester] = request
+        return request
+
+    # stop waiting for a path, the search is cancelled if nobody else wants it
+    def cancel(self, requester):
+        request = self.by_requester.get(requester)
+        if request is not None:
+            self._drop(requester, request)
+
+    def _drop(self, requester, request):
+        request.requesters.discard(requester)
+        del self.by_requester[requester]
+        if not request.requesters:
+            # a search that already started can't be stopped, its result is just ignored
+            request.future.cancel()
+            if self.pending.get(request.key()) is request:
+                del self.pending[request.key()]
+
+    def poll(self):
+        '''
+            Call once a frame. Returns {requester: PathRequest} for every
+            request that finished since the last poll. Compare
+            request.version with graph.version to see if the map changed
+            while the path was being found.
+        '''
+        finished = {}
+        for key in [key for key, request in self.pending.items() if request.done()]:
+            request = self.pending.pop(key)
+            for requester in request.requesters:
+                finished[requester] = request
+                del self.by_requester[requester]
+        return finished
+
+    def waiting(self):
+        return len(self.pending)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending = {}
+        self.by_requester = {}
@@ -0,0 +1,179 @@
+'''
+    A frame profiler for the main loop.
+    The loop has four phases (events, update, draw, post) and inside them
+    there are named sections (pathfinding, collide_wall, wall_blits ...).
+    Each one is timed with a "with" block:
+
+        with profiler.section('pathfinding'):
+            ...
+
+    The profiler keeps the last few hundred frames to report percentiles,
+    a histogram of whole frame times, and a trace of every frame that can
+    be saved as CSV or JSON. It can draw an overlay on the screen.
+    When it is disabled, section() returns a shared object that does
+    nothing, so the cost is one method call.
+'''
+import json
+import time
+from collections import deque
+import pygame
+
+PHASES = ('events', 'update', 'draw', 'post')
+# frame time histogram bins, 1 millisecond wide, the last bin holds everything slower
+HISTOGRAM_BINS = 50
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class FrameProfiler(object):
+    def __init__(self, enabled=False, window=600, max_trace=100000):
+        self.enabled = enabled
+        self.show_overlay = False
+        self.enabled_before_overlay = enabled    # put back when the overlay is closed
+        self.window = window          # frames kept for the percentiles
+        self.max_trace = max_trace    # frames kept for the trace file
+        self.timers = {}
+        self.current = {}             # name -> seconds in the frame being timed
+        self.recent = {}              # name -> deque of the last frames, milliseconds
+        self.trace = []               # one dictionary per frame, milliseconds
+        self.histogram = [0] * HISTOGRAM_BINS
+        self.frame_start = None
+        self.frames = 0
+        self.font = None
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_TIMER
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _Timer(self, name)
+        return timer
+
+    # the main loop phases are timed the same way as sections
+    def phase(self, name):
+        return self.section(name)
+
+    # sections run more than once in a frame add up
+    def add_time(self, name, seconds):
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+            self.current = {}
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        total = time.perf_counter() - self.frame_start
+        self.frame_start = None
+        self.frames += 1
+
+        frame = {'frame': self.frames, 'total': 1000 * total}
+        for name, seconds in self.current.items():
+            frame[name] = 1000 * seconds
+        for name, ms in frame.items():
+            if name == 'frame':
+                continue
+            if name not in self.recent:
+                self.recent[name] = deque(maxlen=self.window)
+            self.recent[name].append(ms)
+        if len(self.trace) < self.max_trace:
+            self.trace.append(frame)
+        self.histogram[min(int(frame['total']), HISTOGRAM_BINS - 1)] += 1
+
+    # the overlay needs timings, so it turns profiling on while it is shown
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        if self.show_overlay:
+            self.enabled_before_overlay = self.enabled
+            self.enabled = True
+        else:
+            self.enabled = self.enabled_before_overlay
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        values = sorted(self.recent.get(name, ()))
+        if not values:
+            return [0.0 for p in points]
+        return [values[min(len(values) - 1, len(values) * p // 100)] for p in points]
+
+    def summary(self):
+        summary = {}
+        for name in self.recent:
+            p50, p95, p99 = self.percentiles(name)
+            summary[name] = {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+        return summary
+
+    def _names(self):
+        names = ['total'] + [p for p in PHASES if p in self.recent]
+        names += sorted(n for n in self.recent if n not in names)
+        return names
+
+    def draw_overlay(self, surface, position=(10, 10)):
+        '''
+            Draw the percentiles for each phase and section, returns the rectangle drawn.
+        '''
+        if not self.show_overlay:
+            return None
+        if self.font is None:
+            self.font = pygame.font.SysFont(None, 20)
+        lines = ["frame %d   p50 / p95 / p99 ms" % self.frames]
+        for name in self._names():
+            p50, p95, p99 = self.percentiles(name)
+            lines.append("%-14s %6.2f %6.2f %6.2f" % (name, p50, p95, p99))
+
+        line_height = self.font.get_linesize()
+        width = max(self.font.size(line)[0] for line in lines) + 10
+        panel = pygame.Surface((width, line_height * len(lines) + 10), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            panel.blit(self.font.render(line, True, (255, 255, 255)), (5, 5 + i * line_height))
+        return surface.blit(panel, position)
+
+    def dump_csv(self, filename):
+        names = self._names()
+        with open(filename, 'w') as f:
+            f.write(','.join(['frame'] + names) + '\n')
+            for frame in self.trace:
+                f.write(','.join([str(frame['frame'])] + ['%.4f' % frame.get(n, 0.0) for n in names]) + '\n')
+
+    def dump_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'summary': self.summary(), 'histogram_ms': self.histogram, 'frames': self.trace}, f)
+
+    # save the trace, JSON if the file name ends in .json and CSV otherwise
+    def dump(self, filename):
+        if filename.endswith('.json'):
+            self.dump_json(filename)
+        else:
+            self.dump_csv(filename)
+
+
+# used when no profiler is given, it never times anything
+NULL_PROFILER = FrameProfiler(enabled=False)
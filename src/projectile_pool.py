@@ -0,0 +1,105 @@
+'''
+    All of the projectiles in the game, stored as NumPy arrays.
+    Instead of one Python object per projectile, each property (position,
+    direction, speed, spawn time) is one array with a row per projectile.
+    A frame step moves every projectile at once, tests the window, the walls
+    and the targets with whole-array operations, and then packs the live
+    projectiles to the front of the arrays.
+'''
+import numpy as np
+
+
+class ProjectilePool(object):
+    def __init__(self, capacity=256):
+        self.count = 0              # the live projectiles are rows 0 .. count-1
+        self.positions = np.zeros((capacity, 2))
+        self.directions = np.zeros((capacity, 2))
+        self.speeds = np.zeros(capacity)
+        self.spawn_times = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = max(2 * len(self.speeds), 16)
+        for name in ('positions', 'directions', 'speeds', 'spawn_times', 'alive'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, location, direction, speed, now):
+        if self.count == len(self.speeds):
+            self._grow()
+        i = self.count
+        self.positions[i] = (location[0], location[1])
+        self.directions[i] = (direction[0], direction[1])
+        self.speeds[i] = speed
+        self.spawn_times[i] = now
+        self.alive[i] = True
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def step(self, delta_t, window_width, window_height, wall_index, targets, hit_radius):
+        '''
+            Move every projectile and remove the ones that are done.
+            targets is a SpatialHash built with the positions that projectiles can hit.
+            Returns (hit_positions, hit_targets, wall_positions):
+              hit_positions   where projectiles hit a target
+              hit_targets     the index of the target that was hit, for each hit
+              wall_positions  where projectiles hit a wall
+        '''
+        n = self.count
+        positions = self.positions[:n]
+        positions += self.directions[:n] * (self.speeds[:n] * delta_t)[:, None]
+        alive = self.alive[:n]
+
+        # hits against the targets, the closest target within the radius
+        hit_index = targets.closest(positions, hit_radius)
+        is_hit = hit_index >= 0
+        alive &= ~is_hit
+
+        # projectiles that leave the window
+        x = positions[:, 0]
+        y = positions[:, 1]
+        on_screen = (x >= 0) & (x < window_width) & (y >= 0) & (y < window_height)
+        alive &= on_screen
+
+        # projectiles that hit a wall
+        is_wall_hit = alive & wall_index.collide_wall_many(positions, 1)
+        alive &= ~is_wall_hit
+
+        hit_positions = positions[is_hit].copy()
+        hit_targets = hit_index[is_hit]
+        wall_positions = positions[is_wall_hit].copy()
+        self._compact()
+        return hit_positions, hit_targets, wall_positions
+
+    # move the live projectiles to the front of the arrays
+    def _compact(self):
+        n = self.count
+        keep = np.flatnonzero(self.alive[:n])
+        count = len(keep)
+        if count < n:
+            for array in (self.positions, self.directions, self.speeds, self.spawn_times, self.alive):
+                array[:count] = array[keep]
+            self.count = count
+
+    # draw every projectile, looping its animation frames over duration milliseconds.
+    # returns the list of rectangles drawn (None for a SpriteBatch, its flush() returns them)
+    def draw(self, surface, now, frames, duration):
+        return draw_projectiles(surface, self.positions[:self.count], self.spawn_times[:self.count], now, frames, duration)
+
+
+# draw projectiles from arrays of positions and fire times, see ProjectilePool.draw
+def draw_projectiles(surface, positions, spawn_times, now, frames, duration):
+    if len(positions) == 0:
+        return []
+    # each projectile loops its animation from the time it was fired
+    age = (now - spawn_times) % duration
+    frame_index = ((age * len(frames)) // duration).astype(int)
+    # zip and map make the pairs without a Python loop, this runs for thousands of projectiles every frame
+    return surface.blits(zip(map(frames.__getitem__, frame_index.tolist()), positions.tolist()))
@@ -0,0 +1,102 @@
+'''
+    Drawing with a cached static layer and dirty rectangles.
+    The background and the walls only change when the map changes, so they
+    are drawn once onto a static surface. Each frame only the places where
+    sprites were drawn last frame are restored from the static surface, and
+    only the rectangles that changed are sent to the display.
+'''
+import pygame
+from profiler import NULL_PROFILER
+
+
+class Renderer(object):
+    def __init__(self, surface, background, wall_image, grid_width, grid_height, max_rects=256, profiler=None):
+        self.surface = surface
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.background = background
+        self.wall_image = wall_image
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.max_rects = max_rects  # more dirty rects than this and the whole window is updated
+        self.level = None
+        self.static = None
+        self.static_changed = True
+        self.previous_rects = []    # where sprites were drawn last frame
+        self.rects = []             # where sprites are drawn this frame
+        self.full_update = True
+        self.whole_frame = False            # too many sprites to keep rectangles for, see draw_batch
+        self.previous_whole_frame = False
+
+    def set_map(self, level):
+        self.level = level
+        self.static_changed = True
+
+    # call this when walls are added or removed
+    def mark_map_changed(self):
+        self.static_changed = True
+
+    def _build_static(self):
+        static = self.background.copy()
+        if self.level is not None:
+            static.blits([(self.wall_image, (c*self.grid_width, r*self.grid_height))
+                          for r, c in self.level.wall_tiles()], doreturn=False)
+        self.static = static
+        self.static_changed = False
+
+    def begin_frame(self):
+        with self.profiler.section('wall_blits'):
+            if self.static_changed or self.static is None:
+                self._build_static()
+                self.surface.blit(self.static, (0, 0))
+                self.full_update = True
+            elif self.previous_whole_frame:
+                # last frame drew too many sprites to erase one at a time
+                self.surface.blit(self.static, (0, 0))
+            else:
+                # erase last frame's sprites by copying the static layer back over them
+                static = self.static
+                self.surface.blits([(static, rect, rect) for rect in self.previous_rects], doreturn=False)
+        self.rects = []
+
+    # record where something was drawn, a Rect or a list of Rects
+    def mark_dirty(self, rects):
+        if rects is None:
+            return
+        if isinstance(rects, pygame.Rect):
+            self.rects.append(rects)
+        else:
+            self.rects.extend(rects)
+
+    def blit(self, image, position):
+        rect = self.surface.blit(image, position)
+        self.rects.append(rect)
+        return rect
+
+    def blits(self, sequence):
+        rects = self.surface.blits(sequence)
+        self.rects.extend(rects)
+        return rects
+
+    def draw_batch(self, batch):
+        '''
+            Draw a SpriteBatch. With more sprites than max_rects their
+            rectangles aren't kept, the whole window is updated this frame
+            and erased with one blit of the static layer next frame.
+        '''
+        if len(batch) > self.max_rects:
+            batch.flush(doreturn=False)
+            self.whole_frame = True
+        else:
+            self.mark_dirty(batch.flush())
+
+    def end_frame(self):
+        # the old sprite areas were erased and the new ones drawn, update both
+        dirty = self.previous_rects + self.rects
+        if self.full_update or self.whole_frame or self.previous_whole_frame or len(dirty) > self.max_rects:
+            pygame.display.update()
+        elif dirty:
+            pygame.display.update(dirty)
+        self.previous_rects = self.rects
+        self.previous_whole_frame = self.whole_frame
+        self.whole_frame = False
+        self.full_update = False
@@ -0,0 +1,168 @@
+'''
+    Record a play session and replay it exactly.
+    The recorder writes each frame's input, frame time and the simulation
+    step (tick) that first uses the input into a small binary file
+    (17 bytes a frame). The simulation only depends on those, so
+    replaying the file runs the same game again, with the window
+    (marian_cs_main.py --replay) or headless. Frame times are measured
+    during the replay, so two versions of the code can be compared on the
+    same session. A replay checks every frame's tick, so if it ever steps
+    differently from the recording it stops with an error instead of
+    quietly playing a different game.
+
+    Usage (from the src folder):
+        python marian_cs_main.py --record session.rec
+        python replay.py session.rec [--render] [--timings timings.csv]
+'''
+import argparse
+import os
+import struct
+import time
+from map_compiler import compile_map
+from simulation import Simulation, FrameInput, FixedStepRunner
+
+MAGIC = b'MCSR'
+VERSION = 3
+# magic, version, window width, window height, fixed step, length of the map file name.
+# times are doubles, a float would round the step (1000/60) and the replay would drift
+HEADER = struct.Struct('<4sHHHdH')
+# frame time in milliseconds, mouse x, mouse y, input flags, the tick the input is first used on
+FRAME = struct.Struct('<dhhBI')
+
+# input flags
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+FIRE = 16
+
+
+# the keys of a FrameInput packed into one byte of input flags
+def input_flags(frame_input):
+    flags = 0
+    if frame_input.up:
+        flags |= UP
+    if frame_input.down:
+        flags |= DOWN
+    if frame_input.left:
+        flags |= LEFT
+    if frame_input.right:
+        flags |= RIGHT
+    if frame_input.fire:
+        flags |= FIRE
+    return flags
+
+
+def input_from_flags(mouse_x, mouse_y, flags):
+    return FrameInput(mouse_x, mouse_y, up=bool(flags & UP), down=bool(flags & DOWN),
+                      left=bool(flags & LEFT), right=bool(flags & RIGHT), fire=bool(flags & FIRE))
+
+
+class InputRecorder(object):
+    def __init__(self, filename, map_file, win_width, win_height, fixed_delta_t):
+        self.file = open(filename, 'wb')
+        map_name = map_file.encode('utf-8')
+        self.file.write(HEADER.pack(MAGIC, VERSION, win_width, win_height, fixed_delta_t, len(map_name)))
+        self.file.write(map_name)
+        self.frames = 0
+
+    # tick is sim.tick before the frame runs, the step that uses the input first
+    def record(self, frame_input, frame_time, tick):
+        self.file.write(FRAME.pack(frame_time, int(frame_input.mouse_x), int(frame_input.mouse_y),
+                                   input_flags(frame_input), tick))
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+
+class InputReplayer(object):
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        magic, version, self.win_width, self.win_height, self.fixed_delta_t, name_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d replay file" % (filename, VERSION))
+        offset = HEADER.size
+        self.map_file = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        self.frames = list(FRAME.iter_unpack(data[offset:offset + (len(data) - offset) // FRAME.size * FRAME.size]))
+
+    def __len__(self):
+        return len(self.frames)
+
+    # each frame as (FrameInput, frame time, tick)
+    def __iter__(self):
+        for frame_time, mouse_x, mouse_y, flags, tick in self.frames:
+            yield input_from_flags(mouse_x, mouse_y, flags), frame_time, tick
+
+
+# a replayed frame must start on the tick it was recorded on, or the replay is a different game
+def check_tick(sim, tick, frame):
+    if sim.tick != tick:
+        raise ValueError("replay out of step: frame %d was recorded at tick %d but replays at tick %d"
+                         % (frame, tick, sim.tick))
+
+
+def replay_headless(filename):
+    '''
+        Replay a session without a window, as fast as possible.
+        Returns the simulation at the end and the time each frame took (seconds).
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    replayer = InputReplayer(filename)
+    level = compile_map(replayer.map_file, backend='grid')
+    sim = Simulation(level, replayer.win_width, replayer.win_height)
+    runner = FixedStepRunner(sim, replayer.fixed_delta_t)
+    frame_times = []
+    for frame, (frame_input, frame_time, tick) in enumerate(replayer):
+        check_tick(sim, tick, frame)
+        start = time.perf_counter()
+        runner.run_frame(frame_input, frame_time)
+        frame_times.append(time.perf_counter() - start)
+    return sim, frame_times
+
+
+def summarize_frame_times(frame_times):
+    if not frame_times:
+        return {'frames': 0}
+    ordered = sorted(frame_times)
+    n = len(ordered)
+    return {
+        'frames': n,
+        'mean_ms': 1000 * sum(ordered) / n,
+        'p50_ms': 1000 * ordered[n // 2],
+        'p95_ms': 1000 * ordered[min(n - 1, int(n * 0.95))],
+        'max_ms': 1000 * ordered[-1],
+    }
+
+
+def write_frame_times(filename, frame_times):
+    with open(filename, 'w') as f:
+        f.write('frame,milliseconds\n')
+        for i, seconds in enumerate(frame_times):
+            f.write('%d,%.4f\n' % (i, 1000 * seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded game session.')
+    parser.add_argument('replay_file', help='a file made with marian_cs_main.py --record')
+    parser.add_argument('--render', action='store_true', help='replay in the game window')
+    parser.add_argument('--timings', help='write the frame times to this CSV file')
+    args = parser.parse_args()
+
+    if args.render:
+        import marian_cs_main
+        frame_times = marian_cs_main.main(replay_file=args.replay_file)
+    else:
+        sim, frame_times = replay_headless(args.replay_file)
+        print("final player location:", sim.player_location, "enemy locations:", sim.enemies.positions[:sim.enemies.count].tolist())
+
+    print(summarize_frame_times(frame_times))
+    if args.timings:
+        write_frame_times(args.timings, frame_times)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+'''
+    Run the simulation on its own thread, separate from drawing.
+    The FixedStepRunner already moves the game in fixed steps, but it runs
+    them inside the draw loop, so the steps of a slow frame all happen at
+    once and the game stalls with the window. SimulationThread steps the
+    game at its own steady rate (60 steps a second). After every step it
+    copies what drawing needs (the player, enemies and projectiles) into a
+    SimState, and keeps the last two of them (double buffering). The draw
+    loop never touches the Simulation. It blends the two states for the
+    moment it draws, so motion is smooth at any frame rate, faster or
+    slower than the simulation.
+
+    Drawing happens one step (16.7 ms) behind the simulation, the price of
+    always having two states to blend between.
+
+    Python runs one thread at a time, but numpy and pygame's blits and
+    display updates let the other thread run while they work, so a slow
+    draw no longer holds up the simulation.
+
+    Usage (from the src folder):
+        python marian_cs_main.py --threaded [--fps 144]
+'''
+import math
+import threading
+import time
+import numpy as np
+import pygame
+from simulation import FrameInput, FIXED_DELTA_T, MAX_STEPS_PER_FRAME
+from projectile_pool import draw_projectiles
+from enemy_manager import draw_enemies
+
+# something that moved further than this in one step jumped (an enemy sent
+# back to its start), it is drawn where it is now instead of sliding there
+SNAP_DISTANCE = 50
+
+
+class ProjectileState(object):
+    def __init__(self, positions, velocities, spawn_times):
+        self.positions = positions      # (n, 2) x, y
+        self.velocities = velocities    # (n, 2) pixels per millisecond
+        self.spawn_times = spawn_times
+
+    def __len__(self):
+        return len(self.positions)
+
+    # the same as ProjectilePool.draw
+    def draw(self, surface, now, frames, duration):
+        return draw_projectiles(surface, self.positions, self.spawn_times, now, frames, duration)
+
+
+class EnemyState(object):
+    def __init__(self, positions):
+        self.positions = positions      # (n, 2) x, y
+
+    def __len__(self):
+        return len(self.positions)
+
+    # the same as EnemyManager.draw
+    def draw(self, surface, image, offset_x, offset_y):
+        return draw_enemies(surface, self.positions, image, offset_x, offset_y)
+
+
+class SimState(object):
+    '''
+        A copy of what is drawn from one simulation step. It has the same
+        names as the Simulation (player_location, angle, time, projectiles,
+        enemies), so the drawing code works with either one.
+    '''
+    def __init__(self, tick, sim_time, player_location, angle, enemies, projectiles, published=0.0):
+        self.tick = tick
+        self.time = sim_time
+        self.player_location = player_location    # pygame.math.Vector2
+        self.angle = angle
+        self.enemies = enemies
+        self.projectiles = projectiles
+        self.published = published                # time.perf_counter() when the step finished
+
+    @classmethod
+    def from_simulation(cls, sim, published=0.0):
+        pool = sim.projectiles
+        n = pool.count
+        projectiles = ProjectileState(pool.positions[:n].copy(),
+                                      pool.directions[:n] * pool.speeds[:n, None],
+                                      pool.spawn_times[:n].copy())
+        enemies = EnemyState(sim.enemies.positions[:sim.enemies.count].copy())
+        player = sim.player
+        location = pygame.math.Vector2(player.location) if player is not None else pygame.math.Vector2(0, 0)
+        angle = player.angle if player is not None else 0
+        return cls(sim.tick, sim.time, location, angle, enemies, projectiles, published)
+
+    def __str__(self):
+        return "SimState: tick %s, %s enemies, %s projectiles" % (self.tick, len(self.enemies), len(self.projectiles))
+
+
+def blend_states(previous, current, alpha, delta_t=FIXED_DELTA_T):
+    '''
+        The state alpha of the way (0 to 1) from previous to current.
+    '''
+    if previous is current or alpha >= 1:
+        return current
+    location = previous.player_location.lerp(current.player_location, alpha)
+    # turn the short way around, angles go from -180 to 180
+    turn = (current.angle - previous.angle + 180) % 360 - 180
+    angle = previous.angle + turn * alpha
+
+    enemies = current.enemies.positions
+    if len(previous.enemies) == len(enemies):
+        blended = previous.enemies.positions + (enemies - previous.enemies.positions) * alpha
+        jumped = np.abs(enemies - previous.enemies.positions).max(axis=1, initial=0) > SNAP_DISTANCE
+        blended[jumped] = enemies[jumped]
+        enemies = blended
+
+    # projectiles are packed together when one is removed, so rows don't match
+    # between states. They fly straight, so step them back from where they are now.
+    projectiles = current.projectiles
+    back = (1 - alpha) * delta_t
+    positions = projectiles.positions - projectiles.velocities * back
+
+    sim_time = previous.time + (current.time - previous.time) * alpha
+    return SimState(current.tick, sim_time, location, angle, EnemyState(enemies),
+                    ProjectileState(positions, projectiles.velocities, projectiles.spawn_times), current.published)
+
+
+class SimulationThread(object):
+    '''
+        Steps a Simulation every delta_t milliseconds on a background thread.
+        The draw loop gives it the newest input with set_input, collects the
+        events with take_events, and draws interpolate().
+    '''
+    def __init__(self, sim, delta_t=FIXED_DELTA_T, max_steps=MAX_STEPS_PER_FRAME, recorder=None):
+        self.sim = sim
+        self.delta_t = delta_t
+        self.max_steps = max_steps
+        self.recorder = recorder      # an InputRecorder, each step is saved as one frame
+        self.lock = threading.Lock()
+        self.input = FrameInput()
+        self.fire_pending = False
+        self.events = []
+        self.current = SimState.from_simulation(sim, time.perf_counter())
+        self.previous = self.current
+        self.thread = None
+        self.running = False
+        self.stats = {'steps': 0, 'step_seconds': 0.0, 'dropped_steps': 0}
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='simulation', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # the input used by the next steps. A click is kept until a step uses it
+    def set_input(self, frame_input):
+        with self.lock:
+            self.input = frame_input
+            self.fire_pending = self.fire_pending or frame_input.fire
+
+    # the events of the steps since the last call
+    def take_events(self):
+        with self.lock:
+            events = self.events
+            self.events = []
+        return events
+
+    # the last two states, (previous, current)
+    def states(self):
+        with self.lock:
+            return self.previous, self.current
+
+    def interpolate(self, now=None):
+        '''
+            The state to draw at time now (time.perf_counter(), default now):
+            between the last two steps, by how long ago the last one finished.
+        '''
+        if now is None:
+            now = time.perf_counter()
+        previous, current = self.states()
+        alpha = (now - current.published) * 1000.0 / self.delta_t
+        return blend_states(previous, current, min(max(alpha, 0.0), 1.0), self.delta_t)
+
+    def step(self):
+        with self.lock:
+            frame_input = self.input
+            frame_input = FrameInput(frame_input.mouse_x, frame_input.mouse_y, frame_input.up, frame_input.down,
+                                     frame_input.left, frame_input.right, fire=self.fire_pending)
+            self.fire_pending = False
+        if self.recorder is not None:
+            # saved with the tick about to use it, a replay runs this input on the same step
+            self.recorder.record(frame_input, self.delta_t, self.sim.tick)
+        start = time.perf_counter()
+        events = self.sim.step(frame_input, self.delta_t)
+        finished = time.perf_counter()
+        state = SimState.from_simulation(self.sim, finished)
+        with self.lock:
+            self.events.extend(events)
+            self.previous = self.current
+            self.current = state
+        self.stats['steps'] += 1
+        self.stats['step_seconds'] += finished - start
+
+    def _run(self):
+        interval = self.delta_t / 1000.0
+        next_step = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now < next_step:
+                time.sleep(next_step - now)
+                continue
+            steps = 0
+            while now >= next_step and steps < self.max_steps:
+                self.step()
+                next_step += interval
+                steps += 1
+            if now >= next_step:
+                # too far behind, drop the rest like FixedStepRunner does
+                missed = int(math.ceil((now - next_step) / interval))
+                self.stats['dropped_steps'] += missed
+                next_step += missed * interval
+
+    def report(self):
+        steps = max(self.stats['steps'], 1)
+        return "simulation thread: %d steps, %.2f ms a step, %d dropped" % (
+            self.stats['steps'], 1000 * self.stats['step_seconds'] / steps, self.stats['dropped_steps'])
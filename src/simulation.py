@@ -0,0 +1,309 @@
+'''
+    The game simulation, without any drawing or sound.
+    Simulation.step moves the game forward by a fixed amount of time using
+    one frame of input (FrameInput). It returns a list of events, like an
+    enemy being hit, so the caller can play sounds and start explosions.
+    The same step runs inside the game window (marian_cs_main.py) and with
+    no window at all (headless.py). The enemies are kept by an EnemyManager,
+    which starts enemies_per_spawn of them on every 'e' tile of the map.
+'''
+import math
+import pygame
+from pygame.locals import *
+from graph_tools import DistanceField, rc_to_vertex
+from collision_tools import WallIndex
+from projectile_pool import ProjectilePool
+from enemy_manager import EnemyManager
+from visibility import VisibilityIndex
+from profiler import NULL_PROFILER
+
+# the simulation always moves forward in steps of this many milliseconds
+FIXED_DELTA_T = 1000.0 / 60
+# the most simulation steps to run in one frame, so a slow frame can't snowball
+MAX_STEPS_PER_FRAME = 5
+
+PLAYER_SPEED = 0.25
+PLAYER_SIZE = 25
+ENEMY_SPEED = PLAYER_SPEED * 0.5
+PROJECTILE_SPEED = 0.4
+ENEMY_HIT_RADIUS = 15     # a projectile this close hits an enemy
+PLAYER_HIT_RADIUS = 25    # an enemy this close hurts the player
+CHASE_DISTANCE = 100      # closer than this and in sight, an enemy heads straight for the player
+
+# event names returned by Simulation.step, each event is (name, x, y)
+EVENT_FIRE = 'fire'
+EVENT_ENEMY_HIT = 'enemy_hit'
+EVENT_WALL_HIT = 'wall_hit'
+EVENT_PLAYER_HIT = 'player_hit'
+
+
+class FrameInput(object):
+    def __init__(self, mouse_x=0, mouse_y=0, up=False, down=False, left=False, right=False, fire=False):
+        self.mouse_x = mouse_x
+        self.mouse_y = mouse_y
+        self.up = up
+        self.down = down
+        self.left = left
+        self.right = right
+        self.fire = fire
+
+    def __str__(self):
+        return "FrameInput: mouse (%s, %s) up %s down %s left %s right %s fire %s" % (
+            self.mouse_x, self.mouse_y, self.up, self.down, self.left, self.right, self.fire)
+
+
+# turn the keys being pressed and the mouse into a FrameInput
+def read_frame_input(keys_pressed, mouse_x, mouse_y, fire):
+    return FrameInput(mouse_x, mouse_y,
+                      up=K_UP in keys_pressed or K_w in keys_pressed,
+                      down=K_DOWN in keys_pressed or K_s in keys_pressed,
+                      left=K_LEFT in keys_pressed or K_a in keys_pressed,
+                      right=K_RIGHT in keys_pressed or K_d in keys_pressed,
+                      fire=fire)
+
+
+class Player(object):
+    def __init__(self, player_id, location):
+        self.id = player_id
+        self.location = location                            # pygame.math.Vector2
+        self.direction = pygame.math.Vector2(0, 1)          # where the player aims
+        self.angle = 0                                      # the same, in degrees for drawing
+
+    def __str__(self):
+        return "Player %s at (%.1f, %.1f)" % (self.id, self.location.x, self.location.y)
+
+
+def tile_size(level, win_width, win_height, map_name='the map'):
+    '''
+        The width and height of a tile in pixels, the map is stretched to
+        fill the window. Raises ValueError if a tile would be less than a
+        pixel (the map has more tiles across or down than the window has pixels).
+    '''
+    grid_w = int(win_width/level.cols) if level.cols else 0
+    grid_h = int(win_height/level.rows) if level.rows else 0
+    if grid_w < 1 or grid_h < 1:
+        raise ValueError("%s is %d x %d tiles, too big for a %d x %d window (tiles must be at least 1 pixel)"
+                         % (map_name, level.cols, level.rows, win_width, win_height))
+    return grid_w, grid_h
+
+
+class Simulation(object):
+    def __init__(self, level, win_width, win_height, profiler=None, enemies_per_spawn=1, players=1):
+        self.level = level
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.win_width = win_width
+        self.win_height = win_height
+        self.grid_w, self.grid_h = tile_size(level, win_width, win_height)
+        self.time = 0.0   # milliseconds of game time
+        self.tick = 0     # number of steps taken
+
+        # find the walls near a position without checking the whole map
+        self.wall_index = WallIndex.from_map(level, self.grid_w, self.grid_h)
+        # distances to the players' tiles, only recomputed when a player changes tiles
+        self.player_field = DistanceField(level.graph)
+        # all of the projectiles, stored together as arrays
+        self.projectiles = ProjectilePool()
+        # which tiles can see each other, far enough for an enemy to spot a player it could chase
+        sight_range = int(CHASE_DISTANCE // min(self.grid_w, self.grid_h)) + 1
+        self.visibility = VisibilityIndex.from_map(level, sight_range)
+        # every enemy, stored together as arrays
+        self.enemies = EnemyManager(self.grid_w, self.grid_h, level.rows, level.cols)
+        self.enemies.spawn_tiles(level.enemy_spawns, enemies_per_spawn)
+
+        # the players by id, in the order they joined. The first one is the
+        # local player that step(), player_location and angle refer to.
+        self.players = {}
+        self.next_player_id = 0
+        self.player = None
+        for i in range(players):
+            self.add_player()
+
+    # place a new player in the center of the start tile, returns its id
+    def add_player(self):
+        player = Player(self.next_player_id, self.tile_center(*self.level.player_spawn))
+        self.players[player.id] = player
+        self.next_player_id += 1
+        if self.player is None:
+            self.player = player
+        return player.id
+
+    def remove_player(self, player_id):
+        player = self.players.pop(player_id, None)
+        if player is self.player:
+            self.player = next(iter(self.players.values()), None)
+
+    # the local player's location, direction and angle
+    @property
+    def player_location(self):
+        return self.player.location
+
+    @player_location.setter
+    def player_location(self, location):
+        self.player.location = location
+
+    @property
+    def player_direction(self):
+        return self.player.direction
+
+    @property
+    def angle(self):
+        return self.player.angle
+
+    # convert the tile coordinates in row/column to game map x and y
+    def tile_center(self, r, c):
+        return pygame.math.Vector2((c * self.grid_w) + self.grid_w / 2, (r * self.grid_h) + self.grid_h / 2)
+
+    # one step with the local player's input
+    def step(self, frame_input, delta_t=FIXED_DELTA_T):
+        return self.step_players({self.player.id: frame_input}, delta_t)
+
+    def step_players(self, inputs, delta_t=FIXED_DELTA_T):
+        '''
+            One step of the game with an input for each player, inputs is
+            {player id: FrameInput}. Players without an input stand still.
+            Returns the list of events.
+        '''
+        events = []
+        for player_id, frame_input in inputs.items():
+            player = self.players.get(player_id)
+            if player is None:
+                continue
+            # aim at the mouse
+            mouse_x, mouse_y = frame_input.mouse_x, frame_input.mouse_y
+            if (mouse_x, mouse_y) != (player.location.x, player.location.y):
+                player.direction = look_direction(player.location.x, player.location.y, mouse_x, mouse_y)
+                player.angle = look_angle(player.location.x, player.location.y, mouse_x, mouse_y)
+
+            if frame_input.fire:
+                self.projectiles.spawn(player.location, player.direction, PROJECTILE_SPEED, self.time)
+                events.append((EVENT_FIRE, player.location.x, player.location.y))
+
+            self._update_player(player, frame_input, delta_t)
+        self._update_projectiles(delta_t, events)
+        self._update_enemies(delta_t)
+
+        self.enemies.build_hash()
+        for player in self.players.values():
+            if self.enemies.touching(player.location, PLAYER_HIT_RADIUS) >= 0:
+                events.append((EVENT_PLAYER_HIT, player.location.x, player.location.y))
+
+        self.time += delta_t
+        self.tick += 1
+        return events
+
+    def _update_player(self, player, frame_input, delta_t):
+        player_velocity = pygame.math.Vector2(0, 0)
+        if frame_input.right:
+            player_velocity.x += 1
+        if frame_input.left:
+            player_velocity.x -= 1
+        if frame_input.up:
+            player_velocity.y -= 1
+        if frame_input.down:
+            player_velocity.y += 1
+
+        if player_velocity.length() == 0:
+            return
+        new_location = player.location + player_velocity.normalize() * delta_t * PLAYER_SPEED
+
+        with self.profiler.section('collide_wall'):
+            hit_wall = self.wall_index.collide_wall(new_location, PLAYER_SIZE)
+        if hit_wall:
+            pass
+        elif is_inside_window(new_location, PLAYER_SIZE, self.win_width, self.win_height):
+            player.location = new_location
+
+    def _update_projectiles(self, delta_t, events):
+        with self.profiler.section('projectiles'):
+            self.enemies.build_hash()
+            hit_positions, hit_targets, wall_positions = self.projectiles.step(
+                delta_t, self.win_width, self.win_height, self.wall_index, self.enemies.hash, ENEMY_HIT_RADIUS)
+        for x, y in hit_positions.tolist():
+            events.append((EVENT_ENEMY_HIT, x, y))
+        if len(hit_targets) > 0:
+            # enemies that were hit go back to where they started
+            self.enemies.reset(hit_targets)
+
+        for x, y in wall_positions.tolist():
+            events.append((EVENT_WALL_HIT, x, y))
+
+    def _update_enemies(self, delta_t):
+        if not self.players:
+            return
+        # the enemies head for the closest player
+        locations = [(player.location.x, player.location.y) for player in self.players.values()]
+        goals = tuple(rc_to_vertex(*vector_to_rc(player.location, self.grid_w, self.grid_h), self.level.cols)
+                      for player in self.players.values())
+        with self.profiler.section('pathfinding'):
+            self.player_field.update(goals[0] if len(goals) == 1 else goals)
+        with self.profiler.section('enemies'):
+            self.enemies.update(delta_t, locations, self.player_field, self.wall_index,
+                                self.win_width, self.win_height, ENEMY_SPEED, CHASE_DISTANCE, PLAYER_SIZE/2,
+                                self.visibility)
+
+
+class FixedStepRunner(object):
+    '''
+        Turns frames of any length into fixed simulation steps.
+        Time left over from one frame is carried into the next one. A click
+        waits until the next step, so it is never lost on a short frame.
+    '''
+    def __init__(self, sim, delta_t=FIXED_DELTA_T, max_steps=MAX_STEPS_PER_FRAME):
+        self.sim = sim
+        self.delta_t = delta_t
+        self.max_steps = max_steps
+        self.time_to_simulate = 0
+        self.fire_pending = False
+
+    # run the steps for one frame that took frame_time milliseconds, returns the events
+    def run_frame(self, frame_input, frame_time):
+        self.fire_pending = self.fire_pending or frame_input.fire
+        self.time_to_simulate += frame_time
+        events = []
+        steps = 0
+        while self.time_to_simulate >= self.delta_t and steps < self.max_steps:
+            frame_input.fire = self.fire_pending
+            self.fire_pending = False
+            events.extend(self.sim.step(frame_input, self.delta_t))
+            self.time_to_simulate -= self.delta_t
+            steps += 1
+        if steps == self.max_steps:
+            self.time_to_simulate = 0  # too far behind, drop the rest
+        return events
+
+
+def vector_to_rc(location, grid_width, grid_height):
+    r = int(location.y/grid_height)
+    c = int(location.x/grid_width)
+    return r, c
+
+
+# check if the location is inside the window
+def is_inside_window(location, size, window_width, window_height):
+    if location.x < size or location.x > window_width - size:
+        return False
+
+    if location.y < size or location.y > window_height - size:
+        return False
+
+    return True
+
+
+def look_direction(player_x, player_y, mouse_x, mouse_y):
+    mouse_vector = pygame.math.Vector2(mouse_x, mouse_y)
+    player_position_vector = pygame.math.Vector2(player_x, player_y)
+    player_to_mouse_vector = (mouse_vector - player_position_vector).normalize()
+    return player_to_mouse_vector
+
+
+def look_angle(player_x, player_y, mouse_x, mouse_y):
+    mouse_vector = pygame.math.Vector2(mouse_x, mouse_y)
+    player_position_vector = pygame.math.Vector2(player_x, player_y)
+    player_to_mouse_vector = (mouse_vector - player_position_vector).normalize()
+    down_vector = pygame.math.Vector2(0, 1)
+    angle = math.degrees(math.acos(player_to_mouse_vector.dot(down_vector)))
+
+    if player_x > mouse_x:
+        angle = -1.0 * angle
+
+    return angle
@@ -0,0 +1,139 @@
+'''
+    A spatial hash (uniform grid) broad phase for entity hit tests.
+    Entities are sorted by the grid cell they are in. To find what is near
+    a point, only the cells around it are looked up, so testing P points
+    against E entities costs about P + E instead of P x E. The cells are
+    the same size as the map tiles (grid_w by grid_h).
+
+    The hash is rebuilt every frame with build(), which is one sort. When
+    the entities are in a small box of cells, build() also makes a table of
+    where each cell's entities start, so looking up the cells around
+    thousands of points is array indexing instead of binary searches.
+'''
+import numpy as np
+
+# cell coordinates are packed into one integer key, this keeps them positive
+CELL_OFFSET = 1 << 20
+CELL_SPAN = 1 << 21
+
+# with this few point x entity pairs, every pair is a candidate (numpy setup costs more)
+SMALL_PAIRS = 64
+# the most cells in the table of cell starts, it is rebuilt with the hash every frame
+DENSE_MAX_CELLS = 16384
+
+
+class SpatialHash(object):
+    def __init__(self, cell_width, cell_height):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.positions = np.zeros((0, 2))
+        self.order = np.zeros(0, dtype=np.int64)        # entity indices sorted by cell key
+        self.sorted_keys = np.zeros(0, dtype=np.int64)
+        self.box = None             # (first cell x, first cell y, cells across, cells down) of the table
+        self.cell_starts = None     # [row, column] -> the first entity in sorted order at or after that cell
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cells(self, positions):
+        cx = np.floor(positions[:, 0] / self.cell_width).astype(np.int64)
+        cy = np.floor(positions[:, 1] / self.cell_height).astype(np.int64)
+        return cx, cy
+
+    def _keys(self, cx, cy):
+        return (cy + CELL_OFFSET) * CELL_SPAN + (cx + CELL_OFFSET)
+
+    # put the entities at these positions, an (n, 2) array, into the hash
+    def build(self, positions):
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        cx, cy = self._cells(self.positions)
+        keys = self._keys(cx, cy)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+        self.box = None
+        if len(keys):
+            x0, y0 = int(cx.min()), int(cy.min())
+            across, down = int(cx.max()) - x0 + 1, int(cy.max()) - y0 + 1
+            if across * down <= DENSE_MAX_CELLS:
+                # one extra column, the start of the cell after a row is where the row ends
+                table_keys = self._keys(x0 + np.arange(across + 1)[None, :], y0 + np.arange(down)[:, None])
+                self.cell_starts = np.searchsorted(self.sorted_keys, table_keys)
+                self.box = (x0, y0, across, down)
+
+    def candidate_pairs(self, points, radius):
+        '''
+            Find the entities that might be within radius of each point.
+            Returns two arrays (point_index, entity_index), one row per
+            candidate pair. Use close_pairs to keep only the real hits.
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        empty = np.zeros(0, dtype=np.int64)
+        if len(points) == 0 or len(self.positions) == 0:
+            return empty, empty
+        if len(points) * len(self.positions) <= SMALL_PAIRS:
+            point_index, entity_index = np.divmod(np.arange(len(points) * len(self.positions)), len(self.positions))
+            return point_index, entity_index
+
+        cx, cy = self._cells(points)
+        span_x = int(np.ceil(radius / self.cell_width))
+        span_y = int(np.ceil(radius / self.cell_height))
+        point_ids = np.arange(len(points))
+        all_points = []
+        all_entities = []
+        # the cells of one row are next to each other in key order, so the
+        # entities of a whole row of cells are one range of sorted_keys
+        if self.box is not None:
+            x0, y0, across, down = self.box
+            first_column = np.clip(cx - span_x - x0, 0, across)
+            end_column = np.clip(cx + span_x + 1 - x0, 0, across)
+        for dy in range(-span_y, span_y + 1):
+            if self.box is not None:
+                row = cy + dy - y0
+                in_box = (row >= 0) & (row < down)
+                row = np.clip(row, 0, down - 1)
+                lo = self.cell_starts[row, first_column]
+                hi = np.where(in_box, self.cell_starts[row, end_column], lo)
+            else:
+                lo = np.searchsorted(self.sorted_keys, self._keys(cx - span_x, cy + dy), side='left')
+                hi = np.searchsorted(self.sorted_keys, self._keys(cx + span_x, cy + dy), side='right')
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # expand every [lo, hi) range into its entity indices
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            all_points.append(np.repeat(point_ids, counts))
+            all_entities.append(self.order[starts + np.arange(total)])
+
+        if not all_points:
+            return empty, empty
+        return np.concatenate(all_points), np.concatenate(all_entities)
+
+    def close_pairs(self, points, radius):
+        '''
+            Find every (point, entity) pair closer than radius.
+            Returns (point_index, entity_index, distance) arrays.
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        point_index, entity_index = self.candidate_pairs(points, radius)
+        offsets = points[point_index] - self.positions[entity_index]
+        distance = np.sqrt((offsets ** 2).sum(axis=1))
+        close = distance < radius
+        return point_index[close], entity_index[close], distance[close]
+
+    def closest(self, points, radius):
+        '''
+            For each point, the index of the closest entity within radius, or -1.
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        closest = np.full(len(points), -1, dtype=np.int64)
+        point_index, entity_index, distance = self.close_pairs(points, radius)
+        if len(point_index):
+            # sort by point then distance, the first row of each point is its closest entity
+            order = np.lexsort((distance, point_index))
+            point_index = point_index[order]
+            first = np.ones(len(point_index), dtype=bool)
+            first[1:] = point_index[1:] != point_index[:-1]
+            closest[point_index[first]] = entity_index[order][first]
+        return closest
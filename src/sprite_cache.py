@@ -0,0 +1,71 @@
+'''
+    A cache of rotated sprites.
+    Rotating an image every frame is slow, and the player's look angle
+    barely changes between frames. The angle is rounded to a step (1 degree
+    by default) and each rotated image is kept with the offset from the
+    pivot to its upper left corner. Old entries are dropped when the cache
+    is full (least recently used first).
+'''
+from collections import OrderedDict
+import pygame
+
+
+# Where to put the upper left corner of a rotated image, relative to the pivot.
+# code from https://stackoverflow.com/a/54714144/2912901
+def rotated_offset(image, originPos, angle):
+    # calcaulate the axis aligned bounding box of the rotated image
+    w, h = image.get_size()
+    box = [pygame.math.Vector2(p) for p in [(0, 0), (w, 0), (w, -h), (0, -h)]]
+    box_rotate = [p.rotate(angle) for p in box]
+    min_x = min(p[0] for p in box_rotate)
+    max_y = max(p[1] for p in box_rotate)
+
+    # calculate the translation of the pivot
+    pivot = pygame.math.Vector2(originPos[0], -originPos[1])
+    pivot_rotate = pivot.rotate(angle)
+    pivot_move = pivot_rotate - pivot
+
+    return (-originPos[0] + min_x - pivot_move[0], -originPos[1] - max_y + pivot_move[1])
+
+
+class RotationCache(object):
+    def __init__(self, angle_step=1.0, max_entries=1024):
+        self.angle_step = angle_step
+        self.steps = int(round(360.0 / angle_step))
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (image id, origin, step) -> (image, rotated image, offset)
+
+    def quantize(self, angle):
+        return int(round(angle / self.angle_step)) % self.steps
+
+    def get(self, image, originPos, angle):
+        '''
+            The rotated image and the offset of its upper left corner from the pivot.
+        '''
+        step = self.quantize(angle)
+        key = (id(image), originPos[0], originPos[1], step)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        else:
+            rounded_angle = step * self.angle_step
+            # the source image is kept in the entry so its id can't be reused
+            entry = (image, pygame.transform.rotate(image, rounded_angle),
+                     rotated_offset(image, originPos, rounded_angle))
+            self.entries[key] = entry
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry[1], entry[2]
+
+    # rotate an image for every step up front, for example while loading
+    def warm_up(self, image, originPos):
+        for step in range(self.steps):
+            self.get(image, originPos, step * self.angle_step)
+
+    def clear(self):
+        self.entries.clear()
+
+    # Rotate an image around a pivot and draw it, returns the rectangle drawn
+    def blit(self, surf, image, pos, originPos, angle):
+        rotated_image, offset = self.get(image, originPos, angle)
+        return surf.blit(rotated_image, (pos[0] + offset[0], pos[1] + offset[1]))
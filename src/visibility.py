@@ -0,0 +1,208 @@
+'''
+    Line of sight between tiles, worked out once when the map is loaded.
+    Tile A can see tile B if the line between their centers doesn't cross a
+    wall tile. A line passing exactly through the corner of two tiles is
+    blocked if either of them is a wall, so nothing is seen through the
+    gap between two walls that touch diagonally.
+
+    Every tile keeps a bitset of the tiles it can see within max_range
+    tiles: one bit per tile of the (2R+1) x (2R+1) square around it. That
+    makes can_see one array lookup. The lines are the same wherever they
+    start, so the tiles each line crosses are found once for every offset
+    and reused for every tile.
+
+    The bitsets are built one line at a time for every tile at once: a line
+    is blocked for all tiles by or-ing together shifted copies of the wall
+    map, one for each tile on the line, packed 8 tiles to a byte.
+
+    When a wall is added or removed, only the lines that cross it are
+    worked out again (see CompiledMap.set_wall).
+
+    The bitsets take rows * cols * (2R+1)^2 / 8 bytes, so the range is
+    capped at MAX_RANGE (0.5 MB for every 1000 tiles).
+'''
+import numpy as np
+
+# the farthest a tile can see, in tiles
+MAX_RANGE = 32
+
+
+# the tiles crossed by the line from the center of tile (0, 0) to the center of tile (dr, dc)
+# https://www.redblobgames.com/grids/line-drawing/#supercover
+def line_tiles(dr, dc):
+    tiles = [(0, 0)]
+    n_c, n_r = abs(dc), abs(dr)
+    step_c = 1 if dc > 0 else -1
+    step_r = 1 if dr > 0 else -1
+    r = c = 0
+    i_c = i_r = 0
+    while i_c < n_c or i_r < n_r:
+        decision = (1 + 2 * i_c) * n_r - (1 + 2 * i_r) * n_c
+        if decision == 0:
+            # exactly through a corner, both tiles next to the corner count
+            tiles.append((r, c + step_c))
+            tiles.append((r + step_r, c))
+            r += step_r
+            c += step_c
+            i_r += 1
+            i_c += 1
+        elif decision < 0:
+            c += step_c
+            i_c += 1
+        else:
+            r += step_r
+            i_r += 1
+        tiles.append((r, c))
+    return tiles
+
+
+class VisibilityIndex(object):
+    def __init__(self, walls, grid_rows, grid_cols, max_range):
+        max_range = max(min(max_range, MAX_RANGE), 0)
+        self.rows = grid_rows
+        self.cols = grid_cols
+        self.range = max_range
+        self.size = 2 * max_range + 1  # the width of the square of tiles each bitset covers
+
+        # the walls, with max_range extra wall tiles around the map so no line leaves the array
+        R = max_range
+        self.padded = np.ones((grid_rows + 2 * R, grid_cols + 2 * R), dtype=bool)
+        self.padded[R:R + grid_rows, R:R + grid_cols] = np.frombuffer(
+            bytes(walls), dtype=np.uint8).reshape(grid_rows, grid_cols).astype(bool)
+
+        self._build_lines()
+        self._build_bits()
+
+    @classmethod
+    def from_map(cls, level, max_range):
+        index = cls(level.walls, level.rows, level.cols, max_range)
+        level.add_listener(index.wall_changed)
+        return index
+
+    def _build_lines(self):
+        # every offset within range, its bit in the bitset, and the tiles its line crosses
+        R = self.range
+        bit = []
+        starts = []
+        cell_r = []
+        cell_c = []
+        crossing = {}   # (dr, dc) of a tile -> the lines (k) that cross it
+        for dr in range(-R, R + 1):
+            for dc in range(-R, R + 1):
+                if dr * dr + dc * dc > R * R:
+                    continue
+                k = len(bit)
+                bit.append((dr + R) * self.size + (dc + R))
+                starts.append(len(cell_r))
+                for tile in line_tiles(dr, dc):
+                    cell_r.append(tile[0])
+                    cell_c.append(tile[1])
+                    crossing.setdefault(tile, []).append(k)
+        self.offset_bits = np.array(bit, dtype=np.int64)
+        self.line_starts = np.array(starts, dtype=np.int64)
+        self.line_lengths = np.diff(np.append(self.line_starts, len(cell_r)))
+        self.cell_r = np.array(cell_r, dtype=np.int64)
+        self.cell_c = np.array(cell_c, dtype=np.int64)
+        self.crossing = crossing
+
+        # the same as crossing, as arrays: line cross_k passes the tile (cross_dr, cross_dc) from its start
+        pairs = [(tile[0], tile[1], k) for tile, lines in crossing.items() for k in lines]
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 3)
+        self.cross_dr, self.cross_dc, self.cross_k = pairs[:, 0], pairs[:, 1], pairs[:, 2]
+        # the tiles of each of those lines, as places in self.padded relative to the crossed tile
+        lengths = self.line_lengths[self.cross_k]
+        self.cross_starts = np.cumsum(lengths) - lengths
+        pair = np.repeat(np.arange(len(lengths)), lengths)
+        cell = self.line_starts[self.cross_k][pair] + np.arange(lengths.sum()) - self.cross_starts[pair]
+        width = self.padded.shape[1]
+        self.cross_cells = ((self.cell_r[cell] - self.cross_dr[pair]) * width
+                            + self.cell_c[cell] - self.cross_dc[pair]).astype(np.int32)
+
+    # the bitsets of every tile, one line at a time
+    def _build_bits(self):
+        R = self.range
+        rows, cols = self.rows, self.cols
+        # the walls moved dc columns, 8 tiles to a byte, for every dc a line can step
+        shifted = {}
+        for dc in range(-R, R + 1):
+            shifted[dc] = np.packbits(self.padded[:, R + dc:R + dc + cols], axis=1)
+        # built byte by byte, each byte of the bitsets of every tile is one row
+        bits = np.zeros(((self.size * self.size + 7) // 8, rows * cols), dtype=np.uint8)
+        blocked = np.empty((rows, shifted[0].shape[1]), dtype=np.uint8)
+        for k in range(len(self.offset_bits)):
+            # a line is blocked if any tile on it is a wall, outside the map counts as a wall
+            blocked[:] = 0
+            for i in range(self.line_starts[k], self.line_starts[k] + self.line_lengths[k]):
+                dr = self.cell_r[i]
+                np.bitwise_or(blocked, shifted[self.cell_c[i]][R + dr:R + dr + rows], out=blocked)
+            visible = np.unpackbits(~blocked, axis=1, count=cols).reshape(-1)
+            bit = int(self.offset_bits[k])
+            bits[bit >> 3] |= visible << np.uint8(7 - (bit & 7))
+        self.bits = np.ascontiguousarray(bits.T)
+
+    def can_see(self, tile_a, tile_b):
+        '''
+            True if the centers of tile_a and tile_b can see each other.
+            Tiles are (row, col). Tiles farther apart than max_range can't see each other.
+        '''
+        dr = tile_b[0] - tile_a[0]
+        dc = tile_b[1] - tile_a[1]
+        R = self.range
+        if dr < -R or dr > R or dc < -R or dc > R:
+            return False
+        k = (dr + R) * self.size + (dc + R)
+        return bool(self.bits[tile_a[0] * self.cols + tile_a[1], k >> 3] & (128 >> (k & 7)))
+
+    def can_see_many(self, vertices_a, vertices_b):
+        '''
+            can_see for arrays of vertices (r * cols + c), returns a boolean array.
+        '''
+        vertices_a = np.asarray(vertices_a, dtype=np.int64)
+        vertices_b = np.asarray(vertices_b, dtype=np.int64)
+        dr = vertices_b // self.cols - vertices_a // self.cols
+        dc = vertices_b % self.cols - vertices_a % self.cols
+        R = self.range
+        in_range = (np.abs(dr) <= R) & (np.abs(dc) <= R)
+        k = np.where(in_range, (dr + R) * self.size + (dc + R), 0)
+        seen = (self.bits[vertices_a, k >> 3] & (128 >> (k & 7))) != 0
+        return seen & in_range
+
+    # the (row, col) of every tile that tile can see
+    def visible_tiles(self, tile):
+        R = self.range
+        visible = np.unpackbits(self.bits[tile[0] * self.cols + tile[1]])[:self.size * self.size]
+        tiles = []
+        for k in np.flatnonzero(visible).tolist():
+            dr, dc = divmod(k, self.size)
+            tiles.append((tile[0] + dr - R, tile[1] + dc - R))
+        return tiles
+
+    def wall_changed(self, r, c, is_wall):
+        '''
+            Update the lines of sight that cross tile (r, c).
+            Returns the number of lines worked out again.
+        '''
+        R = self.range
+        self.padded[r + R, c + R] = is_wall
+        # a tile at (r - dr, c - dc) has line k crossing (r, c) if (dr, dc) is on line k
+        source_r = r - self.cross_dr
+        source_c = c - self.cross_dc
+        inside = (source_r >= 0) & (source_r < self.rows) & (source_c >= 0) & (source_c < self.cols)
+        k = self.cross_k[inside]
+        v = source_r[inside] * self.cols + source_c[inside]
+        byte = self.offset_bits[k] >> 3
+        mask = (128 >> (self.offset_bits[k] & 7)).astype(np.uint8)
+        # a new wall blocks every line through it
+        np.bitwise_and.at(self.bits, (v, byte), ~mask)
+        if is_wall:
+            return len(k)
+        # a removed wall: the lines through it are clear unless another wall is on them.
+        # Lines from outside the map read past the edges of padded (clipped), they are left out
+        center = (r + R) * self.padded.shape[1] + c + R
+        on_wall = np.take(self.padded.reshape(-1), center + self.cross_cells, mode='clip')
+        clear = ~np.logical_or.reduceat(on_wall, self.cross_starts)[inside]
+        np.bitwise_or.at(self.bits, (v[clear], byte[clear]), mask[clear])
+        return len(k)
+
+    def __str__(self):
+        return "VisibilityIndex: %s x %s tiles, range %s" % (self.rows, self.cols, self.range)
@@ -0,0 +1,429 @@
+'''
+    Huge maps stored in chunks and read with mmap.
+    A text map of 10,000 x 10,000 tiles is 100 MB and takes a long time to
+    read into strings. The chunked format stores one byte per tile in
+    square chunks (32 x 32 tiles by default), so the tiles near a point are
+    in a few small blocks of the file. The file is memory mapped and a
+    chunk is only read when something asks for a tile in it. The chunks in
+    use are kept in a small cache, the least recently used ones are thrown
+    out, so memory depends on the area in use and not on the map size.
+
+    File layout (little endian):
+        header   magic 'MCSW', version, rows, cols, chunk size, number of spawns
+        chunks   chunk rows top to bottom, chunks left to right in each,
+                 chunk_size x chunk_size tile codes per chunk. Tiles past
+                 the edge of the map are walls.
+        spawns   (row, col, tile code) for every 'p' and 'e' tile
+
+    Usage (from the src folder):
+        python world_streaming.py convert ../data/map.txt map.world
+        python world_streaming.py generate 10000 10000 big.world
+        python world_streaming.py bench big.world
+'''
+import argparse
+import mmap
+import struct
+import time
+import numpy as np
+from map_compiler import compile_tiles, WALL, PLAYER, ENEMY
+from collision_tools import WallIndex
+
+MAGIC = b'MCSW'
+VERSION = 1
+# magic, version, rows, cols, chunk size, number of spawns
+HEADER = struct.Struct('<4sHIIHI')
+SPAWN = struct.Struct('<IIB')
+CHUNK_SIZE = 32
+MAX_CHUNKS = 1024
+
+# tile codes in the file
+FLOOR = 0
+WALL_TILE = 1
+PLAYER_TILE = 2
+ENEMY_TILE = 3
+SYMBOLS = {FLOOR: ' ', WALL_TILE: WALL, PLAYER_TILE: PLAYER, ENEMY_TILE: ENEMY}
+
+# map characters to tile codes, anything unknown is floor
+_CODES = np.zeros(256, dtype=np.uint8)
+_CODES[ord(WALL)] = WALL_TILE
+_CODES[ord(PLAYER)] = PLAYER_TILE
+_CODES[ord(ENEMY)] = ENEMY_TILE
+
+
+def write_chunked_map(filename, rows, cols, chunk_rows, chunk_size=CHUNK_SIZE):
+    '''
+        Write a chunked map. chunk_rows gives the tile codes chunk_size rows
+        at a time, as (n, cols) uint8 arrays, so the whole map never has to
+        be in memory.
+    '''
+    chunks_across = (cols + chunk_size - 1) // chunk_size
+    spawns = []
+    with open(filename, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        for block_index, block in enumerate(chunk_rows):
+            r0 = block_index * chunk_size
+            padded = np.full((chunk_size, chunks_across * chunk_size), WALL_TILE, dtype=np.uint8)
+            padded[:len(block), :cols] = block
+            for r, c in zip(*np.nonzero((block == PLAYER_TILE) | (block == ENEMY_TILE))):
+                spawns.append((r0 + int(r), int(c), int(block[r, c])))
+            # chunk by chunk, each chunk's rows together
+            chunked = padded.reshape(chunk_size, chunks_across, chunk_size).transpose(1, 0, 2)
+            f.write(np.ascontiguousarray(chunked).tobytes())
+        for spawn in spawns:
+            f.write(SPAWN.pack(*spawn))
+        # the number of spawns is only known now
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, rows, cols, chunk_size, len(spawns)))
+
+
+def convert_text_map(text_file, filename, chunk_size=CHUNK_SIZE):
+    '''
+        Convert a text map into the chunked format, chunk_size lines at a time.
+    '''
+    # the same rows as read_tile_rows: blank lines at the end of the file are
+    # dropped, blank lines in between are rows of floor
+    cols = 0
+    rows = 0
+    widest = 0    # the widest line so far, blank or not
+    with open(text_file, 'r') as f:
+        for i, line in enumerate(f):
+            line = line.rstrip('\r\n')
+            widest = max(widest, len(line))
+            if line.strip():
+                rows = i + 1
+                cols = widest
+
+    def blocks():
+        lines = []
+        with open(text_file, 'r') as f:
+            for i, line in enumerate(f):
+                if i >= rows:
+                    break
+                lines.append(line.rstrip('\r\n').ljust(cols)[:cols])
+                if len(lines) == chunk_size:
+                    yield _codes(lines, cols)
+                    lines = []
+        if lines:
+            yield _codes(lines, cols)
+
+    write_chunked_map(filename, rows, cols, blocks(), chunk_size)
+
+
+def _codes(lines, cols):
+    data = np.frombuffer(''.join(lines).encode('latin-1', 'replace'), dtype=np.uint8)
+    return _CODES[data].reshape(len(lines), cols)
+
+
+def generate_world(filename, rows, cols, density=0.2, seed=0, chunk_size=CHUNK_SIZE):
+    '''
+        Write a random world, for trying out huge maps. The player starts in
+        the top left corner and an enemy in the bottom right one.
+    '''
+    rng = np.random.RandomState(seed)
+
+    def blocks():
+        for r0 in range(0, rows, chunk_size):
+            n = min(chunk_size, rows - r0)
+            block = (rng.random_sample((n, cols)) < density).astype(np.uint8)
+            if r0 == 0:
+                block[0, 0] = PLAYER_TILE
+            if r0 + n == rows:
+                block[n - 1, cols - 1] = ENEMY_TILE
+            yield block
+
+    write_chunked_map(filename, rows, cols, blocks(), chunk_size)
+
+
+class ChunkedWorld(object):
+    def __init__(self, filename, max_chunks=MAX_CHUNKS, writable=False):
+        self.file = open(filename, 'r+b' if writable else 'rb')
+        # a world that isn't writable is mapped copy on write, so set_wall works but never changes the file
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_COPY)
+        magic, version, self.rows, self.cols, self.chunk_size, spawn_count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d chunked map" % (filename, VERSION))
+        self.chunks_down = (self.rows + self.chunk_size - 1) // self.chunk_size
+        self.chunks_across = (self.cols + self.chunk_size - 1) // self.chunk_size
+        self.chunk_bytes = self.chunk_size * self.chunk_size
+        self.chunk_start = HEADER.size
+
+        self.player_spawn = None
+        self.enemy_spawns = []
+        spawn_start = self.chunk_start + self.chunks_down * self.chunks_across * self.chunk_bytes
+        for i in range(spawn_count):
+            r, c, code = SPAWN.unpack_from(self.data, spawn_start + i * SPAWN.size)
+            if code == PLAYER_TILE and self.player_spawn is None:
+                self.player_spawn = (r, c)
+            elif code == ENEMY_TILE:
+                self.enemy_spawns.append((r, c))
+        self.max_chunks = max_chunks
+        self.writable = writable
+        # the tile codes of the cached chunks, one slot per chunk, so tiles in
+        # many chunks can be looked up with one numpy index
+        self.slots = np.zeros((min(max_chunks, 64), self.chunk_size, self.chunk_size), dtype=np.uint8)
+        self.slot_chunk = np.full(len(self.slots), -1, dtype=np.int64)   # slot -> chunk, -1 if free
+        self.last_used = np.zeros(len(self.slots), dtype=np.int64)      # slot -> when it was last used
+        # chunk (chunk_r * chunks_across + chunk_c) -> slot, -1 if it isn't loaded.
+        # 4 bytes for every chunk of 1024 tiles, small next to the chunks themselves.
+        self.chunk_slot = np.full(self.chunks_down * self.chunks_across, -1, dtype=np.int32)
+        self.active = np.zeros(0, dtype=np.int64)   # chunks that are never evicted, see set_active
+        self.cached = 0
+        self.clock = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _load(self, key):
+        # read chunk key from the file into a free slot, without evicting anything
+        free = np.flatnonzero(self.slot_chunk < 0)
+        if len(free) == 0:
+            size = len(self.slots)
+            self.slots = np.concatenate((self.slots, np.zeros_like(self.slots)))
+            self.slot_chunk = np.concatenate((self.slot_chunk, np.full(size, -1, dtype=np.int64)))
+            self.last_used = np.concatenate((self.last_used, np.zeros(size, dtype=np.int64)))
+            free = [size]
+        slot = int(free[0])
+        codes = np.frombuffer(self.data, dtype=np.uint8, count=self.chunk_bytes,
+                              offset=self.chunk_start + key * self.chunk_bytes)
+        self.slots[slot] = codes.reshape(self.chunk_size, self.chunk_size)
+        self.slot_chunk[slot] = key
+        self.chunk_slot[key] = slot
+        self.cached += 1
+        self.loads += 1
+        return slot
+
+    def _slots(self, keys):
+        # the slots of an array of chunks, loading the missing ones
+        slots = self.chunk_slot[keys]
+        missing = slots < 0
+        if missing.any():
+            for key in np.unique(keys[missing]).tolist():
+                self._load(key)
+            slots = self.chunk_slot[keys]
+        self.clock += 1
+        self.last_used[slots] = self.clock
+        return slots
+
+    def _evict(self):
+        # throw out the least recently used chunks that are not active
+        extra = self.cached - self.max_chunks
+        if extra <= 0:
+            return
+        candidates = np.flatnonzero(self.slot_chunk >= 0)
+        candidates = candidates[~np.isin(self.slot_chunk[candidates], self.active)]
+        oldest = candidates[np.argsort(self.last_used[candidates], kind='stable')[:extra]]
+        self.chunk_slot[self.slot_chunk[oldest]] = -1
+        self.slot_chunk[oldest] = -1
+        self.cached -= len(oldest)
+        self.evictions += len(oldest)
+
+    def chunk(self, chunk_r, chunk_c):
+        '''
+            The tile codes of one chunk, a (chunk_size, chunk_size) array.
+            It is only valid until the next chunk is loaded.
+        '''
+        slot = self._slots(np.array([chunk_r * self.chunks_across + chunk_c]))[0]
+        self._evict()
+        return self.slots[slot]
+
+    def set_active(self, points, radius):
+        '''
+            Keep the chunks within radius tiles of each (row, col) point in
+            the cache, loading them if needed. Call each frame with the
+            tiles of the player and the active enemies.
+        '''
+        cs = self.chunk_size
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        r0 = np.clip(np.floor((points[:, 0] - radius) / cs), 0, self.chunks_down - 1).astype(np.int64)
+        r1 = np.clip(np.floor((points[:, 0] + radius) / cs), 0, self.chunks_down - 1).astype(np.int64)
+        c0 = np.clip(np.floor((points[:, 1] - radius) / cs), 0, self.chunks_across - 1).astype(np.int64)
+        c1 = np.clip(np.floor((points[:, 1] + radius) / cs), 0, self.chunks_across - 1).astype(np.int64)
+        keys = []
+        for dr in range(int((r1 - r0).max(initial=0)) + 1):
+            for dc in range(int((c1 - c0).max(initial=0)) + 1):
+                keys.append(((r0 + dr) * self.chunks_across + c0 + dc)[(r0 + dr <= r1) & (c0 + dc <= c1)])
+        self.active = np.unique(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+        self._slots(self.active)
+        self._evict()
+        return len(self.active)
+
+    def tile(self, r, c):
+        if r < 0 or c < 0 or r >= self.rows or c >= self.cols:
+            return WALL_TILE
+        cs = self.chunk_size
+        slot = self.chunk_slot[(r // cs) * self.chunks_across + c // cs]
+        if slot < 0:
+            return int(self.chunk(r // cs, c // cs)[r % cs, c % cs])
+        self.clock += 1
+        self.last_used[slot] = self.clock
+        return int(self.slots[slot, r % cs, c % cs])
+
+    def is_wall(self, r, c):
+        return self.tile(r, c) == WALL_TILE
+
+    def walls_at(self, r, c):
+        '''
+            is_wall for arrays of rows and columns, with one numpy lookup.
+        '''
+        r = np.asarray(r, dtype=np.int64)
+        c = np.asarray(c, dtype=np.int64)
+        walls = np.ones(r.shape, dtype=bool)
+        inside = (r >= 0) & (r < self.rows) & (c >= 0) & (c < self.cols)
+        if not inside.any():
+            return walls
+        cs = self.chunk_size
+        ri = r[inside]
+        ci = c[inside]
+        slots = self._slots((ri // cs) * self.chunks_across + ci // cs)
+        walls[inside] = self.slots[slots, ri % cs, ci % cs] == WALL_TILE
+        self._evict()
+        return walls
+
+    # so a ChunkedWorld can be indexed like WallIndex.wall_grid: world[r_array, c_array]
+    def __getitem__(self, index):
+        r, c = index
+        return self.walls_at(r, c)
+
+    def region(self, r0, r1, c0, c1):
+        '''
+            The tile codes of rows r0 .. r1-1 and columns c0 .. c1-1 as one array.
+        '''
+        cs = self.chunk_size
+        codes = np.full((r1 - r0, c1 - c0), WALL_TILE, dtype=np.uint8)
+        for chunk_r in range(max(r0, 0) // cs, (min(r1, self.rows) - 1) // cs + 1):
+            for chunk_c in range(max(c0, 0) // cs, (min(c1, self.cols) - 1) // cs + 1):
+                chunk = self.chunk(chunk_r, chunk_c)
+                # the part of this chunk inside the region
+                top = max(chunk_r * cs, r0)
+                bottom = min((chunk_r + 1) * cs, r1, self.rows)
+                left = max(chunk_c * cs, c0)
+                right = min((chunk_c + 1) * cs, c1, self.cols)
+                if top < bottom and left < right:
+                    codes[top - r0:bottom - r0, left - c0:right - c0] = \
+                        chunk[top - chunk_r * cs:bottom - chunk_r * cs, left - chunk_c * cs:right - chunk_c * cs]
+        return codes
+
+    # the (row, col) of every wall in a region, for drawing the part of the world on screen
+    def wall_tiles_in(self, r0, r1, c0, c1):
+        rows, cols = np.nonzero(self.region(r0, r1, c0, c1) == WALL_TILE)
+        return list(zip((rows + r0).tolist(), (cols + c0).tolist()))
+
+    def compile_region(self, r0, r1, c0, c1, backend='grid'):
+        '''
+            A CompiledMap (tiles, walls, spawns and graph) of part of the world,
+            to run the usual game code on the area around the player.
+        '''
+        codes = self.region(r0, r1, c0, c1)
+        symbols = np.array([SYMBOLS[code] for code in range(4)])
+        tiles = [''.join(row) for row in symbols[codes].tolist()]
+        return compile_tiles(tiles, backend)
+
+    def set_wall(self, r, c, is_wall=True):
+        '''
+            Change a tile. The file only changes when the world was opened writable.
+        '''
+        if r < 0 or c < 0 or r >= self.rows or c >= self.cols:
+            raise IndexError("tile (%s, %s) is outside the %s x %s world" % (r, c, self.rows, self.cols))
+        code = WALL_TILE if is_wall else FLOOR
+        cs = self.chunk_size
+        key = (r // cs) * self.chunks_across + c // cs
+        self.data[self.chunk_start + key * self.chunk_bytes + (r % cs) * cs + c % cs] = code
+        slot = self.chunk_slot[key]
+        if slot >= 0:
+            self.slots[slot, r % cs, c % cs] = code
+
+    def __str__(self):
+        return "ChunkedWorld: %s x %s tiles, %s chunks cached (%s active)" % (
+            self.rows, self.cols, self.cached, len(self.active))
+
+
+class _FlatWalls(object):
+    # world walls indexed by vertex (r * cols + c), like WallIndex.walls
+    def __init__(self, world):
+        self.world = world
+
+    def __getitem__(self, vertex):
+        return self.world.is_wall(vertex // self.world.cols, vertex % self.world.cols)
+
+
+class StreamingWallIndex(WallIndex):
+    '''
+        A WallIndex that reads the walls from a ChunkedWorld, so only the
+        chunks under the circles being tested are ever read.
+    '''
+    def __init__(self, world, grid_width, grid_height):
+        self.world = world
+        self.walls = _FlatWalls(world)
+        self.rows = world.rows
+        self.cols = world.cols
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.wall_grid = world
+
+    def wall_changed(self, r, c, is_wall):
+        self.world.set_wall(r, c, is_wall)
+
+
+def benchmark(filename, frames=300, enemies=500, spread=200, radius=40, seed=0):
+    '''
+        Walk a player and a crowd of enemies through the middle of a world,
+        testing wall collisions like the game does each frame.
+        Returns the milliseconds per frame and the world.
+    '''
+    world = ChunkedWorld(filename, max_chunks=256)
+    index = StreamingWallIndex(world, 16, 16)
+    rng = np.random.RandomState(seed)
+    player = np.array([world.cols * 8.0, world.rows * 8.0])
+    crowd = player + rng.uniform(-spread * 16, spread * 16, (enemies, 2))
+    start = time.perf_counter()
+    for frame in range(frames):
+        player += 3
+        crowd += rng.uniform(-2, 2, crowd.shape)
+        # the chunks around the player and every 50th enemy stay loaded
+        points = np.vstack((player[None, ::-1], crowd[::50, ::-1])) / 16
+        world.set_active(points, radius)
+        index.collide_wall_many(crowd, 5)
+        index.collide_wall(player, 5)
+    return 1000 * (time.perf_counter() - start) / frames, world
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Make chunked world files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='convert a text map')
+    convert.add_argument('text_file')
+    convert.add_argument('world_file')
+    generate = commands.add_parser('generate', help='make a random world')
+    generate.add_argument('rows', type=int)
+    generate.add_argument('cols', type=int)
+    generate.add_argument('world_file')
+    generate.add_argument('--density', type=float, default=0.2, help='the fraction of wall tiles')
+    generate.add_argument('--seed', type=int, default=0)
+    for command in (convert, generate):
+        command.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    bench = commands.add_parser('bench', help='time collisions on a world')
+    bench.add_argument('world_file')
+    bench.add_argument('--frames', type=int, default=300)
+    bench.add_argument('--enemies', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        ms, world = benchmark(args.world_file, args.frames, args.enemies)
+        print("%.2f ms per frame, %s, %d chunks loaded, %d evicted" % (ms, world, world.loads, world.evictions))
+        world.close()
+        return
+    start = time.perf_counter()
+    if args.command == 'convert':
+        convert_text_map(args.text_file, args.world_file, args.chunk_size)
+    else:
+        generate_world(args.world_file, args.rows, args.cols, args.density, args.seed, args.chunk_size)
+    world = ChunkedWorld(args.world_file)
+    print("%s in %.2f seconds" % (world, time.perf_counter() - start))
+    world.close()
+
+
+if __name__ == '__main__':
+    main()
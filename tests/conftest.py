@@ -0,0 +1,17 @@
+'''
+    The game's modules live in src and open files with paths like
+    '../data/map.txt', so the tests import from src and run inside it.
+'''
+import os
+import sys
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+
+@pytest.fixture(autouse=True)
+def in_src(monkeypatch):
+    monkeypatch.chdir(SRC)
@@ -0,0 +1,110 @@
+import random
+from all_pairs import AllPairsTable
+from graph_tools import (GRAPH_BACKENDS, PATH_METHODS, IncrementalPlanner, bfs_search,
+                         build_path, get_shortest_path, vertex_to_rc)
+from hierarchical_graph import ClusterGraph
+from map_compiler import compile_tiles
+
+
+def random_map(rng, rows, cols, wall_chance, backend='grid'):
+    tiles = [''.join('#' if rng.random() < wall_chance else ' ' for c in range(cols)) for r in range(rows)]
+    return compile_tiles(tiles, backend)
+
+
+def open_vertices(level):
+    return [v for v in range(len(level.walls)) if not level.walls[v]]
+
+
+# a path from start to goal that only takes steps along the graph's edges
+def assert_walkable(path, start, goal, graph):
+    assert path[0] == start and path[-1] == goal
+    for s, t in zip(path, path[1:]):
+        assert graph.is_adjacent(s, t), (s, t)
+
+
+# the number of steps of a shortest path, -1 if there is none
+def bfs_steps(start, goal, graph):
+    path = build_path(bfs_search(start, goal, graph), goal)
+    return len(path) - 1
+
+
+# flip a few random walls, but never at the start or the goal
+def edit_walls(rng, level, keep):
+    for edit in range(3):
+        r, c = rng.randrange(level.rows), rng.randrange(level.cols)
+        if level.vertex(r, c) not in keep:
+            level.set_wall(r, c, not level.is_wall(r, c))
+
+
+def test_search_methods_find_shortest_paths():
+    rng = random.Random(4)
+    for backend in GRAPH_BACKENDS:
+        for trial in range(6):
+            level = random_map(rng, rng.randint(2, 20), rng.randint(2, 20), 0.3, backend)
+            graph = level.graph
+            tiles = open_vertices(level)
+            for query in range(20):
+                start, goal = rng.choice(tiles), rng.choice(tiles)
+                steps = bfs_steps(start, goal, graph)
+                start_r, start_c = vertex_to_rc(start, graph.rows, graph.cols)
+                goal_r, goal_c = vertex_to_rc(goal, graph.rows, graph.cols)
+                for method in PATH_METHODS:
+                    path = get_shortest_path(start_r, start_c, goal_r, goal_c, graph, method)
+                    assert len(path) - 1 == steps, (method, start, goal)
+                    if path:
+                        assert_walkable(path, start, goal, graph)
+
+
+def test_all_pairs_table_matches_bfs():
+    rng = random.Random(24)
+    for backend in GRAPH_BACKENDS:
+        level = random_map(rng, 12, 15, 0.3, backend)
+        table = AllPairsTable(level.graph)
+        tiles = open_vertices(level)
+        for start in tiles:
+            # no goal vertex, so the BFS reaches every tile it can
+            predecessors = bfs_search(start, -1, level.graph)
+            for goal in tiles:
+                steps = len(build_path(predecessors, goal)) - 1
+                path = table.path(start, goal)
+                assert len(path) - 1 == steps, (start, goal)
+                assert table.distance_between(start, goal) == steps
+                if path:
+                    assert_walkable(path, start, goal, level.graph)
+
+
+def test_incremental_planner_follows_wall_changes():
+    rng = random.Random(5)
+    for trial in range(10):
+        level = random_map(rng, rng.randint(4, 16), rng.randint(4, 16), 0.25)
+        tiles = open_vertices(level)
+        start, goal = rng.choice(tiles), rng.choice(tiles)
+        planner = IncrementalPlanner(level.graph, start, goal)
+        for step in range(8):
+            path = planner.get_path()
+            assert len(path) - 1 == bfs_steps(start, goal, level.graph), (trial, step)
+            if path:
+                assert_walkable(path, start, goal, level.graph)
+            edit_walls(rng, level, (start, goal))
+        planner.close()
+
+
+# HPA* paths can be a little longer than the shortest, but are found exactly when one exists
+def test_cluster_graph_follows_wall_changes():
+    rng = random.Random(6)
+    for trial in range(6):
+        level = random_map(rng, rng.randint(8, 30), rng.randint(8, 30), 0.25)
+        clusters = ClusterGraph(level.graph, cluster_size=rng.randint(3, 8))
+        for step in range(6):
+            tiles = open_vertices(level)
+            for query in range(10):
+                start, goal = rng.choice(tiles), rng.choice(tiles)
+                steps = bfs_steps(start, goal, level.graph)
+                path = clusters.get_path(start, goal)
+                if steps < 0:
+                    assert path == []
+                else:
+                    assert len(path) - 1 >= steps
+                    assert_walkable(path, start, goal, level.graph)
+            edit_walls(rng, level, ())
+        clusters.close()
@@ -0,0 +1,61 @@
+import random
+import time
+import numpy as np
+from map_compiler import compile_map
+from simulation import Simulation, FrameInput, FixedStepRunner, FIXED_DELTA_T
+from replay import InputRecorder, InputReplayer, replay_headless
+from sim_thread import SimulationThread
+
+MAP_FILE = '../data/map.txt'
+
+
+def random_input(rng):
+    return FrameInput(rng.randint(0, 900), rng.randint(0, 900), up=rng.random() < 0.4, down=rng.random() < 0.3,
+                      left=rng.random() < 0.3, right=rng.random() < 0.4, fire=rng.random() < 0.05)
+
+
+def assert_same_state(a, b):
+    assert a.tick == b.tick
+    assert a.time == b.time
+    assert (a.player_location.x, a.player_location.y) == (b.player_location.x, b.player_location.y)
+    assert np.array_equal(a.enemies.positions[:a.enemies.count], b.enemies.positions[:b.enemies.count])
+    assert np.array_equal(a.projectiles.positions[:a.projectiles.count], b.projectiles.positions[:b.projectiles.count])
+
+
+def test_headless_replay_matches_the_recorded_session(tmp_path):
+    filename = str(tmp_path / 'session.rec')
+    sim = Simulation(compile_map(MAP_FILE), 900, 900)
+    runner = FixedStepRunner(sim)
+    recorder = InputRecorder(filename, MAP_FILE, 900, 900, FIXED_DELTA_T)
+    rng = random.Random(1)
+    for frame in range(2000):
+        # frame times like pygame's clock gives, with a few slow and very fast frames
+        frame_time = rng.choice([16, 17, 16, 17, 33, 0, 120])
+        frame_input = random_input(rng)
+        recorder.record(frame_input, frame_time, sim.tick)
+        runner.run_frame(frame_input, frame_time)
+    recorder.close()
+
+    replayed, frame_times = replay_headless(filename)
+    assert len(frame_times) == 2000
+    assert_same_state(sim, replayed)
+
+
+def test_headless_replay_matches_a_threaded_session(tmp_path):
+    filename = str(tmp_path / 'threaded.rec')
+    sim = Simulation(compile_map(MAP_FILE), 900, 900)
+    recorder = InputRecorder(filename, MAP_FILE, 900, 900, FIXED_DELTA_T)
+    sim_thread = SimulationThread(sim, recorder=recorder)
+    rng = random.Random(2)
+    sim_thread.start()
+    # change the input every few milliseconds, in between the thread's steps
+    end = time.perf_counter() + 1.0
+    while time.perf_counter() < end:
+        sim_thread.set_input(random_input(rng))
+        time.sleep(rng.uniform(0.002, 0.03))
+    sim_thread.stop()
+    recorder.close()
+
+    assert len(InputReplayer(filename)) == sim.tick > 0
+    replayed, frame_times = replay_headless(filename)
+    assert_same_state(sim, replayed)
@@ -0,0 +1,14 @@
+import pytest
+from map_compiler import compile_tiles
+from simulation import Simulation, tile_size
+
+
+def test_tile_size_fills_the_window():
+    level = compile_tiles(['p   ', '  # ', '   e'])
+    assert tile_size(level, 900, 900) == (225, 300)
+
+
+def test_a_map_bigger_than_the_window_fails_early():
+    level = compile_tiles([' ' * 1000] * 1000)
+    with pytest.raises(ValueError, match='1000 x 1000 tiles.*900 x 900 window'):
+        Simulation(level, 900, 900)
@@ -0,0 +1,37 @@
+import random
+from visibility import VisibilityIndex, line_tiles
+
+
+# can_see worked out from the line itself, outside the map counts as a wall
+def brute_force_can_see(walls, rows, cols, a, b, max_range):
+    dr, dc = b[0] - a[0], b[1] - a[1]
+    if dr * dr + dc * dc > max_range * max_range:
+        return False
+    for r, c in line_tiles(dr, dc):
+        r, c = a[0] + r, a[1] + c
+        if not (0 <= r < rows and 0 <= c < cols) or walls[r * cols + c]:
+            return False
+    return True
+
+
+def assert_matches(index, walls, rows, cols, max_range):
+    for a in [(r, c) for r in range(rows) for c in range(cols)]:
+        for dr in range(-max_range - 1, max_range + 2):
+            for dc in range(-max_range - 1, max_range + 2):
+                b = (a[0] + dr, a[1] + dc)
+                expected = brute_force_can_see(walls, rows, cols, a, b, max_range)
+                assert index.can_see(a, b) == expected, (a, b)
+
+
+def test_visibility_matches_the_lines_after_wall_changes():
+    rng = random.Random(3)
+    for trial in range(4):
+        rows, cols, max_range = rng.randint(3, 12), rng.randint(3, 12), rng.randint(1, 6)
+        walls = bytearray(1 if rng.random() < 0.25 else 0 for _ in range(rows * cols))
+        index = VisibilityIndex(walls, rows, cols, max_range)
+        assert_matches(index, walls, rows, cols, max_range)
+        for edit in range(6):
+            r, c = rng.randrange(rows), rng.randrange(cols)
+            walls[r * cols + c] = 1 - walls[r * cols + c]
+            index.wall_changed(r, c, bool(walls[r * cols + c]))
+            assert_matches(index, walls, rows, cols, max_range)